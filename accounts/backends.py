@@ -0,0 +1,77 @@
+# accounts/backends.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+UserModel = get_user_model()
+
+ROLE_PROFILE_RELATIONS = ('doctor_profile', 'patient_profile')
+
+
+def user_cache_timeout():
+    """Seconds a resolved user stays cached; 0 disables the user cache."""
+    return getattr(settings, 'ACCOUNTS_USER_CACHE_TIMEOUT', 300)
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def cache_user(user):
+    """
+    Store ``user`` (with any loaded role profile) for get_user().
+
+    The whole instance is cached, password hash included: the session is
+    checked against it on every request. Writes that skip save() must drop
+    the entry; User querysets do so in update().
+    """
+    if user_cache_timeout():
+        cache.set(user_cache_key(user.pk), user, user_cache_timeout())
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def role_profile_loaded(user):
+    """Whether ``user`` came with its role profile, so reading it makes no query."""
+    return all(user._meta.get_field(relation).is_cached(user) for relation in ROLE_PROFILE_RELATIONS)
+
+
+class RoleProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the user together with its doctor/patient profile.
+
+    AuthenticationMiddleware resolves request.user through get_user(), so the
+    role profile arrives in the same joined query and later accesses to
+    user.doctor_profile / user.patient_profile do not hit the database.
+
+    The result is kept in the cache for ACCOUNTS_USER_CACHE_TIMEOUT seconds;
+    accounts.signals drops it whenever the user or its profile is saved.
+    """
+
+    def get_user(self, user_id):
+        user = cache.get(user_cache_key(user_id)) if user_cache_timeout() else None
+        if user is None:
+            try:
+                user = UserModel._default_manager.select_related(*ROLE_PROFILE_RELATIONS).get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache_user(user)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await cache.aget(user_cache_key(user_id)) if user_cache_timeout() else None
+        if user is None:
+            try:
+                user = await UserModel._default_manager.select_related(*ROLE_PROFILE_RELATIONS).aget(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            if user_cache_timeout():
+                await cache.aset(user_cache_key(user.pk), user, user_cache_timeout())
+        return user if self.user_can_authenticate(user) else None
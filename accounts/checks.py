@@ -0,0 +1,40 @@
+# accounts/checks.py
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register, Tags
+
+from .backends import user_cache_timeout
+
+SHARED_CACHE_HINT = (
+    "Point CACHE_BACKEND/CACHE_LOCATION at a cache shared by the workers, e.g. "
+    "django.core.cache.backends.redis.RedisCache."
+)
+
+
+def local_cache():
+    """Whether the default cache lives in each process (and so isn't shared between workers)."""
+    return isinstance(caches['default'], LocMemCache)
+
+
+@register(Tags.caches, Tags.security, deploy=True)
+def check_user_cache_is_shared(app_configs, **kwargs):
+    # Only the worker that saves a user (or ends a session) drops it from the
+    # cache; with a per-process cache the others keep the old one
+    if settings.DEBUG or not local_cache():
+        return []
+    errors = []
+    if user_cache_timeout():
+        errors.append(Error(
+            'The user cache is per process, so other workers keep deactivated users and '
+            'changed passwords for up to ACCOUNTS_USER_CACHE_TIMEOUT seconds.',
+            hint=SHARED_CACHE_HINT + ' Or set ACCOUNTS_USER_CACHE_TIMEOUT=0.',
+            id='accounts.E001',
+        ))
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db':
+        errors.append(Error(
+            'Sessions are read from a per-process cache, so other workers keep logged-out sessions.',
+            hint=SHARED_CACHE_HINT + " Or set SESSION_ENGINE='django.contrib.sessions.backends.db'.",
+            id='accounts.E002',
+        ))
+    return errors
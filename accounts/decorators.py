@@ -1,21 +1,52 @@
 # accounts/decorators.py
+from asgiref.sync import iscoroutinefunction
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
 
-def doctor_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.is_doctor():
-            return view_func(request, *args, **kwargs)
-        else:
-            messages.error(request, 'You need to be logged in as a doctor to access this page.')
+from .backends import RoleProfileBackend, role_profile_loaded
+
+# Both decorators leave the user's profile on request.role_profile. With
+# accounts.backends.RoleProfileBackend it is loaded together with the user.
+#
+# Async views are wrapped in an async wrapper that resolves the user with
+# request.auser() and stores it on request.user, so templates and ETag
+# functions reading request.user don't trigger a sync database lookup.
+
+def _role_required(view_func, has_role, error_message):
+    def allowed(request, user):
+        if user.is_authenticated and has_role(user) and user.role_profile:
+            request.role_profile = user.role_profile
+            return True
+        messages.error(request, error_message)
+        return False
+
+    if iscoroutinefunction(view_func):
+        async def wrapper(request, *args, **kwargs):
+            request.user = await request.auser()
+            if request.user.is_authenticated and not role_profile_loaded(request.user):
+                # Sessions from before RoleProfileBackend are resolved by ModelBackend
+                request.user = await RoleProfileBackend().aget_user(request.user.pk) or AnonymousUser()
+            if allowed(request, request.user):
+                return await view_func(request, *args, **kwargs)
+            return redirect('accounts:login')
+    else:
+        def wrapper(request, *args, **kwargs):
+            if allowed(request, request.user):
+                return view_func(request, *args, **kwargs)
             return redirect('accounts:login')
     return wrapper
 
+def doctor_required(view_func):
+    return _role_required(
+        view_func,
+        lambda user: user.is_doctor(),
+        'You need to be logged in as a doctor to access this page.',
+    )
+
 def patient_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.is_patient():
-            return view_func(request, *args, **kwargs)
-        else:
-            messages.error(request, 'You need to be logged in as a patient to access this page.')
-            return redirect('accounts:login')
-    return wrapper
\ No newline at end of file
+    return _role_required(
+        view_func,
+        lambda user: user.is_patient(),
+        'You need to be logged in as a patient to access this page.',
+    )
\ No newline at end of file
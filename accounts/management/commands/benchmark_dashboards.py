@@ -0,0 +1,109 @@
+"""
+Django management command to measure queries and latency per dashboard request
+Usage: python manage.py benchmark_dashboards --requests 200
+"""
+
+from datetime import time, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.backends import invalidate_user
+from accounts.management.commands.benchmark_wsgi_asgi import percentile
+from accounts.models import User
+from appointments.models import Appointment, AvailabilitySlot
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+
+MODES = (
+    # Every request reads the session row and the user row
+    ('database', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'ACCOUNTS_USER_CACHE_TIMEOUT': 0,
+    }),
+    # The configured settings (cached sessions and users)
+    ('cached', {}),
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark queries and latency per request for the doctor and patient dashboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per view and mode',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Dashboard benchmark'))
+        self.stdout.write('-' * 76)
+        self.stdout.write(f"{'view':<32}{'mode':<10}{'queries/req':>12}{'p50 ms':>10}{'p95 ms':>10}")
+
+        # All rows are rolled back at the end
+        with transaction.atomic():
+            doctor, patient = self.create_users()
+            try:
+                for user, url in (
+                    (doctor, 'doctors:dashboard'),
+                    (doctor, 'doctors:appointments'),
+                    (patient, 'patients:dashboard'),
+                    (patient, 'appointments:my_appointments'),
+                ):
+                    for mode, overrides in MODES:
+                        with override_settings(**overrides):
+                            queries, latencies = self.measure(user, reverse(url), options['requests'])
+                        self.stdout.write(
+                            f"{url:<32}{mode:<10}{queries:>12.1f}"
+                            f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 95):>10.2f}"
+                        )
+            finally:
+                invalidate_user(doctor.pk)
+                invalidate_user(patient.pk)
+                transaction.set_rollback(True)
+
+    def create_users(self):
+        with suppress_email_signals():
+            doctor = User.objects.create_user(
+                'benchmark-doctor', 'benchmark-doctor@example.com', 'benchmark', role=User.DOCTOR
+            )
+            patient = User.objects.create_user(
+                'benchmark-patient', 'benchmark-patient@example.com', 'benchmark', role=User.PATIENT
+            )
+            doctor_profile = DoctorProfile.objects.create(user=doctor, specialization='Benchmarking')
+            patient_profile = PatientProfile.objects.create(user=patient)
+            tomorrow = timezone.now().date() + timedelta(days=1)
+            for hour in range(9, 14):
+                slot = AvailabilitySlot.objects.create(
+                    doctor=doctor_profile,
+                    date=tomorrow,
+                    start_time=time(hour),
+                    end_time=time(hour, 30),
+                    is_booked=True,
+                )
+                Appointment.objects.create(
+                    patient=patient_profile, doctor=doctor_profile, availability_slot=slot, reason='Benchmark'
+                )
+        return doctor, patient
+
+    def measure(self, user, url, requests):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        client.get(url)  # warm up
+
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                started = perf_counter()
+                client.get(url)
+                latencies.append((perf_counter() - started) * 1000)
+        client.logout()
+        return len(queries) / requests, latencies
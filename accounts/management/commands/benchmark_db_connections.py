@@ -0,0 +1,182 @@
+"""
+Django management command to measure request latency and connection churn
+with per-request, persistent and pooled database connections
+Usage: python manage.py benchmark_db_connections --requests 400 --concurrency 20
+
+Requests run concurrently from a pool of threads through the sync handler,
+like gunicorn's gthread workers, so point the settings at the PostgreSQL
+server the site uses to see what opening connections costs. The pool mode
+needs PostgreSQL and psycopg 3 with psycopg-pool; it is skipped otherwise.
+
+Connects counts new server connections: connections opened by the worker
+threads, or by the pool in pool mode.
+"""
+
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.management.commands.benchmark_wsgi_asgi import Command as HandlerBenchmarkCommand, percentile
+
+MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(HandlerBenchmarkCommand):
+    help = 'Compare request latency and connection churn with per-request, persistent and pooled connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Requests per view and mode',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Worker threads (the pool is sized to match)',
+        )
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            choices=MODES,
+            default=list(MODES),
+        )
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        concurrency = options['concurrency']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Database connection benchmark ({requests} requests, concurrency {concurrency})'
+        ))
+        self.stdout.write('-' * 92)
+        self.stdout.write(
+            f"{'view':<32}{'mode':<13}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'connects':>10}{'per req':>9}"
+        )
+
+        self.connects = 0
+        self.lock = threading.Lock()
+        connection_created.connect(self.count_connect)
+        originals = {alias: copy.deepcopy(connections.settings[alias]) for alias in connections}
+
+        # Worker threads use their own connections, so the data is committed
+        # and deleted afterwards instead of rolled back
+        doctor, patient = self.create_users()
+        try:
+            urls = [
+                reverse('patients:dashboard'),
+                reverse('patients:doctor_details', args=[doctor.doctor_profile.id]),
+                reverse('appointments:my_appointments'),
+            ]
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                session_key = self.login(patient)
+                self.warm_up(urls, session_key)
+                for url in urls:
+                    for mode in options['modes']:
+                        skipped = self.configure(mode, concurrency)
+                        if skipped:
+                            self.stdout.write(f'{url:<32}{mode:<13}skipped: {skipped}')
+                            continue
+                        try:
+                            elapsed, latencies, connects = self.run(url, session_key, requests, concurrency)
+                        finally:
+                            self.reset(originals)
+                        self.stdout.write(
+                            f"{url:<32}{mode:<13}{len(latencies) / elapsed:>9.1f}"
+                            f"{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+                            f"{percentile(latencies, 99):>9.2f}{connects:>10}{connects / len(latencies):>9.2f}"
+                        )
+        finally:
+            connection_created.disconnect(self.count_connect)
+            self.delete_users(doctor, patient)
+
+    def count_connect(self, sender, connection, **kwargs):
+        with self.lock:
+            self.connects += 1
+
+    def configure(self, mode, concurrency):
+        """
+        Switch every alias to ``mode``; returns why it can't run, if it can't.
+
+        New connections take their settings from connections.settings, so
+        the worker threads started afterwards all use the mode.
+        """
+        if mode == 'pool':
+            if connections['default'].vendor != 'postgresql':
+                return 'needs PostgreSQL'
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                return 'needs psycopg 3 and psycopg-pool'
+        connections.close_all()
+        for alias in connections:
+            settings_dict = connections.settings[alias]
+            settings_dict['OPTIONS'] = {
+                key: value for key, value in settings_dict.get('OPTIONS', {}).items() if key != 'pool'
+            }
+            settings_dict['CONN_MAX_AGE'] = 60 if mode == 'persistent' else 0
+            if mode == 'pool':
+                settings_dict['OPTIONS']['pool'] = {
+                    'min_size': concurrency,
+                    'max_size': concurrency,
+                    'max_lifetime': 1800,
+                }
+        return None
+
+    def reset(self, originals):
+        for alias in connections:
+            if connections[alias].vendor == 'postgresql' and connections[alias].pool:
+                connections[alias].close_pool()
+        connections.close_all()
+        for alias, settings_dict in originals.items():
+            connections.settings[alias].clear()
+            connections.settings[alias].update(copy.deepcopy(settings_dict))
+
+    def warm_up(self, urls, session_key):
+        """Fill the template, session and user caches before timing anything."""
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        for url in urls:
+            client.get(url)
+        connections.close_all()
+
+    def run(self, url, session_key, requests, concurrency):
+        def worker(count):
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = perf_counter()
+                    # The test client leaves out the close_old_connections()
+                    # the real handlers run when a request starts and ends
+                    close_old_connections()
+                    client.get(url)
+                    close_old_connections()
+                    latencies.append((perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return latencies
+
+        self.connects = 0
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = perf_counter()
+            results = list(pool.map(worker, self.split(requests, concurrency)))
+            elapsed = perf_counter() - started
+
+        connects = self.connects
+        pools = [connections[alias].pool for alias in connections if connections[alias].vendor == 'postgresql']
+        if any(pools):
+            # Checkouts also send connection_created; count what the pool opened
+            connects = sum(pool.get_stats()['connections_num'] for pool in pools if pool)
+        return elapsed, [latency for latencies in results for latency in latencies], connects
@@ -0,0 +1,510 @@
+"""
+Django management command to benchmark every page and API route end to end
+Usage: python manage.py benchmark_http --requests 200 --concurrency 8 --output before.json
+       python manage.py benchmark_http --compare before.json after.json
+
+Runs against the data from seed_data (as <prefix>-patient-0 and
+<prefix>-doctor-0). Each route is driven in two modes:
+
+- client: the Django test client, one request at a time. A first pass of
+  --profile-requests records queries and query time (on every database)
+  and the peak memory allocated per request with tracemalloc; a second pass
+  of --requests records latency.
+- http: --concurrency threads with keep-alive connections sending --requests
+  real HTTP requests, logged in through the login form and the token
+  endpoint. Against --base-url if given, else a threaded server started in
+  this process.
+
+Both record p50/p95/p99 and requests per second; --output saves them as
+JSON. --compare reads two such files and fails if any route got slower,
+heavier or chattier than --threshold allows.
+
+Bookings made by the POST routes are cancelled and their slots freed
+afterwards. No emails are sent by the in-process server; a --base-url
+server sends whatever it is configured to. Not covered: admin, signup,
+logout, availability edits, the slot event stream and the email stats.
+"""
+
+import http.client
+import json
+import platform
+import threading
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+from http.cookies import SimpleCookie
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.management.commands.benchmark_wsgi_asgi import Command as HandlerBenchmarkCommand, percentile
+from accounts.models import User
+from api.serializers import RoleTokenObtainPairSerializer
+from appointments.management.commands.seed_data import PASSWORD
+from appointments.models import Appointment, AvailabilitySlot
+from appointments.sharding import shard_for_doctor, shards
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+
+# (url name, method, who: None for anonymous, 'patient', 'doctor' or 'api' for the patient's JWT)
+ROUTES = (
+    ('home', 'GET', None),
+    ('accounts:login', 'GET', None),
+    ('accounts:login', 'POST', None),
+    ('accounts:profile', 'GET', 'patient'),
+    ('patients:dashboard', 'GET', 'patient'),
+    ('patients:doctors_list', 'GET', 'patient'),
+    ('patients:doctor_details', 'GET', 'patient'),
+    ('appointments:book_appointment', 'GET', 'patient'),
+    ('appointments:book_appointment', 'POST', 'patient'),
+    ('appointments:appointment_confirmation', 'GET', 'patient'),
+    ('appointments:my_appointments', 'GET', 'patient'),
+    ('doctors:dashboard', 'GET', 'doctor'),
+    ('doctors:manage_availability', 'GET', 'doctor'),
+    ('doctors:appointments', 'GET', 'doctor'),
+    ('api:doctors', 'GET', 'api'),
+    ('api:doctor_slots', 'GET', 'api'),
+    ('api:my_appointments', 'GET', 'api'),
+    ('api:book_slot', 'POST', 'api'),
+)
+
+# Metrics compared by --compare, and whether a higher value is worse
+COMPARED = {
+    'client': {'p50_ms': True, 'p95_ms': True, 'p99_ms': True, 'queries': True, 'alloc_kib': True},
+    'http': {'p50_ms': True, 'p95_ms': True, 'p99_ms': True, 'rps': False},
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(HandlerBenchmarkCommand):
+    help = 'Benchmark latency, queries and allocations of every page and API route against the seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Timed requests per route and mode',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Connections in flight in http mode',
+        )
+        parser.add_argument(
+            '--profile-requests',
+            type=int,
+            default=20,
+            help='Requests per route measured for queries and allocations in client mode',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=('client', 'http'),
+            action='append',
+            help='Run only this mode (repeatable; default both)',
+        )
+        parser.add_argument(
+            '--route',
+            action='append',
+            help='Run only routes whose url name contains this (repeatable)',
+        )
+        parser.add_argument('--base-url', help='Server for http mode, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--prefix', default='seed', help='seed_data --prefix of the users to log in as')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument(
+            '--compare',
+            nargs=2,
+            metavar=('BASELINE', 'CURRENT'),
+            help='Compare two result files instead of running',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.1,
+            help='Relative change counted as a regression with --compare (queries: any increase)',
+        )
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(*options['compare'], options['threshold'], options['verbosity'])
+
+        modes = options['mode'] or ['client', 'http']
+        routes = [
+            route for route in ROUTES
+            if not options['route'] or any(part in route[0] for part in options['route'])
+        ]
+        self.lock = threading.Lock()
+        self.booked = []
+        self.load_fixtures(options['prefix'])
+        results = {}
+
+        self.stdout.write(self.style.SUCCESS(
+            f"HTTP benchmark ({options['requests']} requests, concurrency {options['concurrency']}, "
+            f"{connection.vendor}, shards {', '.join(shards())})"
+        ))
+        self.stdout.write('-' * 110)
+        self.stdout.write(
+            f"{'route':<46}{'mode':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'alloc KiB':>11}"
+        )
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver', '127.0.0.1', 'localhost', *settings.ALLOWED_HOSTS]):
+                for mode in modes:
+                    with ExitStack() as stack:
+                        if mode == 'client':
+                            stack.enter_context(suppress_email_signals())
+                            run = self.run_client
+                        else:
+                            self.base_url = options['base_url'] or stack.enter_context(self.serve())
+                            run = self.run_http
+                        self.identities = {}
+                        for name, method, who in routes:
+                            result = run(name, method, who, options)
+                            results.setdefault(f'{method} {name}', {})[mode] = result
+                            self.report(f'{method} {name}', mode, result)
+        finally:
+            self.release_slots()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'meta': self.meta(options), 'results': results}, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def load_fixtures(self, prefix):
+        try:
+            self.patient = User.objects.select_related('patient_profile').get(username=f'{prefix}-patient-0')
+            self.doctor = User.objects.select_related('doctor_profile').get(username=f'{prefix}-doctor-0')
+        except User.DoesNotExist:
+            raise CommandError(f"No seeded users prefixed '{prefix}-'; run seed_data first")
+        self.slots = self.free_slots(prefix)
+        # Shown by the GET booking routes, never booked
+        self.slot_id = self.next_slot()
+        self.appointment_id = next(
+            (
+                appointment_id for alias in shards()
+                for appointment_id in Appointment.objects.using(alias).filter(
+                    patient=self.patient.patient_profile
+                ).values_list('id', flat=True)[:1]
+            ),
+            None,
+        )
+        if self.appointment_id is None:
+            raise CommandError(f'{self.patient.username} has no appointments; seed with --booked above 0')
+
+    def free_slots(self, prefix):
+        """Yield (doctor, slot id) of the seeded doctors' free future slots."""
+        today = timezone.now().date()
+        doctors = DoctorProfile.objects.filter(user__username__startswith=f'{prefix}-').order_by('id')
+        for doctor in doctors:
+            slot_ids = list(doctor.availability_slots.filter(
+                date__gt=today, is_booked=False
+            ).order_by('date', 'start_time').values_list('id', flat=True))
+            for slot_id in slot_ids:
+                yield doctor, slot_id
+
+    def next_slot(self):
+        with self.lock:
+            try:
+                doctor, slot_id = next(self.slots)
+            except StopIteration:
+                raise CommandError('Out of free future slots to book; seed more --days or --doctors')
+            self.booked.append((doctor, slot_id))
+        return slot_id
+
+    def release_slots(self):
+        """Cancel the benchmark's bookings and free their slots."""
+        by_doctor = {}
+        for doctor, slot_id in self.booked:
+            by_doctor.setdefault(doctor, []).append(slot_id)
+        with suppress_email_signals():
+            for doctor, slot_ids in by_doctor.items():
+                shard = shard_for_doctor(doctor)
+                for appointment in Appointment.objects.using(shard).filter(availability_slot_id__in=slot_ids):
+                    appointment.delete()
+                for slot in AvailabilitySlot.objects.using(shard).filter(id__in=slot_ids, is_booked=True):
+                    slot.is_booked = False
+                    slot.save(update_fields=['is_booked'])
+
+    def target(self, name, method):
+        """(path, data) of the next request to route ``name``."""
+        if name in ('appointments:book_appointment', 'api:book_slot'):
+            slot_id = self.next_slot() if method == 'POST' else self.slot_id
+            return reverse(name, args=[slot_id]), {'reason': 'Benchmark', 'notes': ''}
+        if name in ('patients:doctor_details', 'api:doctor_slots'):
+            return reverse(name, args=[self.doctor.doctor_profile.id]), None
+        if name == 'appointments:appointment_confirmation':
+            return reverse(name, args=[self.appointment_id]), None
+        if name == 'accounts:login':
+            return reverse(name), {'username': self.patient.username, 'password': PASSWORD}
+        return reverse(name), None
+
+    # client mode
+
+    def client_for(self, who):
+        if who not in self.identities:
+            if who == 'api':
+                token = RoleTokenObtainPairSerializer.get_token(self.patient).access_token
+                client = Client(headers={'Authorization': f'Bearer {token}'})
+            else:
+                client = Client()
+                if who is not None:
+                    client.force_login(self.patient if who == 'patient' else self.doctor)
+            self.identities[who] = client
+        return self.identities[who]
+
+    def run_client(self, name, method, who, options):
+        client = self.client_for(who)
+
+        def send():
+            path, data = self.target(name, method)
+            if method == 'GET':
+                return client.get(path)
+            if name.startswith('api:'):
+                return client.post(path, data, content_type='application/json')
+            return client.post(path, data)
+
+        send()  # warm up
+        queries = query_ms = allocated = 0
+        tracemalloc.start()
+        try:
+            for _ in range(options['profile_requests']):
+                with ExitStack() as stack:
+                    contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    send()
+                    allocated += tracemalloc.get_traced_memory()[1] - before
+                queries += sum(len(context) for context in contexts)
+                query_ms += sum(float(query['time']) for context in contexts for query in context.captured_queries) * 1000
+        finally:
+            tracemalloc.stop()
+
+        latencies, errors = [], 0
+        started = perf_counter()
+        for _ in range(options['requests']):
+            request_started = perf_counter()
+            response = send()
+            latencies.append((perf_counter() - request_started) * 1000)
+            errors += response.status_code >= 400
+        elapsed = perf_counter() - started
+
+        profiled = max(options['profile_requests'], 1)
+        return dict(
+            self.summary(latencies, elapsed, errors),
+            queries=round(queries / profiled, 2),
+            query_ms=round(query_ms / profiled, 3),
+            alloc_kib=round(allocated / profiled / 1024, 1),
+        )
+
+    # http mode
+
+    def serve(self):
+        """Context manager running the project's WSGI app on a free local port."""
+        handler = get_internal_wsgi_application()
+
+        def app(environ, start_response):
+            with suppress_email_signals():
+                return handler(environ, start_response)
+
+        class Server:
+            def __enter__(server):
+                server.httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+                server.httpd.set_app(app)
+                threading.Thread(target=server.httpd.serve_forever, daemon=True).start()
+                return f'http://127.0.0.1:{server.httpd.server_port}'
+
+            def __exit__(server, *exc_info):
+                server.httpd.shutdown()
+                server.httpd.server_close()
+
+        return Server()
+
+    def connect(self):
+        url = urlsplit(self.base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(url.hostname, url.port, timeout=60)
+
+    def fetch(self, conn, method, path, headers, body=None):
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        content = response.read()
+        cookies = SimpleCookie()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            cookies.load(header)
+        return response.status, content, {name: morsel.value for name, morsel in cookies.items()}
+
+    def headers_for(self, who):
+        """Request headers carrying ``who``'s session, CSRF cookie or token, logging in over HTTP."""
+        if who in self.identities:
+            return self.identities[who]
+        conn = self.connect()
+        try:
+            if who == 'api':
+                status, content, _ = self.fetch(
+                    conn, 'POST', reverse('api:token_obtain'), {'Content-Type': 'application/json'},
+                    json.dumps({'username': self.patient.username, 'password': PASSWORD}),
+                )
+                if status != 200:
+                    raise CommandError(f'Token request failed with {status}: {content[:200]!r}')
+                headers = {'Authorization': f"Bearer {json.loads(content)['access']}"}
+            else:
+                _, _, cookies = self.fetch(conn, 'GET', reverse('accounts:login'), {})
+                if who is not None:
+                    user = self.patient if who == 'patient' else self.doctor
+                    status, _, login_cookies = self.fetch(
+                        conn, 'POST', reverse('accounts:login'),
+                        self.cookie_headers(cookies),
+                        urlencode({'username': user.username, 'password': PASSWORD}),
+                    )
+                    if status != 302:
+                        raise CommandError(f'Logging in as {user.username} failed with {status}')
+                    cookies.update(login_cookies)
+                headers = self.cookie_headers(cookies)
+        finally:
+            conn.close()
+        self.identities[who] = headers
+        return headers
+
+    def cookie_headers(self, cookies):
+        return {
+            'Cookie': '; '.join(f'{name}={value}' for name, value in cookies.items()),
+            'X-CSRFToken': cookies.get(settings.CSRF_COOKIE_NAME, ''),
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+
+    def run_http(self, name, method, who, options):
+        headers = self.headers_for(who)
+        is_api = name.startswith('api:')
+
+        def send(conn):
+            path, data = self.target(name, method)
+            body = None
+            if method == 'POST':
+                body = json.dumps(data) if is_api else urlencode(data)
+            request_headers = dict(headers, **{'Content-Type': 'application/json'}) if is_api else headers
+            status, _, _ = self.fetch(conn, method, path, request_headers, body)
+            return status
+
+        def worker(count):
+            conn = self.connect()
+            latencies, errors = [], 0
+            try:
+                send(conn)  # warm up
+                for _ in range(count):
+                    started = perf_counter()
+                    status = send(conn)
+                    latencies.append((perf_counter() - started) * 1000)
+                    errors += status >= 400
+            finally:
+                conn.close()
+            return latencies, errors
+
+        concurrency = min(options['concurrency'], options['requests'])
+        threads = []
+        results = []
+        started = perf_counter()
+        for count in self.split(options['requests'], concurrency):
+            thread = threading.Thread(target=lambda count=count: results.append(worker(count)))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started
+        if len(results) < len(threads):
+            raise CommandError(f'{method} {name}: a load generator thread failed')
+        return self.summary(
+            [latency for latencies, _ in results for latency in latencies],
+            elapsed,
+            sum(errors for _, errors in results),
+        )
+
+    # results
+
+    def summary(self, latencies, elapsed, errors):
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+        }
+
+    def report(self, route, mode, result):
+        line = (
+            f"{route:<46}{mode:<8}{result['rps']:>9.1f}{result['p50_ms']:>9.2f}"
+            f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{result.get('queries', ''):>9}{result.get('alloc_kib', ''):>11}"
+        )
+        if result['errors']:
+            self.stdout.write(self.style.WARNING(f"{line}  {result['errors']} errors"))
+        else:
+            self.stdout.write(line)
+
+    def meta(self, options):
+        return {
+            'at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'shards': shards(),
+            'base_url': options['base_url'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'profile_requests': options['profile_requests'],
+        }
+
+    def compare(self, baseline_path, current_path, threshold, verbosity):
+        runs = []
+        for path in (baseline_path, current_path):
+            try:
+                with open(path) as results:
+                    runs.append(json.load(results)['results'])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Cannot read results from {path}: {e}')
+        baseline, current = runs
+
+        self.stdout.write(f"{'route':<46}{'mode':<8}{'metric':<11}{'baseline':>11}{'current':>11}{'change':>9}")
+        regressions = 0
+        for route in sorted(baseline.keys() & current.keys()):
+            for mode, metrics in COMPARED.items():
+                if mode not in baseline[route] or mode not in current[route]:
+                    continue
+                for metric, higher_is_worse in metrics.items():
+                    old, new = baseline[route][mode].get(metric), current[route][mode].get(metric)
+                    if old is None or new is None:
+                        continue
+                    change = (new - old) / old if old else 0.0
+                    if metric == 'queries':
+                        regressed = new > old
+                    else:
+                        regressed = change > threshold if higher_is_worse else change < -threshold
+                    line = f'{route:<46}{mode:<8}{metric:<11}{old:>11}{new:>11}{change:>+9.0%}'
+                    if regressed:
+                        regressions += 1
+                        self.stdout.write(self.style.ERROR(f'{line}  REGRESSION'))
+                    elif verbosity > 1:
+                        self.stdout.write(line)
+        missing = sorted(baseline.keys() ^ current.keys())
+        if missing:
+            self.stdout.write(f"Only in one run: {', '.join(missing)}")
+        if regressions:
+            raise CommandError(f'{regressions} regressions beyond {threshold:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {threshold:.0%}'))
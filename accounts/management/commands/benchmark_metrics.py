@@ -0,0 +1,103 @@
+"""
+Django management command to measure the overhead of the request metrics
+Usage: python manage.py benchmark_metrics --requests 2000
+
+Serves each view through two test clients, one with MetricsMiddleware and
+one without, alternating request by request so that drift in the machine
+affects both alike, and compares the median latencies. (The timing
+template backend stays installed for both; without the middleware it only
+checks that no request is being measured.) Also times the middleware's own
+bookkeeping per request in isolation, which is free of that noise.
+"""
+
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.management.commands.benchmark_wsgi_asgi import Command as HandlerBenchmarkCommand
+from hospital_system import metrics
+
+# Overhead budget, as a share of the view's median latency
+BUDGET = 0.01
+
+
+class Command(HandlerBenchmarkCommand):
+    help = 'Measure the latency overhead of MetricsMiddleware per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per view and mode',
+        )
+
+    def handle(self, *args, **options):
+        without = [path for path in settings.MIDDLEWARE if path != 'hospital_system.metrics.MetricsMiddleware']
+        bookkeeping = self.bookkeeping_seconds()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Metrics overhead ({options['requests']} requests per view and mode; "
+            f"bookkeeping {bookkeeping * 1e6:.1f} us per request)"
+        ))
+        self.stdout.write('-' * 84)
+        self.stdout.write(f"{'view':<36}{'without ms':>12}{'with ms':>12}{'overhead':>12}{'bookkeeping':>12}")
+
+        doctor, patient = self.create_users()
+        worst = 0.0
+        try:
+            urls = [
+                reverse('home'),
+                reverse('patients:doctors_list'),
+                reverse('patients:doctor_details', args=[doctor.doctor_profile.id]),
+                reverse('appointments:my_appointments'),
+            ]
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                session_key = self.login(patient)
+                for url in urls:
+                    clients = {'with': Client(), 'without': Client()}
+                    for mode, client in clients.items():
+                        client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+                        # The middleware chain is built on a client's first request
+                        with override_settings(MIDDLEWARE=settings.MIDDLEWARE if mode == 'with' else without):
+                            client.get(url)
+                    latencies = self.run(clients, url, options['requests'])
+                    base, instrumented = median(latencies['without']), median(latencies['with'])
+                    overhead = (instrumented - base) / base
+                    worst = max(worst, bookkeeping / base)
+                    self.stdout.write(
+                        f"{url:<36}{base * 1000:>12.3f}{instrumented * 1000:>12.3f}"
+                        f"{overhead:>+12.2%}{bookkeeping / base:>12.2%}"
+                    )
+        finally:
+            self.delete_users(doctor, patient)
+            metrics.reset()
+
+        style = self.style.SUCCESS if worst < BUDGET else self.style.WARNING
+        self.stdout.write(style(f'Bookkeeping is at most {worst:.2%} of a request (budget {BUDGET:.0%})'))
+
+    def run(self, clients, url, requests):
+        latencies = {mode: [] for mode in clients}
+        modes = list(clients)
+        for i in range(requests):
+            # Take turns going first, in case the second request benefits
+            for mode in modes if i % 2 else reversed(modes):
+                started = perf_counter()
+                clients[mode].get(url)
+                latencies[mode].append(perf_counter() - started)
+        return latencies
+
+    def bookkeeping_seconds(self, iterations=100000):
+        """Seconds the middleware adds to a request, measured without one."""
+        middleware = metrics.MetricsMiddleware(lambda request: response)
+        response = type('Response', (), {'streaming': False, 'content': b'', 'status_code': 200})()
+        request = type('Request', (), {'resolver_match': None, 'method': 'GET'})()
+        started = perf_counter()
+        for _ in range(iterations):
+            middleware(request)
+        elapsed = perf_counter() - started
+        metrics.reset()
+        return elapsed / iterations
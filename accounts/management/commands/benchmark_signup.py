@@ -0,0 +1,130 @@
+"""
+Django management command to measure signups per second per core
+Usage: python manage.py benchmark_signup --signups 200 --concurrency 4
+
+Compares the signup service (accounts.signup, one password hash) with the
+previous flow, which saved the user, created the profile outside a
+transaction and logged in through authenticate(), hashing the password a
+second time. Uses the configured PASSWORD_HASHERS; no emails are sent.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from itertools import count
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import authenticate, login
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from accounts.backends import invalidate_user
+from accounts.forms import PatientSignUpForm
+from accounts.management.commands.benchmark_wsgi_asgi import percentile
+from accounts.models import User
+from accounts.signup import sign_up
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+
+USERNAME_PREFIX = 'benchmark-signup-'
+PASSWORD = 'Tr0ubadour-Horse-Staple'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark signups per second per core, with and without the single-hash signup service'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--signups',
+            type=int,
+            default=200,
+            help='Signups per mode',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker threads (defaults to the number of cores)',
+        )
+        parser.add_argument(
+            '--hashing-threads',
+            type=int,
+            default=0,
+            help='ACCOUNTS_HASHING_THREADS for the service mode',
+        )
+
+    def handle(self, *args, **options):
+        signups = options['signups']
+        concurrency = options['concurrency']
+        cores = min(concurrency, os.cpu_count())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Signup benchmark ({signups} signups, concurrency {concurrency}, {settings.PASSWORD_HASHERS[0]})'
+        ))
+        self.stdout.write('-' * 76)
+        self.stdout.write(f"{'mode':<16}{'signups/s':>12}{'per core':>12}{'p50 ms':>12}{'p95 ms':>12}")
+
+        self.usernames = count()
+        try:
+            for mode, signup in (('authenticate', self.signup_with_authenticate), ('service', self.signup_with_service)):
+                with override_settings(ACCOUNTS_HASHING_THREADS=options['hashing_threads']):
+                    elapsed, latencies = self.run(signup, signups, concurrency)
+                rate = len(latencies) / elapsed
+                self.stdout.write(
+                    f"{mode:<16}{rate:>12.1f}{rate / cores:>12.1f}"
+                    f"{percentile(latencies, 50):>12.2f}{percentile(latencies, 95):>12.2f}"
+                )
+        finally:
+            user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+            with suppress_email_signals():
+                User.objects.filter(pk__in=user_ids).delete()
+            for user_id in user_ids:
+                invalidate_user(user_id)
+
+    def signup_with_authenticate(self, request, form):
+        user = form.save()
+        PatientProfile.objects.create(user=user)
+        user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password1'])
+        login(request, user)
+
+    def signup_with_service(self, request, form):
+        sign_up(request, form, PatientProfile)
+
+    def run(self, signup, signups, concurrency):
+        factory = RequestFactory()
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+
+        def worker(signups):
+            latencies = []
+            try:
+                with suppress_email_signals():
+                    for _ in range(signups):
+                        username = f'{USERNAME_PREFIX}{next(self.usernames)}'
+                        request = factory.post('/accounts/patient/signup/')
+                        request.session = session_store()
+                        request.user = AnonymousUser()
+                        started = perf_counter()
+                        form = PatientSignUpForm({
+                            'username': username, 'first_name': 'Benchmark', 'last_name': 'Signup',
+                            'email': f'{username}@example.com', 'phone_number': '555',
+                            'password1': PASSWORD, 'password2': PASSWORD,
+                        })
+                        if not form.is_valid():
+                            raise ValueError(form.errors.as_text())
+                        signup(request, form)
+                        latencies.append((perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            return latencies
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = perf_counter()
+            results = list(pool.map(worker, self.split(signups, concurrency)))
+            elapsed = perf_counter() - started
+        return elapsed, [latency for latencies in results for latency in latencies]
+
+    def split(self, total, workers):
+        return [total // workers + (i < total % workers) for i in range(workers)]
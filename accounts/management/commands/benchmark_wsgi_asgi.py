@@ -0,0 +1,170 @@
+"""
+Django management command to compare concurrent throughput of the read-only
+views through the WSGI and ASGI handlers
+Usage: python manage.py benchmark_wsgi_asgi --requests 400 --concurrency 20
+
+WSGI mode drives the sync handler from a pool of threads (one request per
+thread at a time, like gunicorn's gthread workers); ASGI mode drives the async
+handler from a single event loop with ``--concurrency`` requests in flight
+(like one uvicorn worker). Both run in-process through the test client, so
+the numbers compare the handlers and views, not the network stack.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.backends import invalidate_user
+from accounts.models import User
+from appointments.models import AvailabilitySlot, Appointment
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+
+
+def percentile(values, p):
+    """The ``p``th percentile of ``values`` (nearest rank), or 0 for none."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent-request throughput of the read-only views under WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Requests per view and handler',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Requests in flight (threads for WSGI, tasks for ASGI)',
+        )
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        concurrency = options['concurrency']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'WSGI vs ASGI benchmark ({requests} requests, concurrency {concurrency})'
+        ))
+        self.stdout.write('-' * 76)
+        self.stdout.write(f"{'view':<32}{'handler':<9}{'req/s':>11}{'p50 ms':>12}{'p95 ms':>12}")
+
+        # Worker threads use their own connections, so the data is committed
+        # and deleted afterwards instead of rolled back
+        doctor, patient = self.create_users()
+        try:
+            urls = [
+                reverse('patients:dashboard'),
+                reverse('patients:doctors_list'),
+                reverse('patients:doctor_details', args=[doctor.doctor_profile.id]),
+                reverse('appointments:my_appointments'),
+            ]
+            # The test clients send Host: testserver
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                session_key = self.login(patient)
+                for url in urls:
+                    for handler, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                        elapsed, latencies = run(url, session_key, requests, concurrency)
+                        self.stdout.write(
+                            f"{url:<32}{handler:<9}{len(latencies) / elapsed:>11.1f}"
+                            f"{percentile(latencies, 50):>12.2f}{percentile(latencies, 95):>12.2f}"
+                        )
+        finally:
+            self.delete_users(doctor, patient)
+
+    def create_users(self):
+        with suppress_email_signals():
+            doctor = User.objects.create_user(
+                'benchmark-doctor', 'benchmark-doctor@example.com', 'benchmark', role=User.DOCTOR,
+                first_name='Benchmark',
+            )
+            patient = User.objects.create_user(
+                'benchmark-patient', 'benchmark-patient@example.com', 'benchmark', role=User.PATIENT
+            )
+            doctor_profile = DoctorProfile.objects.create(user=doctor, specialization='Benchmarking')
+            patient_profile = PatientProfile.objects.create(user=patient)
+            tomorrow = timezone.now().date() + timedelta(days=1)
+            for hour in range(9, 17):
+                slot = AvailabilitySlot.objects.create(
+                    doctor=doctor_profile,
+                    date=tomorrow,
+                    start_time=time(hour),
+                    end_time=time(hour, 30),
+                    is_booked=hour < 14,
+                )
+                if slot.is_booked:
+                    Appointment.objects.create(
+                        patient=patient_profile, doctor=doctor_profile, availability_slot=slot, reason='Benchmark'
+                    )
+        return doctor, patient
+
+    def delete_users(self, doctor, patient):
+        with suppress_email_signals():
+            User.objects.filter(pk__in=[doctor.pk, patient.pk]).delete()
+        invalidate_user(doctor.pk)
+        invalidate_user(patient.pk)
+
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def run_wsgi(self, url, session_key, requests, concurrency):
+        def worker(count):
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            client.get(url)  # warm up
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = perf_counter()
+                    client.get(url)
+                    latencies.append((perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            return latencies
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = perf_counter()
+            results = list(pool.map(worker, self.split(requests, concurrency)))
+            elapsed = perf_counter() - started
+        return elapsed, [latency for latencies in results for latency in latencies]
+
+    def run_asgi(self, url, session_key, requests, concurrency):
+        async def worker(count):
+            client = AsyncClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            await client.get(url)  # warm up
+            latencies = []
+            for _ in range(count):
+                started = perf_counter()
+                await client.get(url)
+                latencies.append((perf_counter() - started) * 1000)
+            return latencies
+
+        async def run():
+            started = perf_counter()
+            results = await asyncio.gather(*(worker(count) for count in self.split(requests, concurrency)))
+            return perf_counter() - started, [latency for latencies in results for latency in latencies]
+
+        return asyncio.run(run())
+
+    def split(self, requests, concurrency):
+        """Spread ``requests`` over ``concurrency`` workers."""
+        return [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
@@ -0,0 +1,251 @@
+"""
+Django management command to import doctors and patients from a CSV or JSONL file
+Usage: python manage.py import_users users.csv [--role patient] [--welcome-emails batch]
+
+Each row (a CSV line with a header, or a JSON object per line) has username,
+email, password, first_name, last_name, phone_number and role ('doctor' or
+'patient'; --role fills it in when the file has none), plus any DoctorProfile
+or PatientProfile fields such as specialization or date_of_birth. Rows
+without a password get an unusable one.
+
+The file is streamed in chunks of --chunk-size rows. Passwords are hashed
+across a pool of --workers processes while the previous chunk's users and
+profiles are bulk-inserted, one transaction per chunk. Usernames that
+already exist are skipped, so an interrupted import can be run again.
+
+Bulk inserts send no post_save signals, so no welcome emails go out unless
+--welcome-emails batch sends them after each chunk commits.
+"""
+
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from time import perf_counter
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from accounts.models import User
+from appointments.sharding import is_sharded, placement_for
+from appointments.versions import DOCTORS, bump_version
+from doctors.models import DoctorProfile
+from emails.signals import send_welcome
+from patients.models import PatientProfile
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name', 'phone_number')
+PROFILE_MODELS = {User.DOCTOR: DoctorProfile, User.PATIENT: PatientProfile}
+
+# Profile fields a row may set (the shard and digest bookkeeping are not imported)
+PROFILE_FIELDS = {
+    role: [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in ('user', 'shard', 'last_digest_sent_at')
+    ]
+    for role, model in PROFILE_MODELS.items()
+}
+
+
+def hash_password(password):
+    # Runs in the worker processes
+    return make_password(password)
+
+
+class Command(BaseCommand):
+    help = 'Import doctors and patients (users with their profiles) from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSONL (.jsonl/.ndjson)')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--role',
+            choices=tuple(PROFILE_MODELS),
+            help='Role for rows that have none',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows per transaction',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Password hashing processes; 0 hashes in this process',
+        )
+        parser.add_argument(
+            '--welcome-emails',
+            choices=('none', 'batch'),
+            default='none',
+            help='Send welcome emails after each chunk commits (batch) or not at all (none)',
+        )
+        parser.add_argument(
+            '--email-threads',
+            type=int,
+            default=8,
+            help='Concurrent welcome emails with --welcome-emails batch',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.verbosity = options['verbosity']
+        self.default_role = options['role']
+        self.welcome_emails = options['welcome_emails'] == 'batch'
+        self.email_threads = options['email_threads']
+        self.counts = {'imported': 0, 'doctors': 0, 'patients': 0, 'existing': 0, 'invalid': 0, 'emails': 0}
+
+        try:
+            source = open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        # Workers only hash, so the settings (PASSWORD_HASHERS) are all they set up
+        pool = ProcessPoolExecutor(options['workers'], initializer=django.setup) if options['workers'] else None
+        started = perf_counter()
+        try:
+            with source:
+                rows = self.read(source, file_format)
+                pending = None
+                while chunk := list(islice(rows, options['chunk_size'])):
+                    # The pending chunk's users aren't in the database yet
+                    chunk = self.clean(chunk, taken={user.username for user, _, _ in pending[0]} if pending else set())
+                    passwords = [password for _, password, _ in chunk]
+                    if pool is None:
+                        hashed = map(hash_password, passwords)
+                    else:
+                        # Submitted now, hashed while the previous chunk is inserted
+                        hashed = pool.map(hash_password, passwords, chunksize=max(len(passwords) // (4 * options['workers']), 1))
+                    if pending:
+                        self.insert(*pending)
+                    pending = (chunk, hashed)
+                    self.report_progress(started)
+                if pending:
+                    self.insert(*pending)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        elapsed = perf_counter() - started
+        counts = self.counts
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['imported']} users ({counts['doctors']} doctors, {counts['patients']} patients) "
+            f"in {elapsed:.1f}s, {counts['imported'] / elapsed if elapsed else 0:.0f} rows/s; "
+            f"skipped {counts['existing']} existing and {counts['invalid']} invalid rows"
+            + (f"; sent {counts['emails']} welcome emails" if self.welcome_emails else '')
+        ))
+
+    def read(self, source, file_format):
+        """Yield (line number, row dict) from ``source`` without reading it all."""
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(source, 1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        self.invalid(line_number, f'not JSON ({e})')
+                        continue
+                    if isinstance(row, dict):
+                        yield line_number, row
+                    else:
+                        self.invalid(line_number, 'not a JSON object')
+
+    def clean(self, chunk, taken):
+        """
+        Validate and convert a chunk's rows.
+
+        Returns (unsaved user, raw password, profile field values) for each
+        good row. Rows whose username exists already, is ``taken`` or came
+        earlier in the chunk are skipped.
+        """
+        existing = taken | set(User.objects.filter(
+            username__in=[row.get('username') for _, row in chunk]
+        ).values_list('username', flat=True))
+        cleaned = []
+        for line_number, row in chunk:
+            row = {key: (value.strip() if isinstance(value, str) else value) for key, value in row.items()}
+            username = row.get('username')
+            role = row.get('role') or self.default_role
+            if not username:
+                self.invalid(line_number, 'no username')
+                continue
+            if role not in PROFILE_MODELS:
+                self.invalid(line_number, f"role must be one of {', '.join(PROFILE_MODELS)}")
+                continue
+            if username in existing:
+                self.counts['existing'] += 1
+                continue
+            user = User(role=role, **{field: row.get(field) or '' for field in USER_FIELDS})
+            try:
+                user.clean_fields(exclude=['password'])
+                profile_values = {
+                    field.attname: field.to_python(row[field.name])
+                    for field in PROFILE_FIELDS[role]
+                    if row.get(field.name) not in (None, '')
+                }
+            except ValidationError as e:
+                self.invalid(line_number, '; '.join(e.messages))
+                continue
+            existing.add(username)
+            cleaned.append((user, row.get('password') or None, profile_values))
+        return cleaned
+
+    def insert(self, chunk, hashed):
+        users = [user for user, _, _ in chunk]
+        for user, password in zip(users, hashed):
+            user.password = password
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            profiles = {role: [] for role in PROFILE_MODELS}
+            for user, _, profile_values in chunk:
+                profiles[user.role].append(PROFILE_MODELS[user.role](user=user, **profile_values))
+            for role, model in PROFILE_MODELS.items():
+                model.objects.bulk_create(profiles[role])
+            if profiles[User.DOCTOR]:
+                self.place_doctors(profiles[User.DOCTOR])
+
+        self.counts['imported'] += len(users)
+        self.counts['doctors'] += len(profiles[User.DOCTOR])
+        self.counts['patients'] += len(profiles[User.PATIENT])
+        if self.welcome_emails and users:
+            with ThreadPoolExecutor(self.email_threads) as pool:
+                self.counts['emails'] += sum(pool.map(self.send_welcome, users))
+
+    def place_doctors(self, doctors):
+        """What appointments.signals does for doctors saved one at a time."""
+        if is_sharded():
+            by_shard = {}
+            for doctor in doctors:
+                by_shard.setdefault(placement_for(doctor.id), []).append(doctor.id)
+            for shard, ids in by_shard.items():
+                DoctorProfile.objects.filter(id__in=ids).update(shard=shard)
+        transaction.on_commit(lambda: bump_version(DOCTORS))
+
+    def send_welcome(self, user):
+        try:
+            send_welcome(user)
+        finally:
+            connections.close_all()
+        return 1
+
+    def invalid(self, line_number, reason):
+        self.counts['invalid'] += 1
+        self.stderr.write(f'Line {line_number}: {reason}')
+
+    def report_progress(self, started):
+        if self.verbosity >= 2:
+            elapsed = perf_counter() - started
+            self.stdout.write(f"{self.counts['imported']} users imported ({self.counts['imported'] / elapsed:.0f} rows/s)")
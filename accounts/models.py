@@ -7,9 +7,33 @@ from django.contrib.auth.models import AbstractUser
     
 
 # accounts/models.py
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Update the rows and drop the users cached by accounts.backends.
+
+        update() sends no post_save, so without this a user deactivated or
+        given a new password this way would keep being served from the cache.
+        """
+        from .backends import invalidate_users, user_cache_timeout
+
+        if not user_cache_timeout():
+            return super().update(**kwargs)
+        ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_users(ids)
+        return rows
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     DOCTOR = 'doctor'
     PATIENT = 'patient'
@@ -20,6 +44,8 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=PATIENT)
     phone_number = models.CharField(max_length=15, blank=True)
+
+    objects = UserManager()
     
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -28,4 +54,15 @@ class User(AbstractUser):
         return self.role == self.DOCTOR
     
     def is_patient(self):
-        return self.role == self.PATIENT
\ No newline at end of file
+        return self.role == self.PATIENT
+
+    @property
+    def role_profile(self):
+        """The DoctorProfile or PatientProfile for this user's role, or None."""
+        relation = {self.DOCTOR: 'doctor_profile', self.PATIENT: 'patient_profile'}.get(self.role)
+        if relation is None:
+            return None
+        try:
+            return getattr(self, relation)
+        except ObjectDoesNotExist:
+            return None
\ No newline at end of file
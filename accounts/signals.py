@@ -0,0 +1,37 @@
+# accounts/signals.py
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from doctors.models import DoctorProfile
+from patients.models import PatientProfile
+from .backends import RoleProfileBackend, invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+@receiver(post_save, sender=PatientProfile)
+@receiver(post_delete, sender=PatientProfile)
+def invalidate_cached_profile_user(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(user_logged_in)
+def cache_logged_in_user(sender, request, user, **kwargs):
+    # Runs after update_last_login has saved the user; reload it with its
+    # role profile so the first page after login is served from the cache
+    invalidate_user(user.pk)
+    RoleProfileBackend().get_user(user.pk)
+
+
+@receiver(user_logged_out)
+def uncache_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
@@ -0,0 +1,56 @@
+# accounts/signup.py
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.db import transaction
+
+from emails.signals import email_signals_suppressed, send_welcome, suppress_email_signals
+
+_hashing_pool = None
+
+
+def hashing_pool():
+    """
+    Executor for password hashing, or None to hash in the calling thread.
+
+    Sized by ACCOUNTS_HASHING_THREADS. PBKDF2 releases the GIL, so a pool
+    the size of the machine's cores bounds how much CPU a burst of signups
+    takes from the requests being served alongside it.
+    """
+    global _hashing_pool
+    threads = getattr(settings, 'ACCOUNTS_HASHING_THREADS', 0)
+    if not threads:
+        return None
+    if _hashing_pool is None:
+        _hashing_pool = ThreadPoolExecutor(threads, thread_name_prefix='password-hashing')
+    return _hashing_pool
+
+
+def sign_up(request, form, profile_model):
+    """
+    Create the user from a valid signup ``form`` with its role profile, and log them in.
+
+    The password is hashed once, by form.save(). The user and the profile
+    are saved in one transaction, and the welcome email goes out once it
+    commits (unless emails are suppressed). The new user is logged in
+    directly rather than through authenticate(), which would hash the
+    password a second time to check it.
+    """
+    pool = hashing_pool()
+    if pool is None:
+        user = form.save(commit=False)
+    else:
+        user = pool.submit(form.save, commit=False).result()
+
+    welcome = not email_signals_suppressed()
+    with transaction.atomic():
+        with suppress_email_signals():
+            user.save()
+        profile_model.objects.create(user=user)
+        if welcome:
+            transaction.on_commit(partial(send_welcome, user))
+
+    login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+    return user
@@ -1,3 +1,218 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import base_user
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from appointments.tests import AllShards
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+from .checks import check_user_cache_is_shared
+from .models import User
+
+
+class RoleProfileLoadingTests(AllShards, TestCase):
+    def setUp(self):
+        cache.clear()
+        with suppress_email_signals():
+            self.user = User.objects.create_user('doc', 'doc@example.com', 'pw', role=User.DOCTOR)
+        self.profile = DoctorProfile.objects.create(user=self.user)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', ACCOUNTS_USER_CACHE_TIMEOUT=0)
+    def test_dashboard_loads_user_and_profile_in_one_query(self):
+        self.client.force_login(self.user)
+
+        # session, user joined with profile, upcoming appointments
+        with self.assertNumQueriesOnAllShards(3):
+            response = self.client.get(reverse('doctors:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['doctor'], self.profile)
+
+    def test_cached_session_and_user_skip_the_database(self):
+        self.client.force_login(self.user)
+
+        # only the upcoming appointments
+        with self.assertNumQueriesOnAllShards(1):
+            response = self.client.get(reverse('doctors:dashboard'))
+
+        self.assertEqual(response.context['doctor'], self.profile)
+
+    def test_saving_user_or_profile_invalidates_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('doctors:dashboard'))
+
+        self.user.first_name = 'Gregory'
+        self.user.save()
+        self.profile.specialization = 'Diagnostics'
+        self.profile.save()
+        response = self.client.get(reverse('doctors:dashboard'))
+
+        self.assertEqual(response.context['user'].first_name, 'Gregory')
+        self.assertEqual(response.context['doctor'].specialization, 'Diagnostics')
+
+    def test_deactivating_through_update_logs_the_user_out(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('doctors:dashboard'))
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.client.get(reverse('doctors:dashboard')).status_code, 302)
+
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(reverse('doctors:dashboard'))
+
+        self.assertEqual(response.context['doctor'], self.profile)
+
+    def test_role_profile_is_none_without_profile(self):
+        self.profile.delete()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('doctors:dashboard'))
+
+        self.assertRedirects(response, reverse('accounts:login'))
+
+
+
+class SignupTests(AllShards, TestCase):
+    form = {
+        'username': 'lisa', 'first_name': 'Lisa', 'last_name': 'Cuddy', 'email': 'lisa@example.com',
+        'phone_number': '555', 'password1': 'Pr1nceton-Plainsboro', 'password2': 'Pr1nceton-Plainsboro',
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('emails.client.send_welcome_email', return_value={'success': True})
+    def test_signup_hashes_once_and_logs_in(self, send_welcome_email):
+        with mock.patch.object(base_user, 'make_password', wraps=base_user.make_password) as make_password, \
+                mock.patch.object(base_user, 'check_password', wraps=base_user.check_password) as check_password, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('accounts:patient_signup'), self.form)
+
+        self.assertRedirects(response, reverse('patients:dashboard'))
+        self.assertEqual(make_password.call_count, 1)
+        check_password.assert_not_called()
+        user = User.objects.get(username='lisa')
+        self.assertTrue(PatientProfile.objects.filter(user=user).exists())
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        send_welcome_email.assert_called_once()
+
+    @mock.patch('emails.client.send_welcome_email')
+    def test_failed_profile_rolls_back_user_and_sends_nothing(self, send_welcome_email):
+        with mock.patch.object(PatientProfile.objects, 'create', side_effect=IntegrityError), \
+                self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+            self.client.post(reverse('accounts:patient_signup'), self.form)
+
+        self.assertFalse(User.objects.filter(username='lisa').exists())
+        send_welcome_email.assert_not_called()
+
+    @override_settings(ACCOUNTS_HASHING_THREADS=2)
+    def test_hashing_pool(self):
+        with suppress_email_signals():
+            self.client.post(reverse('accounts:doctor_signup'), self.form)
+
+        self.assertTrue(User.objects.get(username='lisa').check_password('Pr1nceton-Plainsboro'))
+        self.assertTrue(DoctorProfile.objects.filter(user__username='lisa').exists())
+
+
+class ImportUsersTests(AllShards, TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def import_users(self, name, content, **options):
+        path = self.directory / name
+        path.write_text(content)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_users', str(path), stdout=stdout, stderr=stderr, **{'workers': 0, **options})
+        return stdout.getvalue(), stderr.getvalue()
+
+    @mock.patch('emails.client.send_welcome_email')
+    def test_csv_import_creates_users_and_profiles_without_emails(self, send_welcome_email):
+        output, errors = self.import_users('users.csv', (
+            'username,email,password,first_name,role,specialization,experience_years,date_of_birth\n'
+            'house,house@example.com,vicodin,Gregory,doctor,Diagnostics,20,\n'
+            'lisa,lisa@example.com,,Lisa,patient,,,1970-01-01\n'
+            'bad,bad@example.com,pw,Bad,doctor,Surgery,lots,\n'
+        ), chunk_size=2)
+
+        house = User.objects.get(username='house')
+        self.assertTrue(house.check_password('vicodin'))
+        self.assertEqual(house.doctor_profile.experience_years, 20)
+        lisa = User.objects.get(username='lisa')
+        self.assertFalse(lisa.has_usable_password())
+        self.assertEqual(str(lisa.patient_profile.date_of_birth), '1970-01-01')
+        self.assertFalse(User.objects.filter(username='bad').exists())
+        self.assertIn('Line 4', errors)
+        self.assertIn('Imported 2 users (1 doctors, 1 patients)', output)
+        send_welcome_email.assert_not_called()
+
+    def test_rerun_skips_existing_usernames(self):
+        content = ''.join(
+            json.dumps({'username': f'patient{i}', 'email': f'patient{i}@example.com', 'password': 'pw'}) + '\n'
+            for i in range(5)
+        )
+        self.import_users('users.jsonl', content, role='patient', chunk_size=2)
+
+        output, _ = self.import_users('users.jsonl', content + content, role='patient', chunk_size=3)
+
+        self.assertEqual(PatientProfile.objects.count(), 5)
+        self.assertIn('Imported 0 users', output)
+        self.assertIn('skipped 10 existing', output)
+
+    @mock.patch('emails.client.send_welcome_email', return_value={'success': True})
+    def test_batched_welcome_emails_and_hashing_processes(self, send_welcome_email):
+        output, _ = self.import_users(
+            'users.jsonl',
+            '{"username": "wilson", "email": "wilson@example.com", "password": "pw", "role": "doctor"}\n',
+            workers=2, welcome_emails='batch',
+        )
+
+        self.assertTrue(User.objects.get(username='wilson').check_password('pw'))
+        send_welcome_email.assert_called_once()
+        self.assertIn('sent 1 welcome emails', output)
+
+
+class SharedCacheCheckTests(AllShards, TestCase):
+    @override_settings(DEBUG=False)
+    def test_user_and_session_caches_need_a_shared_cache(self):
+        self.assertEqual(
+            [error.id for error in check_user_cache_is_shared(None)], ['accounts.E001', 'accounts.E002']
+        )
+        with override_settings(
+            ACCOUNTS_USER_CACHE_TIMEOUT=0, SESSION_ENGINE='django.contrib.sessions.backends.db'
+        ):
+            self.assertEqual(check_user_cache_is_shared(None), [])
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertEqual(check_user_cache_is_shared(None), [])
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    def write(self, directory, name, queries, p95_ms):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as results:
+            json.dump({'results': {'GET home': {'client': {'queries': queries, 'p95_ms': p95_ms}}}}, results)
+        return path
+
+    def test_flags_slower_and_chattier_routes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = self.write(directory, 'baseline.json', queries=2, p95_ms=10.0)
+            call_command('benchmark_http', compare=[baseline, self.write(directory, 'same.json', 2, 10.5)], stdout=StringIO())
+            for queries, p95_ms in ((3, 10.0), (2, 12.0)):
+                current = self.write(directory, 'current.json', queries, p95_ms)
+                with self.assertRaisesMessage(CommandError, '1 regressions'):
+                    call_command('benchmark_http', compare=[baseline, current], stdout=StringIO())
@@ -5,6 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
 from .forms import DoctorSignUpForm, PatientSignUpForm, LoginForm
+from .signup import sign_up
 
 def signup_view(request):
     return render(request, 'accounts/signup.html')
@@ -13,16 +14,9 @@ def doctor_signup_view(request):
     if request.method == 'POST':
         form = DoctorSignUpForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            # Create DoctorProfile
+            # Creates the DoctorProfile too, and logs the user in
             from doctors.models import DoctorProfile
-            DoctorProfile.objects.create(user=user)
-            
-            # Log the user in
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password1')
-            user = authenticate(username=username, password=password)
-            login(request, user)
+            sign_up(request, form, DoctorProfile)
             return redirect('doctors:dashboard')
     else:
         form = DoctorSignUpForm()
@@ -32,16 +26,9 @@ def patient_signup_view(request):
     if request.method == 'POST':
         form = PatientSignUpForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            # Create PatientProfile
+            # Creates the PatientProfile too, and logs the user in
             from patients.models import PatientProfile
-            PatientProfile.objects.create(user=user)
-            
-            # Log the user in
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password1')
-            user = authenticate(username=username, password=password)
-            login(request, user)
+            sign_up(request, form, PatientProfile)
             return redirect('patients:dashboard')
     else:
         form = PatientSignUpForm()
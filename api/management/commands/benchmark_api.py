@@ -0,0 +1,93 @@
+"""
+Django management command to compare the JSON API with the HTML pages it replaces
+Usage: python manage.py benchmark_api --requests 400 --concurrency 20
+
+Each pair is driven from a pool of threads through the sync handler, the
+HTML page with a session cookie and the API with a JWT access token. Both
+run in-process through the test client.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.management.commands.benchmark_wsgi_asgi import Command as HandlerBenchmarkCommand, percentile
+from api.serializers import RoleTokenObtainPairSerializer
+
+
+class Command(HandlerBenchmarkCommand):
+    help = 'Compare throughput of the JSON API with the HTML views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Requests per endpoint',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Worker threads',
+        )
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        concurrency = options['concurrency']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'JSON API vs HTML benchmark ({requests} requests, concurrency {concurrency})'
+        ))
+        self.stdout.write('-' * 90)
+        self.stdout.write(f"{'endpoint':<40}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>10}")
+
+        # Worker threads use their own connections, so the data is committed
+        # and deleted afterwards instead of rolled back
+        doctor, patient = self.create_users()
+        try:
+            doctor_id = doctor.doctor_profile.id
+            pairs = [
+                (reverse('patients:doctors_list'), reverse('api:doctors')),
+                (reverse('patients:doctor_details', args=[doctor_id]), reverse('api:doctor_slots', args=[doctor_id])),
+                (reverse('appointments:my_appointments'), reverse('api:my_appointments')),
+            ]
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                session_client = {'cookies': {settings.SESSION_COOKIE_NAME: self.login(patient)}}
+                token = RoleTokenObtainPairSerializer.get_token(patient).access_token
+                api_client = {'headers': {'Authorization': f'Bearer {token}'}}
+                for html_url, api_url in pairs:
+                    for url, client_options in ((html_url, session_client), (api_url, api_client)):
+                        elapsed, latencies, size = self.run(url, client_options, requests, concurrency)
+                        self.stdout.write(
+                            f"{url:<40}{len(latencies) / elapsed:>10.1f}{percentile(latencies, 50):>10.2f}"
+                            f"{percentile(latencies, 95):>10.2f}{size:>10}"
+                        )
+        finally:
+            self.delete_users(doctor, patient)
+
+    def run(self, url, client_options, requests, concurrency):
+        def worker(count):
+            client = Client(headers=client_options.get('headers'))
+            for name, value in client_options.get('cookies', {}).items():
+                client.cookies[name] = value
+            size = len(client.get(url).content)  # warm up
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = perf_counter()
+                    client.get(url)
+                    latencies.append((perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            return latencies, size
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = perf_counter()
+            results = list(pool.map(worker, self.split(requests, concurrency)))
+            elapsed = perf_counter() - started
+        return elapsed, [latency for latencies, _ in results for latency in latencies], results[0][1]
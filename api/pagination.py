@@ -0,0 +1,55 @@
+# api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+from appointments.sharding import is_sharded, scatter_gather
+
+
+class ShardedQuerySet:
+    """
+    The queryset methods CursorPagination uses, run on every shard.
+
+    Slicing gathers the rows from all shards (scatter_gather) and merges
+    them on the queryset's ordering, which must run one way throughout.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def order_by(self, *fields):
+        return ShardedQuerySet(self.queryset.order_by(*fields))
+
+    def filter(self, *args, **kwargs):
+        return ShardedQuerySet(self.queryset.filter(*args, **kwargs))
+
+    def __getitem__(self, page):
+        ordering = self.queryset.query.order_by
+        names = [field.lstrip('-') for field in ordering]
+        rows = scatter_gather(
+            self.queryset,
+            key=lambda obj: tuple(getattr(obj, name) for name in names),
+            reverse=ordering[0].startswith('-'),
+            limit=page.stop,
+        )
+        return rows[page]
+
+
+class Cursor(CursorPagination):
+    """
+    Cursor pagination; pages stay cheap however far a client scrolls.
+
+    Views set ``ordering``. Querysets of sharded models are paged across
+    every shard.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = view.ordering
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if getattr(view, 'sharded', False) and is_sharded():
+            queryset = ShardedQuerySet(queryset)
+        return super().paginate_queryset(queryset, request, view)
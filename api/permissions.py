@@ -0,0 +1,18 @@
+# api/permissions.py
+from rest_framework.permissions import BasePermission
+
+from accounts.models import User
+
+
+class IsPatient(BasePermission):
+    """
+    The access token belongs to a patient (see RoleTokenObtainPairSerializer).
+
+    Views read the PatientProfile id from ``request.auth['profile_id']``.
+    """
+
+    message = 'You need to be logged in as a patient to use this endpoint.'
+
+    def has_permission(self, request, view):
+        token = request.auth
+        return token is not None and token.get('role') == User.PATIENT and token.get('profile_id') is not None
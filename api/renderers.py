@@ -0,0 +1,28 @@
+# api/renderers.py
+from decimal import Decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+
+def _default(obj):
+    # Types orjson doesn't serialize itself
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON renderer backed by orjson, several times faster than the json module."""
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None  # JSON is always UTF-8
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_default)
@@ -0,0 +1,60 @@
+# api/serializers.py
+from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from appointments.models import Appointment, AvailabilitySlot
+from doctors.models import DoctorProfile
+
+# Fields read through relations expect the views to load them with
+# select_related() (or with_profiles() for appointments), one query per list.
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Tokens that carry the user's role and profile id.
+
+    The API authenticates from the token alone (api.permissions), without
+    loading the user or a session.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        profile = user.role_profile
+        token['role'] = user.role
+        token['profile_id'] = profile.id if profile else None
+        return token
+
+
+class DoctorSerializer(serializers.ModelSerializer):
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    last_name = serializers.CharField(source='user.last_name', read_only=True)
+
+    class Meta:
+        model = DoctorProfile
+        fields = (
+            'id', 'first_name', 'last_name', 'specialization', 'qualification',
+            'experience_years', 'consultation_fee',
+        )
+
+
+class SlotSerializer(serializers.ModelSerializer):
+    doctor = serializers.IntegerField(source='doctor_id', read_only=True)
+
+    class Meta:
+        model = AvailabilitySlot
+        fields = ('id', 'doctor', 'date', 'start_time', 'end_time')
+
+
+class AppointmentSerializer(serializers.ModelSerializer):
+    doctor = DoctorSerializer(read_only=True)
+    slot = SlotSerializer(source='availability_slot', read_only=True)
+
+    class Meta:
+        model = Appointment
+        fields = ('id', 'status', 'reason', 'notes', 'created_at', 'doctor', 'slot')
+
+
+class BookingSerializer(serializers.Serializer):
+    reason = serializers.CharField()
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
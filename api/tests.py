@@ -0,0 +1,149 @@
+from datetime import time, timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from appointments.models import Appointment
+from appointments.sharding import reserve_id_range, shard_for_doctor
+from appointments.tests import AllShards
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+
+
+class ApiFixtures:
+    def setUp(self):
+        cache.clear()
+        with suppress_email_signals():
+            doctor_user = User.objects.create_user(
+                'doc', 'doc@example.com', 'pw', role=User.DOCTOR, first_name='Gregory', last_name='House'
+            )
+            patient_user = User.objects.create_user('pat', 'pat@example.com', 'pw', role=User.PATIENT)
+        self.doctor = DoctorProfile.objects.create(user=doctor_user, specialization='Diagnostics')
+        self.patient = PatientProfile.objects.create(user=patient_user)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self.slots = [
+            self.doctor.availability_slots.create(date=tomorrow, start_time=time(hour), end_time=time(hour, 30))
+            for hour in range(9, 14)
+        ]
+
+    def login(self, username):
+        response = self.client.post(
+            reverse('api:token_obtain'), {'username': username, 'password': 'pw'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {'Authorization': f"Bearer {response.json()['access']}"}
+
+    def book(self, headers, slot, reason='Persistent cough'):
+        with suppress_email_signals():
+            return self.client.post(
+                reverse('api:book_slot', args=[slot.id]), {'reason': reason}, content_type='application/json', headers=headers
+            )
+
+
+class ApiTestCase(AllShards, ApiFixtures, TestCase):
+    pass
+
+
+class ApiAuthTests(ApiTestCase):
+    def test_requires_a_token(self):
+        self.assertEqual(self.client.get(reverse('api:doctors')).status_code, 401)
+
+    def test_doctors_are_refused(self):
+        headers = self.login('doc')
+        self.assertEqual(self.client.get(reverse('api:doctors'), headers=headers).status_code, 403)
+
+    def test_token_requests_load_no_user_or_session(self):
+        headers = self.login('pat')
+        # One query for the page of doctors (users joined)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api:doctors'), headers=headers)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['results'][0]['last_name'], 'House')
+
+
+class ApiSlotAndBookingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers = self.login('pat')
+
+    def test_slots_are_cursor_paginated(self):
+        url = reverse('api:doctor_slots', args=[self.doctor.id])
+        first = self.client.get(url, {'page_size': 3}, headers=self.headers).json()
+        second = self.client.get(first['next'], headers=self.headers).json()
+
+        self.assertEqual(
+            [slot['id'] for slot in first['results'] + second['results']], [slot.id for slot in self.slots]
+        )
+        self.assertIsNone(second['next'])
+        self.assertEqual(first['results'][0]['start_time'], '09:00:00')
+
+    def test_booking_creates_appointment_and_hides_slot(self):
+        response = self.book(self.headers, self.slots[0])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['slot']['id'], self.slots[0].id)
+        self.assertEqual(response.json()['doctor']['first_name'], 'Gregory')
+        appointments = Appointment.objects.using(shard_for_doctor(self.doctor))
+        self.assertTrue(appointments.filter(patient=self.patient, availability_slot=self.slots[0]).exists())
+        slots = self.client.get(reverse('api:doctor_slots', args=[self.doctor.id]), headers=self.headers).json()
+        self.assertNotIn(self.slots[0].id, [slot['id'] for slot in slots['results']])
+
+    def test_booking_a_booked_slot_conflicts(self):
+        self.book(self.headers, self.slots[0])
+
+        response = self.book(self.headers, self.slots[0])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['detail'], 'This slot is already booked.')
+
+    def test_booking_needs_a_reason(self):
+        with suppress_email_signals():
+            response = self.client.post(
+                reverse('api:book_slot', args=[self.slots[0].id]), {}, content_type='application/json', headers=self.headers
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reason', response.json())
+
+    def test_my_appointments_newest_booking_first(self):
+        self.book(self.headers, self.slots[0], reason='First')
+        self.book(self.headers, self.slots[1], reason='Second')
+
+        response = self.client.get(reverse('api:my_appointments'), headers=self.headers)
+
+        self.assertEqual([appointment['reason'] for appointment in response.json()['results']], ['Second', 'First'])
+
+
+@skipUnless('shard1' in settings.DATABASES, 'needs a second database aliased shard1')
+@override_settings(APPOINTMENT_SHARDS=['default', 'shard1'])
+class ApiShardingTests(ApiFixtures, TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        reserve_id_range(using='shard1')
+        super().setUp()
+
+    def test_my_appointments_pages_across_shards(self):
+        with suppress_email_signals():
+            other = User.objects.create_user('wilson', 'wilson@example.com', 'pw', role=User.DOCTOR)
+        other_doctor = DoctorProfile.objects.create(user=other)
+        self.assertNotEqual(other_doctor.shard, self.doctor.shard)
+        other_slot = other_doctor.availability_slots.create(
+            date=self.slots[0].date, start_time=time(15), end_time=time(15, 30)
+        )
+        headers = self.login('pat')
+        for reason, slot in (('First', self.slots[0]), ('Second', other_slot), ('Third', self.slots[1])):
+            self.assertEqual(self.book(headers, slot, reason).status_code, 201)
+
+        first = self.client.get(reverse('api:my_appointments'), {'page_size': 2}, headers=headers).json()
+        second = self.client.get(first['next'], headers=headers).json()
+
+        self.assertEqual(
+            [appointment['reason'] for appointment in first['results'] + second['results']],
+            ['Third', 'Second', 'First'],
+        )
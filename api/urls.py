@@ -0,0 +1,16 @@
+# api/urls.py
+from django.urls import path
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('token/', TokenObtainPairView.as_view(), name='token_obtain'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('doctors/', views.DoctorList.as_view(), name='doctors'),
+    path('doctors/<int:doctor_id>/slots/', views.DoctorSlotList.as_view(), name='doctor_slots'),
+    path('slots/<int:slot_id>/book/', views.BookSlot.as_view(), name='book_slot'),
+    path('appointments/', views.MyAppointmentList.as_view(), name='my_appointments'),
+]
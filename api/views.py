@@ -0,0 +1,77 @@
+# api/views.py
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from appointments.booking import SlotUnavailable, book_slot
+from appointments.models import Appointment, AvailabilitySlot
+from appointments.sharding import locate, with_profiles
+from doctors.models import DoctorProfile
+from patients.models import PatientProfile
+from .serializers import AppointmentSerializer, BookingSerializer, DoctorSerializer, SlotSerializer
+
+
+class DoctorList(generics.ListAPIView):
+    serializer_class = DoctorSerializer
+    ordering = ('id',)
+
+    def get_queryset(self):
+        doctors = DoctorProfile.objects.select_related('user')
+        specialization = self.request.query_params.get('specialization')
+        if specialization:
+            doctors = doctors.filter(specialization__icontains=specialization)
+        return doctors
+
+
+class DoctorSlotList(generics.ListAPIView):
+    """A doctor's free slots from today on, soonest first."""
+
+    serializer_class = SlotSerializer
+    ordering = ('date', 'start_time', 'id')
+
+    def get_queryset(self):
+        doctor = get_object_or_404(DoctorProfile, id=self.kwargs['doctor_id'])
+        # Routed to the doctor's shard
+        return doctor.availability_slots.filter(is_booked=False, date__gte=timezone.now().date())
+
+
+class BookSlot(APIView):
+    """
+    Book a slot: POST {"reason": ..., "notes": ...}.
+
+    201 with the appointment, or 409 if the slot can't be booked.
+    """
+
+    def post(self, request, slot_id):
+        serializer = BookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            slot = locate(AvailabilitySlot.objects.all(), slot_id)
+        except AvailabilitySlot.DoesNotExist:
+            raise NotFound('No AvailabilitySlot matches the given query.')
+
+        # Loaded for the confirmation emails sent on save
+        patient = get_object_or_404(PatientProfile.objects.select_related('user'), id=request.auth['profile_id'])
+        try:
+            appointment = book_slot(patient, slot, **serializer.validated_data)
+        except SlotUnavailable as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+
+class MyAppointmentList(generics.ListAPIView):
+    """The patient's appointments, most recently booked first, from every shard."""
+
+    serializer_class = AppointmentSerializer
+    ordering = ('-created_at', '-id')
+    sharded = True
+
+    def get_queryset(self):
+        return with_profiles(
+            Appointment.objects.filter(patient_id=self.request.auth['profile_id']).select_related('availability_slot'),
+            'doctor__user',
+        )
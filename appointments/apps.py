@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'appointments'
\ No newline at end of file
+    name = 'appointments'
+
+    def ready(self):
+        # Import signals
+        import appointments.signals  # noqa
+        import appointments.checks  # noqa
+        from django.db.models.signals import post_migrate
+        from .sharding import reserve_id_range
+        post_migrate.connect(reserve_id_range, sender=self)
@@ -0,0 +1,118 @@
+# appointments/booking.py
+from django.db import connections, transaction
+
+from .models import Appointment, AvailabilitySlot
+from .sharding import current_shard
+
+
+# Key space of the pg_advisory_xact_lock() taken per doctor by save_slot()
+SLOT_LOCK_NAMESPACE = 1
+
+
+class SlotUnavailable(Exception):
+    """The slot can't be booked; the message says why, for the patient."""
+
+
+class SlotOverlaps(Exception):
+    """The slot's times overlap another of the doctor's slots."""
+
+
+def book_slot(patient, slot, reason, notes=''):
+    """
+    Book ``slot`` (as looked up by the caller) for ``patient``.
+
+    The slot row is locked on its doctor's shard while booking, so two
+    patients can't book the same slot. Returns the new Appointment; raises
+    SlotUnavailable if the slot is taken or has moved to another shard.
+    """
+    if slot.is_booked:
+        raise SlotUnavailable('This slot is already booked.')
+
+    shard = current_shard(slot.doctor_id)
+    with transaction.atomic(using=shard):
+        # Lock the row for update
+        locked = AvailabilitySlot.objects.using(shard).select_for_update().filter(id=slot.id).first()
+
+        if locked is None:
+            # Moved to another shard (move_doctor_shard) since it was looked up
+            raise SlotUnavailable('This slot has just changed. Please try again.')
+
+        if locked.is_booked:
+            raise SlotUnavailable('This slot was just booked by someone else. Please try another slot.')
+
+        appointment = Appointment.objects.using(shard).create(
+            patient=patient,
+            doctor=locked.doctor,
+            availability_slot=locked,
+            reason=reason,
+            notes=notes
+        )
+
+        locked.is_booked = True
+        locked.save()
+    return appointment
+
+
+def lock_doctor_slots(doctor_id, using):
+    """
+    Hold off other save_slot() calls for ``doctor_id`` on ``using`` until
+    the transaction ends.
+
+    The doctor's profile row isn't on the slot's shard to lock, so on
+    PostgreSQL this takes an advisory lock. SQLite lets only one
+    transaction write at a time anyway.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [SLOT_LOCK_NAMESPACE, doctor_id])
+
+
+def save_slot(doctor, date, start_time, end_time, slot=None):
+    """
+    Add a slot for ``doctor``, or move ``slot`` (one of theirs) to new times.
+
+    The overlap check and the write happen under the doctor's slot lock, so
+    two concurrent changes can't both pass the check. A slot being moved is
+    also locked like book_slot() does, and refused if it has been booked
+    since it was looked up. Returns the slot; raises SlotOverlaps or
+    SlotUnavailable.
+    """
+    shard = current_shard(doctor.id)
+    with transaction.atomic(using=shard):
+        lock_doctor_slots(doctor.id, shard)
+        if current_shard(doctor.id) != shard:
+            # move_doctor_shard finished while we waited for the lock
+            raise SlotUnavailable('Your availability has just been moved. Please try again.')
+        if slot is not None:
+            slot = _lock_unbooked(slot, shard, 'Cannot edit a booked slot.')
+        exclude_id = slot.id if slot is not None else None
+        if AvailabilitySlot.check_overlap(doctor, date, start_time, end_time, exclude_id=exclude_id, using=shard):
+            raise SlotOverlaps('This time slot overlaps with an existing slot.')
+
+        if slot is None:
+            return AvailabilitySlot.objects.using(shard).create(
+                doctor=doctor, date=date, start_time=start_time, end_time=end_time
+            )
+        slot.date = date
+        slot.start_time = start_time
+        slot.end_time = end_time
+        slot.save(update_fields=['date', 'start_time', 'end_time'])
+    return slot
+
+
+def delete_slot(slot):
+    """Delete ``slot`` unless it has been booked since it was looked up (SlotUnavailable)."""
+    shard = current_shard(slot.doctor_id)
+    with transaction.atomic(using=shard):
+        _lock_unbooked(slot, shard, 'Cannot delete a booked slot.').delete()
+
+
+def _lock_unbooked(slot, shard, booked_message):
+    """Lock ``slot``'s row on ``shard`` and return it; raises SlotUnavailable if it's booked or gone."""
+    locked = AvailabilitySlot.objects.using(shard).select_for_update().filter(id=slot.id).first()
+    if locked is None:
+        raise SlotUnavailable('This slot has just changed. Please try again.')
+    if locked.is_booked:
+        raise SlotUnavailable(booked_message)
+    return locked
@@ -0,0 +1,19 @@
+# appointments/checks.py
+from django.conf import settings
+from django.core.checks import Error, register, Tags
+
+from accounts.checks import SHARED_CACHE_HINT, local_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_versions_are_shared(app_configs, **kwargs):
+    # A version bump (appointments.versions) only reaches the worker that made
+    # it; the others keep serving cached dashboards and matching ETags
+    if settings.DEBUG or not local_cache():
+        return []
+    return [Error(
+        'Page versions are kept in a per-process cache, so other workers serve stale dashboards '
+        'for up to DASHBOARD_CACHE_TIMEOUT seconds and answer stale ETags with 304.',
+        hint=SHARED_CACHE_HINT,
+        id='appointments.E001',
+    )]
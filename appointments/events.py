@@ -0,0 +1,110 @@
+# appointments/events.py
+"""
+Slot availability events, pushed to patients watching a doctor's page.
+
+Signal handlers publish "booked"/"freed"/"added"/"removed" events per doctor
+after the transaction commits; the SSE view in patients.views streams them to
+subscribers. LocalSlotBroker only reaches subscribers in the same process; set
+SLOT_EVENTS_BROKER to a broker class with the same interface (e.g. one backed
+by Redis pub/sub) when running several ASGI workers.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Events queued for one slow subscriber before older ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One subscriber's queue, fed from any thread."""
+
+    def __init__(self, doctor_id, loop):
+        self.doctor_id = doctor_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next event, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalSlotBroker:
+    """In-process pub/sub of slot events keyed by doctor id."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, doctor_id):
+        """Subscribe the running event loop to ``doctor_id``'s events."""
+        subscription = Subscription(doctor_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[doctor_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.doctor_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.doctor_id]
+
+    def publish(self, doctor_id, event):
+        """Send ``event`` to every subscriber of ``doctor_id``; thread-safe."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(doctor_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed; the subscriber is going away
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, doctor_id=None):
+        with self._lock:
+            if doctor_id is not None:
+                return len(self._subscriptions.get(doctor_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscriptions.values())
+
+
+_broker = None
+
+
+def get_broker():
+    """Get the configured broker (SLOT_EVENTS_BROKER)."""
+    global _broker
+    if _broker is None:
+        _broker = import_string(
+            getattr(settings, 'SLOT_EVENTS_BROKER', 'appointments.events.LocalSlotBroker')
+        )()
+    return _broker
+
+
+def slot_event(slot, event_type):
+    return {
+        'type': event_type,
+        'slot_id': slot.id,
+        'date': str(slot.date),
+        'start_time': str(slot.start_time),
+        'end_time': str(slot.end_time),
+    }
+
+
+def format_sse(event):
+    """Encode ``event`` as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,139 @@
+# appointments/lifecycle.py
+"""
+Housekeeping of appointments and slots that are over.
+
+Scheduled appointments stay 'scheduled' until complete_past_appointments()
+(the complete_appointments command, run from cron) marks the ones whose
+slot has ended as 'completed'. That keeps the scheduled rows, which the
+dashboards filter on, to the appointments still to come.
+
+Unbooked slots from past days are left out of every listing and only take
+up space; purge_past_slots() (the purge_past_slots command) deletes them,
+optionally counting them into SlotUtilization first.
+"""
+from collections import Counter
+
+from django.db import connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Appointment, AvailabilitySlot, SlotUtilization
+from .sharding import shard_for_doctor, shards
+from .versions import DOCTOR, PATIENT, bump_version
+
+
+def ended_before(now):
+    """Appointments whose slot ended by ``now``."""
+    now = timezone.localtime(now)
+    return Q(availability_slot__date__lt=now.date()) | Q(
+        availability_slot__date=now.date(), availability_slot__end_time__lte=now.time()
+    )
+
+
+def complete_past_appointments(batch_size=1000, now=None):
+    """
+    Mark scheduled appointments whose slot ended by ``now`` as completed.
+
+    Each shard is updated in batches of ``batch_size``, one UPDATE and
+    transaction per batch. UPDATEs send no signals, so the dashboard
+    versions of the doctors and patients involved are bumped here. An
+    appointment cancelled meanwhile is left alone. Returns the number
+    completed on each shard.
+    """
+    due = ended_before(now or timezone.now())
+    completed = {}
+    for shard in shards():
+        scheduled = Appointment.objects.using(shard).filter(status='scheduled')
+        completed[shard] = 0
+        while True:
+            with transaction.atomic(using=shard):
+                batch = list(scheduled.filter(due).order_by('id').values_list('id', 'doctor_id', 'patient_id')[:batch_size])
+                if not batch:
+                    break
+                completed[shard] += scheduled.filter(id__in=[row[0] for row in batch]).update(status='completed')
+            for doctor_id in {row[1] for row in batch}:
+                bump_version(DOCTOR, doctor_id)
+            for patient_id in {row[2] for row in batch}:
+                bump_version(PATIENT, patient_id)
+            if len(batch) < batch_size:
+                break
+    return completed
+
+
+def purge_past_slots(batch_size=1000, now=None, rollup=False):
+    """
+    Delete unbooked slots dated before today.
+
+    Each shard is purged in batches of ``batch_size``: the batch's rows are
+    locked (on PostgreSQL skipping any a booking holds) and removed by one
+    DELETE in their own transaction, so bookings never wait long. Nothing
+    shows past unbooked slots, so no signals are sent and no versions
+    bumped. With ``rollup``, each batch is added to SlotUtilization first.
+    Returns the number deleted on each shard.
+    """
+    today = timezone.localtime(now or timezone.now()).date()
+    purged = {}
+    for shard in shards():
+        expired = AvailabilitySlot.objects.using(shard).filter(date__lt=today, is_booked=False).order_by('id')
+        if connections[shard].features.has_select_for_update_skip_locked:
+            expired = expired.select_for_update(skip_locked=True)
+        purged[shard] = 0
+        while True:
+            # The rollup commits after the shard's delete, so a failure never counts slots twice
+            with transaction.atomic(), transaction.atomic(using=shard):
+                batch = list(expired.values_list('id', 'doctor_id', 'date')[:batch_size])
+                if not batch:
+                    break
+                if rollup:
+                    _add_unbooked(Counter((doctor_id, date.replace(day=1)) for _, doctor_id, date in batch))
+                purged[shard] += _delete(shard, [row[0] for row in batch])
+            if len(batch) < batch_size:
+                break
+    return purged
+
+
+def _delete(shard, ids):
+    """Plain DELETE of the unbooked slots among ``ids``, without the ORM's per-row signals."""
+    connection = connections[shard]
+    table = connection.ops.quote_name(AvailabilitySlot._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))}) AND is_booked = %s", [*ids, False]
+        )
+        return cursor.rowcount
+
+
+def _add_unbooked(counts):
+    """
+    Add ``counts`` ({(doctor_id, month): slots}) onto the stored SlotUtilization rows.
+
+    Missing rows are created empty and every row is incremented in the
+    database, so a purge running alongside never overwrites this one's counts.
+    """
+    SlotUtilization.objects.bulk_create(
+        [SlotUtilization(doctor_id=doctor_id, month=month) for doctor_id, month in counts], ignore_conflicts=True
+    )
+    for (doctor_id, month), count in counts.items():
+        SlotUtilization.objects.filter(doctor_id=doctor_id, month=month).update(
+            unbooked_slots=F('unbooked_slots') + count
+        )
+
+
+def slot_utilization(doctor, now=None):
+    """
+    ``doctor``'s past slots per month, oldest first: booked, unbooked
+    (purged or not yet) and the share booked.
+    """
+    today = timezone.localtime(now or timezone.now()).date()
+    months = {}
+    past = AvailabilitySlot.objects.using(shard_for_doctor(doctor)).filter(doctor_id=doctor.id, date__lt=today)
+    for row in past.annotate(month=TruncMonth('date')).values('month', 'is_booked').annotate(slots=Count('id')):
+        booked_and_unbooked = months.setdefault(row['month'], [0, 0])
+        booked_and_unbooked[0 if row['is_booked'] else 1] += row['slots']
+    for month, unbooked in SlotUtilization.objects.filter(doctor_id=doctor.id).values_list('month', 'unbooked_slots'):
+        months.setdefault(month, [0, 0])[1] += unbooked
+    return [
+        {'month': month, 'booked': booked, 'unbooked': unbooked, 'utilization': round(booked / (booked + unbooked), 4)}
+        for month, (booked, unbooked) in sorted(months.items())
+    ]
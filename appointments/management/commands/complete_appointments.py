@@ -0,0 +1,26 @@
+"""
+Django management command to mark past appointments as completed
+Usage: python manage.py complete_appointments  (run from cron, e.g. hourly)
+"""
+
+from django.core.management.base import BaseCommand
+from appointments.lifecycle import complete_past_appointments
+
+
+class Command(BaseCommand):
+    help = 'Mark scheduled appointments whose slot has ended as completed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Appointments updated per transaction',
+        )
+
+    def handle(self, *args, **options):
+        completed = complete_past_appointments(batch_size=options['batch_size'])
+        per_shard = ', '.join(f'{shard}: {count}' for shard, count in completed.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Completed {sum(completed.values())} past appointments ({per_shard})'
+        ))
@@ -0,0 +1,172 @@
+"""
+Django management command to move a doctor's slots and appointments to another shard
+Usage: python manage.py move_doctor_shard <doctor_id> <shard>
+
+The move runs online:
+
+1. Copy the doctor's rows to the target shard while bookings continue on
+   the source.
+2. Lock the doctor's slots and rows on the source, copy whatever changed
+   since step 1, point the shard map (DoctorProfile.shard) at the target
+   and delete the source rows that were copied, all before the locks are
+   released. A booking or slot change waiting on a lock then finds the
+   slot gone or the doctor moved, and asks to try again.
+
+Bookings and slot changes read the shard map itself rather than the cached
+shard (appointments.sharding.current_shard), so other processes write to
+the target as soon as the move commits.
+
+Rows keep their ids, which are unique across shards. Running the command
+again for a doctor already on ``shard`` removes rows left on other shards by
+an interrupted move.
+
+On SQLite a table's next id always follows its largest one, so a shard that
+receives rows from a shard with a higher id range starts allocating ids in
+that range. PostgreSQL sequences are unaffected; with local SQLite shards,
+move doctors towards higher ranges only.
+"""
+
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+
+from accounts.backends import invalidate_user
+from appointments.models import Appointment, AvailabilitySlot
+from appointments.booking import lock_doctor_slots
+from appointments.sharding import forget_doctor_shard, shard_for_doctor, shards
+from appointments.versions import DOCTOR, SLOTS, bump_version
+from doctors.models import DoctorProfile
+
+# Slots first: appointments reference them
+MODELS = (AvailabilitySlot, Appointment)
+
+
+class Command(BaseCommand):
+    help = "Move a doctor's availability slots and appointments to another shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument('doctor_id', type=int)
+        parser.add_argument('shard', help='Target database alias (one of APPOINTMENT_SHARDS)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT',
+        )
+
+    def handle(self, *args, **options):
+        target = options['shard']
+        if target not in shards():
+            raise CommandError(f"'{target}' is not in APPOINTMENT_SHARDS ({', '.join(shards())})")
+        try:
+            doctor = DoctorProfile.objects.get(id=options['doctor_id'])
+        except DoctorProfile.DoesNotExist:
+            raise CommandError(f"Doctor {options['doctor_id']} not found")
+
+        self.batch_size = options['batch_size']
+        source = shard_for_doctor(doctor)
+        if source == target:
+            removed = self.remove_leftovers(doctor, target)
+            self.stdout.write(f'Doctor {doctor.id} is already on {target}; removed {removed} leftover rows')
+            return
+
+        started = perf_counter()
+        with transaction.atomic(using=target):
+            copied = sum(self.sync(model, doctor.id, source, target)[0] for model in MODELS)
+        self.stdout.write(f'Copied {copied} rows from {source} to {target}')
+
+        locked_at = perf_counter()
+        with transaction.atomic(using=source):
+            # The doctor's slot lock holds off new slots, and a no-op UPDATE
+            # takes the row locks (the write lock on SQLite), holding off
+            # bookings and edits on the source until we're done
+            lock_doctor_slots(doctor.id, source)
+            for model in MODELS:
+                model.objects.using(source).filter(doctor_id=doctor.id).update(doctor_id=F('doctor_id'))
+            with transaction.atomic(using=target):
+                changes = [self.sync(model, doctor.id, source, target) for model in MODELS]
+            DoctorProfile.objects.filter(id=doctor.id).update(shard=target)
+            # Only the rows copied above, should anything have slipped past the locks
+            for model, (_, _, copied) in reversed(list(zip(MODELS, changes))):
+                for start in range(0, len(copied), self.batch_size):
+                    self.delete(source, model, pk__in=copied[start:start + self.batch_size])
+        locked_ms = (perf_counter() - locked_at) * 1000
+
+        forget_doctor_shard(doctor.id)
+        invalidate_user(doctor.user_id)
+        bump_version(DOCTOR, doctor.id)
+        bump_version(SLOTS, doctor.id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved doctor {doctor.id} from {source} to {target} in {perf_counter() - started:.2f}s '
+            f'({sum(written for written, _, _ in changes)} rows synced, '
+            f'{sum(removed for _, removed, _ in changes)} removed while locked for {locked_ms:.0f}ms)'
+        ))
+
+    def sync(self, model, doctor_id, source, target):
+        """
+        Make ``target``'s rows of ``model`` for the doctor match ``source``'s.
+
+        Returns (rows written, rows deleted, ids now on both).
+        """
+        fields = model._meta.concrete_fields
+        attnames = [field.attname for field in fields]
+        source_rows = {row[0]: row for row in model.objects.using(source).filter(doctor_id=doctor_id).values_list(*attnames)}
+        target_rows = {row[0]: row for row in model.objects.using(target).filter(doctor_id=doctor_id).values_list(*attnames)}
+
+        removed = [pk for pk in target_rows if pk not in source_rows]
+        for start in range(0, len(removed), self.batch_size):
+            self.delete(target, model, pk__in=removed[start:start + self.batch_size])
+
+        changed = [row for pk, row in source_rows.items() if target_rows.get(pk) != row]
+        for start in range(0, len(changed), self.batch_size):
+            self.upsert(target, model, changed[start:start + self.batch_size])
+        return len(changed), len(removed), list(source_rows)
+
+    def upsert(self, alias, model, rows):
+        """
+        INSERT ... ON CONFLICT (id) DO UPDATE, keeping every value as is.
+
+        Raw SQL rather than bulk_create() so that auto_now_add fields keep
+        their original values. PostgreSQL and SQLite share the syntax.
+        """
+        connection = connections[alias]
+        quote = connection.ops.quote_name
+        fields = model._meta.concrete_fields
+        columns = [quote(field.column) for field in fields]
+        sql = (
+            f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({quote(model._meta.pk.column)}) DO UPDATE SET "
+            + ', '.join(f'{column} = excluded.{column}' for column in columns[1:])
+        )
+        params = [
+            [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+            for row in rows
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def remove_leftovers(self, doctor, shard):
+        removed = 0
+        for alias in shards():
+            if alias != shard:
+                for model in reversed(MODELS):
+                    removed += self.delete(alias, model, doctor_id=doctor.id)
+        return removed
+
+    def delete(self, alias, model, **filters):
+        """
+        Plain DELETE, without signals.
+
+        The rows still exist on the other shard, so slot watchers must not
+        be told they were removed.
+        """
+        query = model.objects.using(alias).filter(**filters).values('pk').query
+        sql, params = query.get_compiler(alias).as_sql()
+        table = connections[alias].ops.quote_name(model._meta.db_table)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({sql})', params)
+            return cursor.rowcount
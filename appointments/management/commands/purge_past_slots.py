@@ -0,0 +1,34 @@
+"""
+Django management command to delete unbooked availability slots from past days
+Usage: python manage.py purge_past_slots [--rollup]  (run from cron, e.g. nightly)
+
+With --rollup the deleted slots are first counted per doctor and month
+(SlotUtilization), so historical utilization survives the purge.
+"""
+
+from django.core.management.base import BaseCommand
+from appointments.lifecycle import purge_past_slots
+
+
+class Command(BaseCommand):
+    help = 'Delete unbooked availability slots dated before today'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Slots deleted per transaction',
+        )
+        parser.add_argument(
+            '--rollup',
+            action='store_true',
+            help='Count the deleted slots into the per-doctor utilization stats',
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_past_slots(batch_size=options['batch_size'], rollup=options['rollup'])
+        per_shard = ', '.join(f'{shard}: {count}' for shard, count in purged.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Deleted {sum(purged.values())} past unbooked slots ({per_shard})'
+        ))
@@ -0,0 +1,356 @@
+"""
+Django management command to generate a synthetic dataset for benchmarking
+Usage: python manage.py seed_data --doctors 2000 --patients 200000 --days 250 --slots-per-day 20 --seed 1
+
+The example creates 10M slots (doctors x days x slots per day). The days
+are centred on today: past slots that were booked hold completed or
+cancelled appointments, future ones scheduled appointments. Slots go to
+their doctor's shard.
+
+The same options and --seed always produce the same data. Rows are written
+in chunks of --chunk-size, one transaction each, with COPY on PostgreSQL
+(psycopg 3) and multi-row INSERTs elsewhere, so memory stays flat. Rows
+are written directly rather than through the ORM's save(), so no signals
+(or emails) fire. Every seeded user has the password "seed-password".
+"""
+
+import random
+import uuid
+from datetime import datetime, time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import User
+from appointments.models import Appointment, AvailabilitySlot
+from appointments.sharding import SHARD_ID_SPAN, is_sharded, placement_for, shards
+from appointments.versions import DOCTORS, bump_version
+from doctors.models import DoctorProfile
+from emails.models import EmailSendLog
+from patients.models import PatientProfile
+
+PASSWORD = 'seed-password'
+
+FIRST_NAMES = (
+    'Aarav', 'Priya', 'James', 'Maria', 'Wei', 'Fatima', 'Lucas', 'Ananya', 'Olivia', 'Rahul',
+    'Sofia', 'Kenji', 'Amara', 'Noah', 'Isha', 'Mateo', 'Chloe', 'Omar', 'Elena', 'Vikram',
+)
+LAST_NAMES = (
+    'Sharma', 'Smith', 'Garcia', 'Chen', 'Khan', 'Patel', 'Silva', 'Kim', 'Nguyen', 'Müller',
+    'Okafor', 'Rossi', 'Tanaka', 'Kowalski', 'Haddad', 'Iyer', 'Novak', 'Lopez', 'Brown', 'Joshi',
+)
+SPECIALIZATIONS = (
+    'Cardiology', 'Dermatology', 'Endocrinology', 'Gastroenterology', 'General Practice', 'Neurology',
+    'Oncology', 'Ophthalmology', 'Orthopedics', 'Pediatrics', 'Psychiatry', 'Pulmonology', 'Radiology',
+    'Urology',
+)
+QUALIFICATIONS = ('MBBS', 'MBBS, MD', 'MBBS, MS', 'MD, PhD', 'DO')
+REASONS = (
+    'Annual checkup', 'Persistent cough', 'Follow-up visit', 'Back pain', 'Headaches', 'Skin rash',
+    'Chest pain', 'Blood test results', 'Vaccination', 'Joint pain', 'Fatigue', 'Prescription renewal',
+)
+EMAILS = (
+    ('welcome', 'Welcome to Hospital Management System'),
+    ('appointment_confirmation', 'Appointment Confirmation'),
+    ('appointment_reminder', 'Appointment Reminder'),
+    ('doctor_new_appointment', 'New Appointment Scheduled'),
+)
+EMAIL_STATUSES = (('sent', 90), ('pending', 3), ('failed', 3), ('bounced', 3), ('complained', 1))
+
+SLOT_MINUTES = 30
+FIRST_SLOT = time(8)
+
+
+class TableWriter:
+    """
+    Buffer rows for one table and write them in chunks.
+
+    Rows are dicts of field attnames; missing fields take the model default.
+    ``after`` lists writers whose rows these rows reference, flushed first.
+    """
+
+    def __init__(self, alias, model, chunk_size, after=()):
+        self.alias = alias
+        self.connection = connections[alias]
+        self.model = model
+        self.chunk_size = chunk_size
+        self.after = after
+        self.fields = model._meta.concrete_fields
+        self.defaults = {field.attname: field.get_default() for field in self.fields}
+        self.rows = []
+        self.count = 0
+        self.seconds = 0.0
+
+        quote = self.connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = ', '.join(quote(field.column) for field in self.fields)
+        self.copy_sql = f'COPY {table} ({columns}) FROM STDIN'
+        self.insert_sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(self.fields))})"
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for writer in self.after:
+            writer.flush()
+        if not self.rows:
+            return
+        started = perf_counter()
+        connection = self.connection
+        values = [
+            [field.get_db_prep_save(row.get(field.attname, self.defaults[field.attname]), connection) for field in self.fields]
+            for row in self.rows
+        ]
+        with transaction.atomic(using=self.alias), connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy'):
+                # psycopg 3
+                with cursor.cursor.copy(self.copy_sql) as copy:
+                    for row in values:
+                        copy.write_row(row)
+            else:
+                cursor.executemany(self.insert_sql, values)
+        self.count += len(values)
+        self.seconds += perf_counter() - started
+        self.rows = []
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset of users, doctors, slots, appointments and email logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Days of slots per doctor, half before and half after today',
+        )
+        parser.add_argument(
+            '--slots-per-day',
+            type=int,
+            default=16,
+            help=f'{SLOT_MINUTES}-minute slots per doctor and day, from {FIRST_SLOT:%H:%M}',
+        )
+        parser.add_argument(
+            '--booked',
+            type=float,
+            default=0.3,
+            help='Share of slots with an appointment',
+        )
+        parser.add_argument('--emails', type=int, default=10000, help='EmailSendLog rows')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per transaction')
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Username prefix; seeding twice with one prefix is refused',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['slots_per_day'] <= (24 * 60 - FIRST_SLOT.hour * 60) // SLOT_MINUTES:
+            raise CommandError(f'--slots-per-day must fit between {FIRST_SLOT:%H:%M} and midnight')
+        if options['patients'] < 1 and options['booked'] > 0:
+            raise CommandError('Booked slots need at least one patient')
+        self.prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f"Users prefixed '{self.prefix}-' exist already; pass another --prefix")
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.writers = []
+        started = perf_counter()
+
+        doctor_users, patient_users = self.seed_users(options['doctors'], options['patients'])
+        doctors = self.seed_doctors(doctor_users)
+        patients = self.seed_patients(patient_users)
+        self.seed_slots(doctors, patients, options['days'], options['slots_per_day'], options['booked'])
+        self.seed_emails(options['emails'], doctor_users + patient_users)
+        self.reset_sequences()
+        bump_version(DOCTORS)
+
+        elapsed = perf_counter() - started
+        for writer in self.writers:
+            if writer.count:
+                self.stdout.write(
+                    f'{writer.model.__name__:<18}{writer.alias:<10}{writer.count:>12} rows'
+                    f'{writer.count / writer.seconds if writer.seconds else 0:>12.0f} rows/s'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {sum(writer.count for writer in self.writers)} rows in {elapsed:.1f}s "
+            f"(password '{PASSWORD}')"
+        ))
+
+    def writer(self, model, alias='default', after=()):
+        writer = TableWriter(alias, model, self.chunk_size, after)
+        self.writers.append(writer)
+        return writer
+
+    def next_id(self, model, alias='default'):
+        """First free id of ``model`` on ``alias``, inside the shard's id range."""
+        last = model.objects.using(alias).aggregate(last=Max('id'))['last'] or 0
+        if model in (AvailabilitySlot, Appointment) and is_sharded():
+            last = max(last, shards().index(alias) * SHARD_ID_SPAN)
+        return last + 1
+
+    def seed_users(self, doctors, patients):
+        """Returns the (id, email) of the doctor and patient users."""
+        rng = self.rng
+        password = make_password(PASSWORD)
+        writer = self.writer(User)
+        next_id = self.next_id(User)
+        created = {User.DOCTOR: [], User.PATIENT: []}
+        for role, count in ((User.DOCTOR, doctors), (User.PATIENT, patients)):
+            for number in range(count):
+                username = f'{self.prefix}-{role}-{number}'
+                email = f'{username}@example.com'
+                writer.add({
+                    'id': next_id,
+                    'username': username,
+                    'email': email,
+                    'password': password,
+                    'first_name': rng.choice(FIRST_NAMES),
+                    'last_name': rng.choice(LAST_NAMES),
+                    'phone_number': f'555{rng.randrange(10 ** 7):07d}',
+                    'role': role,
+                    'date_joined': self.now - timedelta(days=rng.randrange(3 * 365)),
+                })
+                created[role].append((next_id, email))
+                next_id += 1
+        writer.flush()
+        return created[User.DOCTOR], created[User.PATIENT]
+
+    def seed_doctors(self, users):
+        """Returns the (profile id, shard) of the doctors."""
+        rng = self.rng
+        writer = self.writer(DoctorProfile)
+        next_id = self.next_id(DoctorProfile)
+        doctors = []
+        for user_id, _ in users:
+            shard = placement_for(next_id) if is_sharded() else ''
+            writer.add({
+                'id': next_id,
+                'user_id': user_id,
+                'specialization': rng.choice(SPECIALIZATIONS),
+                'qualification': rng.choice(QUALIFICATIONS),
+                'experience_years': rng.randrange(1, 40),
+                'consultation_fee': rng.randrange(20, 300),
+                'notification_mode': DoctorProfile.DIGEST if rng.random() < 0.2 else DoctorProfile.REALTIME,
+                'shard': shard,
+            })
+            doctors.append((next_id, shard or 'default'))
+            next_id += 1
+        writer.flush()
+        return doctors
+
+    def seed_patients(self, users):
+        """Returns the profile ids of the patients."""
+        rng = self.rng
+        writer = self.writer(PatientProfile)
+        first_id = next_id = self.next_id(PatientProfile)
+        for user_id, _ in users:
+            writer.add({
+                'id': next_id,
+                'user_id': user_id,
+                'date_of_birth': self.now.date() - timedelta(days=rng.randrange(365, 90 * 365)),
+                'emergency_contact': f'555{rng.randrange(10 ** 7):07d}',
+            })
+            next_id += 1
+        writer.flush()
+        return range(first_id, next_id)
+
+    def seed_slots(self, doctors, patients, days, slots_per_day, booked):
+        rng = self.rng
+        today = self.now.date()
+        first_day = today - timedelta(days=days // 2)
+        slot_times = []
+        for number in range(slots_per_day):
+            start = datetime.combine(today, FIRST_SLOT) + timedelta(minutes=number * SLOT_MINUTES)
+            slot_times.append((start.time(), (start + timedelta(minutes=SLOT_MINUTES)).time()))
+
+        writers = {}
+        next_ids = {}
+        for alias in {shard for _, shard in doctors}:
+            slot_writer = self.writer(AvailabilitySlot, alias)
+            writers[alias] = (slot_writer, self.writer(Appointment, alias, after=[slot_writer]))
+            next_ids[alias] = [self.next_id(AvailabilitySlot, alias), self.next_id(Appointment, alias)]
+
+        for doctor_id, alias in doctors:
+            slot_writer, appointment_writer = writers[alias]
+            ids = next_ids[alias]
+            for day in range(days):
+                date = first_day + timedelta(days=day)
+                for start_time, end_time in slot_times:
+                    is_booked = rng.random() < booked
+                    slot_writer.add({
+                        'id': ids[0],
+                        'doctor_id': doctor_id,
+                        'date': date,
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'is_booked': is_booked,
+                    })
+                    if is_booked:
+                        if date < today:
+                            status = 'cancelled' if rng.random() < 0.1 else 'completed'
+                        else:
+                            status = 'scheduled'
+                        starts_at = timezone.make_aware(datetime.combine(date, start_time))
+                        appointment_writer.add({
+                            'id': ids[1],
+                            'patient_id': patients[rng.randrange(len(patients))],
+                            'doctor_id': doctor_id,
+                            'availability_slot_id': ids[0],
+                            'reason': rng.choice(REASONS),
+                            'status': status,
+                            'created_at': starts_at - timedelta(hours=rng.randrange(1, 30 * 24)),
+                        })
+                        ids[1] += 1
+                    ids[0] += 1
+        for _, appointment_writer in writers.values():
+            appointment_writer.flush()
+
+    def seed_emails(self, count, users):
+        rng = self.rng
+        writer = self.writer(EmailSendLog)
+        statuses, weights = zip(*EMAIL_STATUSES)
+        for _ in range(count):
+            template, subject = rng.choice(EMAILS)
+            status = rng.choices(statuses, weights)[0]
+            created_at = self.now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+            writer.add({
+                'request_id': f'{self.prefix}-{uuid.UUID(int=rng.getrandbits(128), version=4)}',
+                'message_id': f'{self.prefix}-{rng.getrandbits(64):016x}' if status != 'pending' else '',
+                'from_address': 'noreply@hospital.example.com',
+                'to_addresses': [rng.choice(users)[1]] if users else ['nobody@example.com'],
+                'subject': subject,
+                'template_used': template,
+                'status': status,
+                'sent_at': created_at + timedelta(seconds=1) if status not in ('pending', 'failed') else None,
+                'error_code': 'MessageRejected' if status == 'failed' else '',
+                'tags': {'email_type': template},
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+        writer.flush()
+
+    def reset_sequences(self):
+        """Move the id sequences past the ids written (SQLite tracks them itself)."""
+        models = {}
+        for writer in self.writers:
+            models.setdefault(writer.alias, set()).add(writer.model)
+        for alias, alias_models in models.items():
+            connection = connections[alias]
+            statements = connection.ops.sequence_reset_sql(no_style(), list(alias_models))
+            if statements:
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
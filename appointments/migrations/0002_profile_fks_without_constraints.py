@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('doctors', '0003_doctorprofile_shard'),
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='doctor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='doctors.doctorprofile'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='patient',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='patients.patientprofile'),
+        ),
+        migrations.AlterField(
+            model_name='availabilityslot',
+            name='doctor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='availability_slots', to='doctors.doctorprofile'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_profile_fks_without_constraints'),
+        ('doctors', '0003_doctorprofile_shard'),
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['id'], name='appointment_scheduled_idx'),
+        ),
+    ]
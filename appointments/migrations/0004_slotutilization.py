@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_scheduled_idx'),
+        ('doctors', '0003_doctorprofile_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('unbooked_slots', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='slot_utilization', to='doctors.doctorprofile')),
+            ],
+            options={
+                'ordering': ['doctor', 'month'],
+                'unique_together': {('doctor', 'month')},
+            },
+        ),
+    ]
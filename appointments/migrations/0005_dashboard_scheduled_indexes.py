@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_slotutilization'),
+        ('doctors', '0003_doctorprofile_shard'),
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_scheduled_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['doctor'], name='appointment_doctor_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['patient'], name='appointment_patient_sched_idx'),
+        ),
+    ]
@@ -6,8 +6,11 @@ from accounts.models import User
 from doctors.models import DoctorProfile
 from patients.models import PatientProfile
 
+# Slots and appointments may live on a shard without the profile tables
+# (appointments.sharding), so their profile foreign keys have no constraint.
+
 class AvailabilitySlot(models.Model):
-    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='availability_slots')
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='availability_slots', db_constraint=False)
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
@@ -20,25 +23,21 @@ class AvailabilitySlot(models.Model):
         return f"{self.doctor} - {self.date} ({self.start_time} to {self.end_time})"
     
     @classmethod
-    def check_overlap(cls, doctor, date, start_time, end_time, exclude_id=None):
+    def check_overlap(cls, doctor, date, start_time, end_time, exclude_id=None, using=None):
         """
         Check if the new slot overlaps with existing slots for the same doctor on the same day.
         """
-        query = Q(doctor=doctor, date=date)
-        
-        # Check if the new slot starts during an existing slot
-        query |= Q(doctor=doctor, date=date, start_time__lte=start_time, end_time__gt=start_time)
-        
-        # Check if the new slot ends during an existing slot
-        query |= Q(doctor=doctor, date=date, start_time__lt=end_time, end_time__gte=end_time)
-        
-        # Check if the new slot completely contains an existing slot
-        query |= Q(doctor=doctor, date=date, start_time__gte=start_time, end_time__lte=end_time)
+        # Existing slots that start before the new slot ends and end after it
+        # starts: those it starts or ends during, contains or lies within
+        # (slots that only touch, e.g. 9:00-9:30 and 9:30-10:00, don't overlap)
+        query = Q(doctor=doctor, date=date, start_time__lt=end_time, end_time__gt=start_time)
         
         if exclude_id:
             query &= ~Q(id=exclude_id)
             
-        return cls.objects.filter(query).exists()
+        # Routed to the doctor's shard unless given
+        manager = cls.objects.using(using) if using else cls.objects.db_manager(hints={'instance': doctor})
+        return manager.filter(query).exists()
 
 class Appointment(models.Model):
     STATUS_CHOICES = (
@@ -47,8 +46,8 @@ class Appointment(models.Model):
         ('cancelled', 'Cancelled'),
     )
     
-    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='appointments')
-    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='appointments')
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='appointments', db_constraint=False)
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='appointments', db_constraint=False)
     availability_slot = models.OneToOneField(AvailabilitySlot, on_delete=models.CASCADE, related_name='appointment')
     reason = models.TextField()
     notes = models.TextField(blank=True)
@@ -57,6 +56,31 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The dashboards' upcoming appointments; complete_appointments keeps these to the ones still to come
+            models.Index(fields=['doctor'], condition=Q(status='scheduled'), name='appointment_doctor_sched_idx'),
+            models.Index(fields=['patient'], condition=Q(status='scheduled'), name='appointment_patient_sched_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} with {self.doctor} on {self.availability_slot.date}"
+
+
+class SlotUtilization(models.Model):
+    """
+    Past unbooked slots deleted by purge_past_slots(rollup=True), per doctor
+    and month.
+
+    Booked slots are kept with their appointments, so a month's utilization
+    is its booked slots over those plus these (lifecycle.slot_utilization()).
+    """
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='slot_utilization', db_constraint=False)
+    month = models.DateField()  # the first of the month
+    unbooked_slots = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['doctor', 'month']
+        unique_together = [['doctor', 'month']]
     
     def __str__(self):
-        return f"{self.patient} with {self.doctor} on {self.availability_slot.date}"
\ No newline at end of file
+        return f"{self.doctor} - {self.month:%Y-%m}: {self.unbooked_slots} unbooked slots purged"
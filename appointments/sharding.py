@@ -0,0 +1,218 @@
+# appointments/sharding.py
+"""
+Sharding of availability slots and appointments by doctor.
+
+APPOINTMENT_SHARDS lists the database aliases holding slots and
+appointments. Each doctor's rows live together on one shard, recorded in
+DoctorProfile.shard (the shard map): new doctors are placed by id, and
+move_doctor_shard moves one to another shard. Users and profiles stay on
+'default'.
+
+Shards only hold the appointments app's tables, so relations to users and
+profiles can't be joined there; use with_profiles() instead of
+select_related() for them. Each shard allocates ids from its own range
+(SHARD_ID_SPAN), so ids stay unique when rows move between shards and a
+slot or appointment can be found from its id alone (locate()).
+
+With the default single shard every helper falls back to plain querysets
+on 'default'.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from doctors.models import DoctorProfile
+from .models import Appointment, AvailabilitySlot
+
+SHARDED_MODELS = (AvailabilitySlot, Appointment)
+
+# Ids allocated by the n-th shard start at n * SHARD_ID_SPAN + 1
+SHARD_ID_SPAN = 10 ** 12
+
+SHARD_CACHE_TIMEOUT = 3600
+
+
+def shards():
+    return list(getattr(settings, 'APPOINTMENT_SHARDS', ['default']))
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def _shard_cache_key(doctor_id):
+    return f'shard:doctor:{doctor_id}'
+
+
+def placement_for(doctor_id):
+    """Shard a new doctor is placed on."""
+    return shards()[doctor_id % len(shards())]
+
+
+def shard_for_doctor(doctor):
+    """Shard holding the slots and appointments of ``doctor`` (a profile or id)."""
+    if not is_sharded():
+        return 'default'
+    if isinstance(doctor, DoctorProfile):
+        return doctor.shard or 'default'
+    shard = cache.get(_shard_cache_key(doctor))
+    if shard is None:
+        shard = DoctorProfile.objects.filter(id=doctor).values_list('shard', flat=True).first() or 'default'
+        cache.set(_shard_cache_key(doctor), shard, SHARD_CACHE_TIMEOUT)
+    return shard
+
+
+def current_shard(doctor_id):
+    """
+    Shard of ``doctor_id`` read from the shard map on 'default', for writes.
+
+    shard_for_doctor() may answer from a cache that other processes don't
+    clear when move_doctor_shard runs, which is fine for reads but would
+    send writes to the shard the doctor has left.
+    """
+    if not is_sharded():
+        return 'default'
+    return DoctorProfile.objects.using('default').filter(id=doctor_id).values_list('shard', flat=True).first() or 'default'
+
+
+def forget_doctor_shard(doctor_id):
+    cache.delete(_shard_cache_key(doctor_id))
+
+
+def shard_for_id(pk):
+    """Shard whose id range contains ``pk``, i.e. where the row was created."""
+    index = (pk - 1) // SHARD_ID_SPAN
+    return shards()[index] if 0 <= index < len(shards()) else 'default'
+
+
+def locate(queryset, pk):
+    """
+    Get the object with ``pk`` from whichever shard holds it.
+
+    Tries the shard that allocated ``pk`` first; rows of doctors that have
+    since moved are found on the remaining shards. Raises DoesNotExist.
+    """
+    if not is_sharded():
+        return queryset.get(pk=pk)
+    home = shard_for_id(pk)
+    for alias in [home] + [alias for alias in shards() if alias != home]:
+        obj = queryset.using(alias).filter(pk=pk).first()
+        if obj is not None:
+            return obj
+    raise queryset.model.DoesNotExist(f'{queryset.model.__name__} {pk} not found on any shard')
+
+
+def with_profiles(queryset, *relations):
+    """
+    Load ``relations`` (doctor/patient profiles and users) for ``queryset``.
+
+    A join on a single database; on shards, a prefetch from 'default'.
+    """
+    if is_sharded():
+        return queryset.prefetch_related(*relations)
+    return queryset.select_related(*relations)
+
+
+def appointment_time(appointment):
+    """Merge key for appointments ordered by slot date and start time."""
+    return (appointment.availability_slot.date, appointment.availability_slot.start_time)
+
+
+def scatter_gather(queryset, key, reverse=False, limit=None):
+    """
+    Run ``queryset`` on every shard and merge the results by ``key``.
+
+    ``queryset`` must already be ordered consistently with ``key`` (and
+    ``reverse``); each shard's rows are then merged without resorting. With
+    several shards the queries run in parallel threads, unless a shard is
+    inside a transaction: other threads' connections would not see its
+    uncommitted writes, so they run one by one on this thread's.
+    """
+    if limit is not None:
+        queryset = queryset[:limit]
+    if not is_sharded():
+        return list(queryset)
+
+    if any(connections[alias].in_atomic_block for alias in shards()):
+        results = [list(queryset.using(alias)) for alias in shards()]
+    else:
+        def fetch(alias):
+            try:
+                return list(queryset.using(alias))
+            finally:
+                connections[alias].close()
+
+        with ThreadPoolExecutor(len(shards())) as pool:
+            results = list(pool.map(fetch, shards()))
+    return list(islice(heapq.merge(*results, key=key, reverse=reverse), limit))
+
+
+def reserve_id_range(using, **kwargs):
+    """
+    post_migrate: move the sharded tables' id sequences into ``using``'s range.
+
+    Sequences already past the start of the range are left alone.
+    """
+    if using not in shards() or not is_sharded():
+        return
+    start = shards().index(using) * SHARD_ID_SPAN
+    if not start:
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)})))",
+                    [table, start],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+                elif row[0] < start:
+                    cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+
+
+class ShardRouter:
+    """
+    Send slots and appointments to their doctor's shard.
+
+    Routing needs an instance to go on (saving, related managers such as
+    doctor.availability_slots); querysets without one fall through to the
+    next router, so pick the shard with .using(shard_for_doctor(...)).
+    """
+
+    def _shard(self, model, hints):
+        if model not in SHARDED_MODELS or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, SHARDED_MODELS):
+            return instance._state.db or shard_for_doctor(instance.doctor_id)
+        if isinstance(instance, DoctorProfile):
+            return shard_for_doctor(instance)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Slots and appointments point at profiles on 'default'
+        if isinstance(obj1, SHARDED_MODELS) or isinstance(obj2, SHARDED_MODELS):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default' or db not in shards():
+            return None
+        return app_label == 'appointments'
@@ -0,0 +1,106 @@
+# appointments/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import User
+from doctors.models import DoctorProfile
+from patients.models import PatientProfile
+from .events import get_broker, slot_event
+from .models import Appointment, AvailabilitySlot
+from .sharding import forget_doctor_shard, is_sharded, placement_for, shard_for_doctor, shards
+from .versions import DOCTOR, DOCTORS, PATIENT, SLOTS, bump_version
+
+
+# The doctor's User fields shown in the directory and on the details page
+DOCTOR_USER_FIELDS = {'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_appointment_versions(sender, instance, **kwargs):
+    _bump_on_commit([(DOCTOR, instance.doctor_id), (PATIENT, instance.patient_id)], kwargs['using'])
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+@receiver(post_delete, sender=AvailabilitySlot)
+def bump_slot_versions(sender, instance, **kwargs):
+    versions = [(DOCTOR, instance.doctor_id), (SLOTS, instance.doctor_id)]
+    if instance.is_booked and not kwargs.get('raw'):
+        # A booked slot's date and time also appear on the patient's dashboard
+        patient_ids = Appointment.objects.using(kwargs['using']).filter(
+            availability_slot_id=instance.id
+        ).values_list('patient_id', flat=True)
+        versions.extend((PATIENT, patient_id) for patient_id in patient_ids)
+    _bump_on_commit(versions, kwargs['using'])
+
+
+def _bump_on_commit(versions, using):
+    # A request served before the commit would otherwise cache the old page
+    # (or pair it with a new ETag) under the new version
+    def bump():
+        for scope, object_id in versions:
+            bump_version(scope, object_id)
+
+    transaction.on_commit(bump, using=using)
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+def publish_slot_saved(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if instance.is_booked:
+        event_type = 'booked'
+    else:
+        event_type = 'added' if created else 'freed'
+    _publish_on_commit(instance.doctor_id, slot_event(instance, event_type), kwargs['using'])
+
+
+@receiver(post_delete, sender=AvailabilitySlot)
+def publish_slot_deleted(sender, instance, **kwargs):
+    _publish_on_commit(instance.doctor_id, slot_event(instance, 'removed'), kwargs['using'])
+
+
+def _publish_on_commit(doctor_id, event, using):
+    # Watchers must never see a booking that is later rolled back; the
+    # transaction is the one on the slot's shard
+    transaction.on_commit(lambda: get_broker().publish(doctor_id, event), using=using)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def bump_doctor_profile_versions(sender, instance, **kwargs):
+    _bump_on_commit([(DOCTORS, '')], kwargs['using'])
+
+
+@receiver(post_save, sender=User)
+def bump_doctor_user_versions(sender, instance, update_fields=None, **kwargs):
+    # Saves of other fields only (e.g. last_login on every login) leave the
+    # directory alone
+    if instance.is_doctor() and (update_fields is None or DOCTOR_USER_FIELDS & set(update_fields)):
+        _bump_on_commit([(DOCTORS, '')], kwargs['using'])
+
+
+@receiver(post_save, sender=DoctorProfile)
+def place_new_doctor(sender, instance, created, **kwargs):
+    if created and not instance.shard and is_sharded() and not kwargs.get('raw'):
+        instance.shard = placement_for(instance.id)
+        DoctorProfile.objects.filter(pk=instance.pk).update(shard=instance.shard)
+        forget_doctor_shard(instance.pk)
+
+
+@receiver(pre_delete, sender=DoctorProfile)
+def delete_doctor_shard_rows(sender, instance, **kwargs):
+    # The deletion cascade only reaches rows on the profile's own database
+    shard = shard_for_doctor(instance)
+    if shard != kwargs['using']:
+        Appointment.objects.using(shard).filter(doctor_id=instance.pk).delete()
+        AvailabilitySlot.objects.using(shard).filter(doctor_id=instance.pk).delete()
+    forget_doctor_shard(instance.pk)
+
+
+@receiver(pre_delete, sender=PatientProfile)
+def delete_patient_shard_rows(sender, instance, **kwargs):
+    for shard in shards():
+        if shard != kwargs['using']:
+            Appointment.objects.using(shard).filter(patient_id=instance.pk).delete()
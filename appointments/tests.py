@@ -1,3 +1,633 @@
-from django.test import TestCase
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from io import StringIO
+from time import perf_counter
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from doctors.models import DoctorProfile
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+from .booking import SlotOverlaps, SlotUnavailable, book_slot, delete_slot, save_slot
+from .checks import check_versions_are_shared
+from .lifecycle import complete_past_appointments, purge_past_slots, slot_utilization
+from .models import Appointment, AvailabilitySlot, SlotUtilization
+from .sharding import SHARD_ID_SPAN, reserve_id_range, shard_for_doctor, shard_for_id, shards
+from .versions import DOCTOR, DOCTORS, PATIENT, get_version
+
+
+class AllShards:
+    """Lets a test case use every appointment shard, as the code does once there are several."""
+    databases = {'default', *settings.APPOINTMENT_SHARDS}
+
+    @contextmanager
+    def assertNumQueriesOnAllShards(self, num):
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases]
+            yield
+        self.assertEqual(sum(len(queries) for queries in captured), num)
+
+
+class BookingTestCase(AllShards, TestCase):
+    def setUp(self):
+        cache.clear()
+        with suppress_email_signals():
+            doctor_user = User.objects.create_user(
+                'doc', 'doc@example.com', 'pw', role=User.DOCTOR, first_name='Gregory', last_name='House'
+            )
+            patient_user = User.objects.create_user(
+                'pat', 'pat@example.com', 'pw', role=User.PATIENT, first_name='Lisa'
+            )
+        self.doctor = DoctorProfile.objects.create(user=doctor_user, specialization='Diagnostics')
+        self.patient = PatientProfile.objects.create(user=patient_user)
+        self.shard = shard_for_doctor(self.doctor)  # where the doctor's slots and appointments are
+        self.slot = self.doctor.availability_slots.create(
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9),
+            end_time=time(9, 30),
+        )
+
+    def book(self, client, slot):
+        with suppress_email_signals():
+            return client.post(
+                reverse('appointments:book_appointment', args=[slot.id]),
+                {'reason': 'Persistent cough', 'notes': ''},
+            )
+
+
+class DashboardCacheTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor_client = self.client_class()
+        self.doctor_client.force_login(self.doctor.user)
+        self.patient_client = self.client_class()
+        self.patient_client.force_login(self.patient.user)
+
+    def test_repeat_dashboard_loads_run_no_queries(self):
+        self.doctor_client.get(reverse('doctors:dashboard'))
+        self.patient_client.get(reverse('patients:dashboard'))
+
+        with self.assertNumQueriesOnAllShards(0):
+            self.doctor_client.get(reverse('doctors:dashboard'))
+            self.patient_client.get(reverse('patients:dashboard'))
+
+    def test_booking_invalidates_doctor_and_patient_dashboards(self):
+        self.assertContains(self.doctor_client.get(reverse('doctors:dashboard')), 'No upcoming appointments')
+        self.assertContains(self.patient_client.get(reverse('patients:dashboard')), 'No upcoming appointments')
+
+        with self.captureOnCommitCallbacks(using=self.shard, execute=True):
+            self.book(self.patient_client, self.slot)
+
+        self.assertContains(self.doctor_client.get(reverse('doctors:dashboard')), 'Persistent cough')
+        self.assertContains(self.patient_client.get(reverse('patients:dashboard')), 'Dr. Gregory House')
+
+    def test_cancelling_invalidates_dashboards(self):
+        with self.captureOnCommitCallbacks(using=self.shard, execute=True):
+            self.book(self.patient_client, self.slot)
+        self.assertContains(self.patient_client.get(reverse('patients:dashboard')), 'Persistent cough')
+
+        appointment = Appointment.objects.using(self.shard).get()
+        appointment.status = 'cancelled'
+        with self.captureOnCommitCallbacks(using=self.shard, execute=True):
+            appointment.save()
+
+        self.assertContains(self.patient_client.get(reverse('patients:dashboard')), 'No upcoming appointments')
+        self.assertContains(self.doctor_client.get(reverse('doctors:dashboard')), 'No upcoming appointments')
+
+    def test_versions_are_bumped_on_commit(self):
+        version = get_version(DOCTOR, self.doctor.id)
+
+        with self.captureOnCommitCallbacks(using=self.shard) as callbacks:
+            self.book(self.patient_client, self.slot)
+            self.assertEqual(get_version(DOCTOR, self.doctor.id), version)
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(get_version(DOCTOR, self.doctor.id), version)
+
+    def test_logins_leave_the_doctor_directory_cached(self):
+        version = get_version(DOCTORS)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(username='doc', password='pw'))
+
+        self.assertEqual(get_version(DOCTORS), version)
+
+
+class AsyncReadOnlyViewTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient.user)
+        self.book(self.client, self.slot)
+
+    async def test_read_only_views_serve_under_asgi(self):
+        await self.async_client.aforce_login(self.patient.user)
+
+        for url in (
+            reverse('patients:dashboard'),
+            reverse('patients:doctors_list'),
+            reverse('patients:doctor_details', args=[self.doctor.id]),
+            reverse('appointments:my_appointments'),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+        self.assertContains(response, 'Dr. Gregory House')
+
+    async def test_cached_dashboard_fragment_is_reused(self):
+        await self.async_client.aforce_login(self.patient.user)
+        await self.async_client.get(reverse('patients:dashboard'))
+
+        response = await self.async_client.get(reverse('patients:dashboard'))
+
+        self.assertEqual(response.context['upcoming_appointments'], [])
+        self.assertContains(response, 'Persistent cough', count=1)
+
+    async def test_async_views_never_block_on_the_cache(self):
+        in_event_loop = []
+
+        def watch(method):
+            def watched(cache, *args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    in_event_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(cache, *args, **kwargs)
+            return watched
+
+        with mock.patch.multiple(
+            LocMemCache, get=watch(LocMemCache.get), add=watch(LocMemCache.add), set=watch(LocMemCache.set)
+        ):
+            for user, url in (
+                (self.patient.user, reverse('patients:dashboard')),
+                (self.patient.user, reverse('patients:doctors_list')),
+                (self.patient.user, reverse('patients:doctor_details', args=[self.doctor.id])),
+                (self.doctor.user, reverse('doctors:dashboard')),
+            ):
+                await self.async_client.aforce_login(user)
+                for _ in range(2):  # versions and fragments missing, then cached
+                    self.assertEqual((await self.async_client.get(url)).status_code, 200, url)
+
+        self.assertEqual(in_event_loop, [])
+
+    async def test_async_views_still_require_the_role(self):
+        await self.async_client.aforce_login(self.doctor.user)
+
+        response = await self.async_client.get(reverse('appointments:my_appointments'))
+
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(DEBUG=False)
+    def test_versions_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_versions_are_shared(None)], ['appointments.E001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertEqual(check_versions_are_shared(None), [])
+
+
+@skipUnless('shard1' in settings.DATABASES, 'needs a second database aliased shard1')
+@override_settings(APPOINTMENT_SHARDS=['default', 'shard1'])
+class ShardingTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        reserve_id_range(using='shard1')
+        with suppress_email_signals():
+            patient_user = User.objects.create_user('pat', 'pat@example.com', 'pw', role=User.PATIENT)
+            self.patient = PatientProfile.objects.create(user=patient_user)
+            self.doctors = []
+            for first_name, last_name in (('Gregory', 'House'), ('James', 'Wilson')):
+                user = User.objects.create_user(
+                    last_name, f'{last_name}@example.com', 'pw', role=User.DOCTOR,
+                    first_name=first_name, last_name=last_name,
+                )
+                self.doctors.append(DoctorProfile.objects.create(user=user))
+        self.client.force_login(patient_user)
+
+    def add_slot(self, doctor, hour):
+        return doctor.availability_slots.create(
+            date=timezone.now().date() + timedelta(days=1), start_time=time(hour), end_time=time(hour, 30)
+        )
+
+    def book(self, slot):
+        with suppress_email_signals():
+            return self.client.post(reverse('appointments:book_appointment', args=[slot.id]), {'reason': 'Checkup', 'notes': ''})
+
+    def test_doctors_rows_live_on_their_shard(self):
+        self.assertEqual({doctor.shard for doctor in self.doctors}, {'default', 'shard1'})
+        for doctor in self.doctors:
+            slot = self.add_slot(doctor, 9)
+            self.assertEqual(slot._state.db, doctor.shard)
+            self.assertEqual(shard_for_id(slot.id), doctor.shard)
+
+    def test_my_appointments_merges_shards_newest_first(self):
+        for hour, doctor in ((9, self.doctors[0]), (10, self.doctors[1]), (11, self.doctors[0])):
+            self.book(self.add_slot(doctor, hour))
+
+        response = self.client.get(reverse('appointments:my_appointments'))
+
+        self.assertEqual(
+            [appointment.availability_slot.start_time.hour for appointment in response.context['appointments']],
+            [11, 10, 9],
+        )
+        self.assertContains(response, 'Dr. James Wilson')
+
+    def test_move_keeps_ids_and_bookings(self):
+        doctor = next(doctor for doctor in self.doctors if doctor.shard == 'default')
+        booked = self.add_slot(doctor, 9)
+        self.book(booked)
+        free = self.add_slot(doctor, 10)
+
+        call_command('move_doctor_shard', doctor.id, 'shard1', stdout=StringIO())
+
+        self.assertEqual(DoctorProfile.objects.get(id=doctor.id).shard, 'shard1')
+        self.assertFalse(AvailabilitySlot.objects.using('default').exists())
+        moved = Appointment.objects.using('shard1').get(availability_slot_id=booked.id)
+        self.assertEqual(moved.patient_id, self.patient.id)
+        self.book(free)
+        self.assertTrue(Appointment.objects.using('shard1').filter(availability_slot_id=free.id).exists())
+
+    def test_past_appointments_are_completed_on_every_shard(self):
+        for doctor in self.doctors:
+            slot = doctor.availability_slots.create(
+                date=timezone.now().date() - timedelta(days=1), start_time=time(9), end_time=time(9, 30), is_booked=True
+            )
+            doctor.appointments.create(patient=self.patient, availability_slot=slot, reason='Checkup')
+
+        self.assertEqual(complete_past_appointments(), {'default': 1, 'shard1': 1})
+        for doctor in self.doctors:
+            self.assertEqual(list(doctor.appointments.values_list('status', flat=True)), ['completed'])
+
+    def test_past_slots_are_purged_on_every_shard(self):
+        for doctor in self.doctors:
+            doctor.availability_slots.create(
+                date=timezone.now().date() - timedelta(days=1), start_time=time(9), end_time=time(9, 30)
+            )
+
+        self.assertEqual(purge_past_slots(rollup=True), {'default': 1, 'shard1': 1})
+        self.assertEqual(SlotUtilization.objects.count(), 2)
+
+    def test_writes_follow_a_move_despite_a_stale_shard_cache(self):
+        doctor = next(doctor for doctor in self.doctors if doctor.shard == 'default')
+        slot = self.add_slot(doctor, 9)
+        call_command('move_doctor_shard', doctor.id, 'shard1', stdout=StringIO())
+        # As another process still sees it
+        cache.set(f'shard:doctor:{doctor.id}', 'default')
+
+        added = save_slot(doctor, slot.date, time(10), time(10, 30))
+        with suppress_email_signals():
+            book_slot(self.patient, slot, 'Checkup')
+
+        self.assertEqual(added._state.db, 'shard1')
+        self.assertTrue(Appointment.objects.using('shard1').filter(availability_slot_id=slot.id).exists())
+        self.assertFalse(AvailabilitySlot.objects.using('default').exists())
+
+    def test_seed_data_writes_slots_to_the_doctors_shard(self):
+        call_command('seed_data', doctors=4, patients=3, days=2, slots_per_day=2, emails=0, stdout=StringIO())
+
+        for doctor in DoctorProfile.objects.filter(user__username__startswith='seed-'):
+            slots = AvailabilitySlot.objects.using(doctor.shard).filter(doctor=doctor)
+            self.assertEqual(len(slots), 4)
+            self.assertEqual({shard_for_id(slot.id) for slot in slots}, {doctor.shard})
+
+
+class SlotOverlapTests(BookingTestCase):
+    def test_add_and_edit_reject_overlapping_slots(self):
+        client = self.client_class()
+        client.force_login(self.doctor.user)
+        date = self.slot.date.isoformat()
+
+        response = client.post(
+            reverse('doctors:add_availability'), {'date': date, 'start_time': '09:15', 'end_time': '09:45'}
+        )
+        self.assertRedirects(response, reverse('doctors:add_availability'))
+        client.post(reverse('doctors:add_availability'), {'date': date, 'start_time': '10:00', 'end_time': '10:30'})
+        later = AvailabilitySlot.objects.using(self.shard).get(start_time=time(10))
+
+        response = client.post(
+            reverse('doctors:edit_availability', args=[later.id]),
+            {'date': date, 'start_time': '09:00', 'end_time': '10:30'},
+        )
+        self.assertRedirects(response, reverse('doctors:edit_availability', args=[later.id]))
+        client.post(
+            reverse('doctors:edit_availability', args=[later.id]), {'date': date, 'start_time': '09:30', 'end_time': '10:30'}
+        )
+        self.assertEqual(
+            list(AvailabilitySlot.objects.using(self.shard).values_list('start_time', 'end_time')),
+            [(time(9), time(9, 30)), (time(9, 30), time(10, 30))],
+        )
+
+    def test_stale_edit_or_delete_of_a_booked_slot_is_refused(self):
+        stale = AvailabilitySlot.objects.using(self.shard).get(id=self.slot.id)
+        with suppress_email_signals():
+            book_slot(self.patient, self.slot, 'Checkup')
+
+        with self.assertRaises(SlotUnavailable):
+            save_slot(self.doctor, stale.date, time(10), time(10, 30), slot=stale)
+        with self.assertRaises(SlotUnavailable):
+            delete_slot(stale)
+        slot = AvailabilitySlot.objects.using(self.shard).get(id=self.slot.id)
+        self.assertEqual((slot.is_booked, slot.start_time), (True, time(9)))
+
+
+class CompleteAppointmentsTests(BookingTestCase):
+    def appointment(self, days, hour, status='scheduled'):
+        slot = self.doctor.availability_slots.create(
+            date=timezone.now().date() + timedelta(days=days),
+            start_time=time(hour), end_time=time(hour, 30), is_booked=True,
+        )
+        with suppress_email_signals():
+            return self.doctor.appointments.create(
+                patient=self.patient, availability_slot=slot, reason='Checkup', status=status
+            )
+
+    def test_only_past_scheduled_appointments_are_completed(self):
+        past = [self.appointment(-2, 9), self.appointment(-1, 9), self.appointment(-1, 10)]
+        cancelled = self.appointment(-1, 11, status='cancelled')
+        upcoming = self.appointment(1, 10)
+        doctor_version, patient_version = get_version(DOCTOR, self.doctor.id), get_version(PATIENT, self.patient.id)
+
+        out = StringIO()
+        call_command('complete_appointments', batch_size=2, stdout=out)
+
+        self.assertIn('Completed 3 past appointments', out.getvalue())
+        statuses = dict(Appointment.objects.using(self.shard).values_list('id', 'status'))
+        self.assertEqual({statuses[appointment.id] for appointment in past}, {'completed'})
+        self.assertEqual(statuses[cancelled.id], 'cancelled')
+        self.assertEqual(statuses[upcoming.id], 'scheduled')
+        self.assertNotEqual(get_version(DOCTOR, self.doctor.id), doctor_version)
+        self.assertNotEqual(get_version(PATIENT, self.patient.id), patient_version)
+
+    def test_slots_ending_later_today_stay_scheduled(self):
+        today = self.appointment(0, 9)
+        ended = timezone.make_aware(datetime.combine(today.availability_slot.date, time(9, 30)))
+
+        none = dict.fromkeys(shards(), 0)
+        self.assertEqual(complete_past_appointments(now=ended - timedelta(minutes=1)), none)
+        self.assertEqual(complete_past_appointments(now=ended), {**none, self.shard: 1})
+
+
+class PurgePastSlotsTests(BookingTestCase):
+    def add_slot(self, date, hour, is_booked=False):
+        return self.doctor.availability_slots.create(
+            date=date, start_time=time(hour), end_time=time(hour, 30), is_booked=is_booked
+        )
+
+    def test_purge_deletes_past_unbooked_slots_and_rolls_them_up(self):
+        today = timezone.now().date()
+        last_month = today.replace(day=1) - timedelta(days=1)
+        for hour in (9, 10, 11):
+            self.add_slot(last_month, hour)
+        booked = self.add_slot(last_month, 12, is_booked=True)
+        with suppress_email_signals():
+            self.doctor.appointments.create(patient=self.patient, availability_slot=booked, reason='Checkup')
+        self.add_slot(today, 8)
+
+        out = StringIO()
+        call_command('purge_past_slots', batch_size=2, rollup=True, stdout=out)
+
+        self.assertIn('Deleted 3 past unbooked slots', out.getvalue())
+        self.assertEqual(set(AvailabilitySlot.objects.using(self.shard).values_list('date', 'start_time')), {
+            (last_month, time(12)), (today, time(8)), (self.slot.date, self.slot.start_time),
+        })
+        self.assertEqual(
+            slot_utilization(self.doctor),
+            [{'month': last_month.replace(day=1), 'booked': 1, 'unbooked': 3, 'utilization': 0.25}],
+        )
+
+    def test_manage_availability_lists_future_slots_unless_asked(self):
+        self.add_slot(timezone.now().date() - timedelta(days=3), 14)
+        client = self.client_class()
+        client.force_login(self.doctor.user)
+
+        response = client.get(reverse('doctors:manage_availability'))
+        self.assertEqual(list(response.context['availability_slots']), [self.slot])
+
+        response = client.get(reverse('doctors:manage_availability'), {'past': '1'})
+        self.assertEqual(len(response.context['availability_slots']), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL; SQLite runs one write transaction at a time')
+class BookingConcurrencyTests(AllShards, TransactionTestCase):
+    """
+    Bookings and slot changes racing on a real database, each thread on its
+    own connection. Any change to booking must keep these passing. The
+    throughput of each race is written to stderr; BOOKING_RACE_THREADS sets
+    the number of threads.
+    """
+
+    threads = int(os.environ.get('BOOKING_RACE_THREADS', 16))
+
+    def setUp(self):
+        cache.clear()
+        with suppress_email_signals():
+            user = User.objects.create_user('doc', 'doc@example.com', 'pw', role=User.DOCTOR)
+            self.doctor = DoctorProfile.objects.create(user=user)
+            self.patients = [
+                PatientProfile.objects.create(
+                    user=User.objects.create_user(f'pat{i}', f'pat{i}@example.com', 'pw', role=User.PATIENT)
+                )
+                for i in range(self.threads)
+            ]
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def race(self, name, work):
+        """Run ``work(index)`` in every thread at once; returns the results."""
+        start = threading.Barrier(self.threads + 1)
+
+        def worker(index):
+            try:
+                start.wait()
+                with suppress_email_signals():
+                    return work(index)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            futures = [pool.submit(worker, index) for index in range(self.threads)]
+            start.wait()
+            started = perf_counter()
+            results = [future.result() for future in futures]
+            elapsed = perf_counter() - started
+        attempts = sum(len(result) for result in results)
+        sys.stderr.write(
+            f'\n{name}: {attempts} attempts by {self.threads} threads in {elapsed:.2f}s '
+            f'({attempts / elapsed:.0f}/s) '
+        )
+        return results
+
+    def test_each_slot_is_booked_once(self):
+        slots = [
+            self.doctor.availability_slots.create(
+                date=self.tomorrow + timedelta(days=day), start_time=time(hour), end_time=time(hour, 30)
+            )
+            for day in range(5)
+            for hour in range(8, 18)
+        ]
+
+        def book_all(index):
+            outcomes = []
+            # Every thread goes for the same slots in the same order
+            for slot in slots:
+                try:
+                    book_slot(self.patients[index], slot, 'Race')
+                    outcomes.append(slot.id)
+                except SlotUnavailable:
+                    outcomes.append(None)
+            return outcomes
+
+        results = self.race('booking', book_all)
+
+        booked = Counter(slot_id for outcomes in results for slot_id in outcomes if slot_id is not None)
+        self.assertEqual(booked, Counter(slot.id for slot in slots))
+        self.assertEqual(
+            Counter(Appointment.objects.values_list('availability_slot_id', flat=True)), booked
+        )
+        self.assertFalse(AvailabilitySlot.objects.filter(is_booked=False).exists())
+
+    def test_edits_and_deletes_never_touch_booked_slots(self):
+        slots = [
+            self.doctor.availability_slots.create(
+                date=self.tomorrow + timedelta(days=day), start_time=time(hour), end_time=time(hour, 30)
+            )
+            for day in range(5)
+            for hour in range(8, 18)
+        ]
+
+        def book_edit_or_delete(index):
+            outcomes = []
+            # A third of the threads book, a third edit and a third delete the
+            # same slots, the last two with the instances loaded beforehand
+            for slot in slots:
+                try:
+                    if index % 3 == 0:
+                        book_slot(self.patients[index], slot, 'Race')
+                        outcomes.append(slot.id)
+                    elif index % 3 == 1:
+                        save_slot(self.doctor, slot.date, slot.start_time, time(slot.start_time.hour, 20), slot=slot)
+                        outcomes.append(None)
+                    else:
+                        delete_slot(slot)
+                        outcomes.append(None)
+                except SlotUnavailable:
+                    outcomes.append(None)
+            return outcomes
+
+        results = self.race('booking, editing and deleting', book_edit_or_delete)
+
+        booked = {slot_id for outcomes in results for slot_id in outcomes if slot_id is not None}
+        self.assertEqual(set(Appointment.objects.values_list('availability_slot_id', flat=True)), booked)
+        self.assertEqual(set(AvailabilitySlot.objects.filter(is_booked=True).values_list('id', flat=True)), booked)
+
+    def test_racing_slot_changes_never_overlap(self):
+        def add_slots(index):
+            outcomes = []
+            # Thread i asks for 8:00 + 10i minutes on each day; neighbours overlap
+            start = datetime.combine(self.tomorrow, time(8)) + timedelta(minutes=10 * index)
+            for day in range(10):
+                try:
+                    outcomes.append(save_slot(
+                        self.doctor, self.tomorrow + timedelta(days=day),
+                        start.time(), (start + timedelta(minutes=30)).time(),
+                    ))
+                except SlotOverlaps:
+                    outcomes.append(None)
+            return outcomes
+
+        self.race('adding slots', add_slots)
+        added = list(AvailabilitySlot.objects.all())
+
+        def move_slots(index):
+            outcomes = []
+            # Each slot's thread widens it by 15 minutes either side, into its neighbours
+            for slot in added[index::self.threads]:
+                start = datetime.combine(slot.date, slot.start_time) - timedelta(minutes=15)
+                try:
+                    outcomes.append(save_slot(
+                        self.doctor, slot.date, start.time(), (start + timedelta(minutes=45)).time(), slot=slot,
+                    ))
+                except SlotOverlaps:
+                    outcomes.append(None)
+            return outcomes
+
+        self.race('moving slots', move_slots)
+
+        slots = list(AvailabilitySlot.objects.order_by('date', 'start_time'))
+        self.assertEqual(len({slot.date for slot in slots}), 10)
+        for previous, slot in zip(slots, slots[1:]):
+            if previous.date == slot.date:
+                self.assertLessEqual(previous.end_time, slot.start_time, f'{previous} overlaps {slot}')
+
+
+class SeedDataTests(AllShards, TestCase):
+    def seed(self, prefix, seed=1):
+        call_command(
+            'seed_data', prefix=prefix, seed=seed, doctors=3, patients=5, days=4, slots_per_day=3,
+            booked=0.5, emails=10, chunk_size=7, stdout=StringIO(),
+        )
+        doctors = dict(
+            DoctorProfile.objects.filter(user__username__startswith=f'{prefix}-').values_list('id', 'user__username')
+        )
+        slots = sorted(
+            (slot for shard in shards() for slot in AvailabilitySlot.objects.using(shard).filter(doctor_id__in=doctors)),
+            key=lambda slot: (doctors[slot.doctor_id], slot.date, slot.start_time),
+        )
+        return [
+            (slot.date, slot.start_time, slot.is_booked, getattr(getattr(slot, 'appointment', None), 'status', None))
+            for slot in slots
+        ]
+
+    def count(self, queryset):
+        """``queryset``'s rows on every shard."""
+        return sum(queryset.using(shard).count() for shard in shards())
+
+    def test_counts(self):
+        slots = self.seed('a')
+
+        self.assertEqual(User.objects.filter(username__startswith='a-', role=User.DOCTOR).count(), 3)
+        self.assertEqual(PatientProfile.objects.filter(user__username__startswith='a-').count(), 5)
+        self.assertEqual(len(slots), 3 * 4 * 3)
+        self.assertEqual(
+            self.count(Appointment.objects.all()), self.count(AvailabilitySlot.objects.filter(is_booked=True))
+        )
+        self.assertFalse(self.count(Appointment.objects.filter(
+            availability_slot__date__lt=timezone.now().date(), status='scheduled'
+        )))
+        self.assertTrue(self.client.login(username='a-patient-0', password='seed-password'))
+
+    def test_same_seed_same_data(self):
+        self.assertEqual(self.seed('a'), self.seed('b'))
+        self.assertNotEqual(self.seed('c', seed=2), self.seed('d'))
+
+    def test_refuses_to_seed_a_prefix_twice(self):
+        self.seed('a')
+        with self.assertRaises(CommandError):
+            self.seed('a')
+
+
+class ShardIdRangeTests(SimpleTestCase):
+    @override_settings(APPOINTMENT_SHARDS=['default', 'shard1', 'shard2'])
+    def test_ids_map_back_to_the_allocating_shard(self):
+        self.assertEqual(shard_for_id(1), 'default')
+        self.assertEqual(shard_for_id(SHARD_ID_SPAN), 'default')
+        self.assertEqual(shard_for_id(SHARD_ID_SPAN + 1), 'shard1')
+        self.assertEqual(shard_for_id(2 * SHARD_ID_SPAN + 7), 'shard2')
@@ -0,0 +1,71 @@
+# appointments/versions.py
+"""
+Version counters for cached pages and fragments.
+
+Writes to appointments, slots and doctor profiles bump the versions of the
+things they appear on (see appointments.signals). Cached fragments and ETags
+are built from the current version, so a bump makes the old ones unreachable
+and they simply expire.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+# Scopes
+DOCTOR = 'doctor'      # a doctor's dashboard, by DoctorProfile id
+PATIENT = 'patient'    # a patient's dashboard, by PatientProfile id
+SLOTS = 'slots'        # a doctor's free slots, by DoctorProfile id
+DOCTORS = 'doctors'    # the doctor directory (names, specializations, fees)
+
+
+def dashboard_cache_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600)
+
+
+def _version_key(scope, object_id):
+    return f'version:{scope}:{object_id}'
+
+
+def get_version(scope, object_id=''):
+    """Current version for ``scope``/``object_id``, starting one if needed."""
+    key = _version_key(scope, object_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never repeats a version
+        # whose fragments are still cached
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(scope, object_id=''):
+    """get_version() for async views, without blocking the event loop."""
+    key = _version_key(scope, object_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_version(scope, object_id=''):
+    try:
+        cache.incr(_version_key(scope, object_id))
+    except ValueError:
+        cache.set(_version_key(scope, object_id), time.time_ns(), None)
+
+
+async def acached_fragment(fragment_name, *vary_on):
+    """
+    Cached HTML of a ``{% cache %}`` fragment, or None.
+
+    Async views can't leave a queryset for the template to evaluate lazily,
+    so they check the fragment first and only query when it is missing.
+    """
+    html = await cache.aget(make_template_fragment_key(fragment_name, vary_on))
+    return mark_safe(html) if html is not None else None
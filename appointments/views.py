@@ -1,48 +1,37 @@
 # appointments/views.py
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
 from accounts.decorators import patient_required
+from .booking import SlotUnavailable, book_slot
 from .models import Appointment, AvailabilitySlot
+from .sharding import appointment_time, locate, scatter_gather, with_profiles
 from patients.models import PatientProfile
 
 @patient_required
 def book_appointment(request, slot_id):
-    slot = get_object_or_404(AvailabilitySlot, id=slot_id)
+    try:
+        slot = locate(AvailabilitySlot.objects.all(), slot_id)
+    except AvailabilitySlot.DoesNotExist:
+        raise Http404('No AvailabilitySlot matches the given query.')
+    doctor_id = slot.doctor_id
     
     if slot.is_booked:
         messages.error(request, 'This slot is already booked.')
-        return redirect('patients:doctor_details', doctor_id=slot.doctor.id)
+        return redirect('patients:doctor_details', doctor_id=doctor_id)
     
     if request.method == 'POST':
         reason = request.POST.get('reason')
         notes = request.POST.get('notes')
         
-        patient = request.user.patient_profile
-        
-        # Use a transaction to prevent race conditions
-        with transaction.atomic():
-            # Lock the row for update
-            slot = AvailabilitySlot.objects.select_for_update().get(id=slot_id)
-            
-            if slot.is_booked:
-                messages.error(request, 'This slot was just booked by someone else. Please try another slot.')
-                return redirect('patients:doctor_details', doctor_id=slot.doctor.id)
-            
-            # Create the appointment
-            appointment = Appointment.objects.create(
-                patient=patient,
-                doctor=slot.doctor,
-                availability_slot=slot,
-                reason=reason,
-                notes=notes
-            )
-            
-            # Mark the slot as booked
-            slot.is_booked = True
-            slot.save()
+        try:
+            appointment = book_slot(request.role_profile, slot, reason, notes)
+        except SlotUnavailable as e:
+            messages.error(request, str(e))
+            return redirect('patients:doctor_details', doctor_id=doctor_id)
         
         messages.success(request, 'Appointment booked successfully.')
         return redirect('appointments:appointment_confirmation', appointment_id=appointment.id)
@@ -55,7 +44,10 @@ def book_appointment(request, slot_id):
 
 @patient_required
 def appointment_confirmation(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id, patient=request.user.patient_profile)
+    try:
+        appointment = locate(Appointment.objects.filter(patient=request.role_profile), appointment_id)
+    except Appointment.DoesNotExist:
+        raise Http404('No Appointment matches the given query.')
     
     context = {
         'appointment': appointment,
@@ -63,11 +55,14 @@ def appointment_confirmation(request, appointment_id):
     return render(request, 'appointments/appointment_confirmation.html', context)
 
 @patient_required
-def my_appointments(request):
-    patient = request.user.patient_profile
-    appointments = Appointment.objects.filter(patient=patient).order_by('-availability_slot__date', '-availability_slot__start_time')
+async def my_appointments(request):
+    patient = request.role_profile
+    appointments = with_profiles(
+        Appointment.objects.filter(patient=patient).select_related('availability_slot'), 'doctor__user'
+    ).order_by('-availability_slot__date', '-availability_slot__start_time')
     
     context = {
-        'appointments': appointments,
+        # Gathered from every shard, newest first
+        'appointments': await sync_to_async(scatter_gather)(appointments, key=appointment_time, reverse=True),
     }
     return render(request, 'appointments/my_appointments.html', context)
\ No newline at end of file
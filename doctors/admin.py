@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import DoctorProfile
 
-# Register your models here.
+
+@admin.register(DoctorProfile)
+class DoctorProfileAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'specialization', 'notification_mode', 'digest_interval_hours', 'last_digest_sent_at')
+    list_filter = ('specialization', 'notification_mode')
+    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'specialization')
+    list_select_related = ('user',)
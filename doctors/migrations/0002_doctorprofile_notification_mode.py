@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='digest_interval_hours',
+            field=models.PositiveIntegerField(default=24),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='last_digest_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='notification_mode',
+            field=models.CharField(choices=[('realtime', 'Email per appointment'), ('digest', 'Digest email')], default='realtime', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_doctorprofile_notification_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='shard',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
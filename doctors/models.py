@@ -3,11 +3,24 @@ from django.db import models
 from accounts.models import User
 
 class DoctorProfile(models.Model):
+    REALTIME = 'realtime'
+    DIGEST = 'digest'
+
+    NOTIFICATION_MODE_CHOICES = (
+        (REALTIME, 'Email per appointment'),
+        (DIGEST, 'Digest email'),
+    )
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='doctor_profile')
     specialization = models.CharField(max_length=100)
     qualification = models.CharField(max_length=200)
     experience_years = models.PositiveIntegerField(default=0)
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    notification_mode = models.CharField(max_length=10, choices=NOTIFICATION_MODE_CHOICES, default=REALTIME)
+    digest_interval_hours = models.PositiveIntegerField(default=24)
+    last_digest_sent_at = models.DateTimeField(null=True, blank=True)
+    # Database alias holding this doctor's slots and appointments (appointments.sharding)
+    shard = models.CharField(max_length=50, blank=True, default='')
     
     def __str__(self):
         return f"Dr. {self.user.first_name} {self.user.last_name} - {self.specialization}"
\ No newline at end of file
@@ -1,4 +1,5 @@
 # doctors/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -7,30 +8,49 @@ from django.db import transaction
 from django.db.models import Q
 from accounts.decorators import doctor_required
 from .models import DoctorProfile
-from appointments.models import Appointment, AvailabilitySlot
+from appointments.booking import SlotOverlaps, SlotUnavailable, delete_slot, save_slot
+from appointments.models import Appointment
+from appointments.sharding import with_profiles
+from appointments.versions import DOCTOR, acached_fragment, aget_version, dashboard_cache_timeout
 
 @doctor_required
-def dashboard(request):
-    doctor = request.user.doctor_profile
-    upcoming_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        status='scheduled',
-        availability_slot__date__gte=timezone.now().date()
-    ).order_by('availability_slot__date', 'availability_slot__start_time')[:5]
+async def dashboard(request):
+    doctor = request.role_profile
+    today = timezone.now().date()
+    fragment_version = f"{await aget_version(DOCTOR, doctor.id)}:{today}"
+
+    # Only query when the cached fragment is missing
+    cached_upcoming = await acached_fragment('doctor_upcoming_appointments', doctor.id, fragment_version)
+    upcoming_appointments = []
+    if cached_upcoming is None:
+        upcoming_appointments = [
+            appointment async for appointment in with_profiles(doctor.appointments.filter(
+                status='scheduled',
+                availability_slot__date__gte=today
+            ).select_related('availability_slot'), 'patient__user').order_by('availability_slot__date', 'availability_slot__start_time')[:5]
+        ]
     
     context = {
         'doctor': doctor,
         'upcoming_appointments': upcoming_appointments,
+        'cached_upcoming': cached_upcoming,
+        'fragment_version': fragment_version,
+        'fragment_timeout': dashboard_cache_timeout(),
     }
-    return render(request, 'doctors/dashboard.html', context)
+    # The {% cache %} tag reads and writes the cache, so render off the event loop
+    return await sync_to_async(render)(request, 'doctors/dashboard.html', context)
 
 @doctor_required
 def manage_availability(request):
-    doctor = request.user.doctor_profile
-    availability_slots = AvailabilitySlot.objects.filter(doctor=doctor).order_by('date', 'start_time')
+    doctor = request.role_profile
+    show_past = request.GET.get('past') == '1'
+    availability_slots = doctor.availability_slots.order_by('date', 'start_time')
+    if not show_past:
+        availability_slots = availability_slots.filter(date__gte=timezone.now().date())
     
     context = {
         'availability_slots': availability_slots,
+        'show_past': show_past,
     }
     return render(request, 'doctors/manage_availability.html', context)
 
@@ -41,25 +61,19 @@ def add_availability(request):
         start_time = request.POST.get('start_time')
         end_time = request.POST.get('end_time')
         
-        doctor = request.user.doctor_profile
-        
-        # Check if the slot overlaps with existing slots
-        if AvailabilitySlot.check_overlap(doctor, date, start_time, end_time):
-            messages.error(request, 'This time slot overlaps with an existing slot.')
-            return redirect('doctors:add_availability')
+        doctor = request.role_profile
         
         # Check if the date is in the future
         if timezone.datetime.strptime(date, '%Y-%m-%d').date() < timezone.now().date():
             messages.error(request, 'You cannot add availability for past dates.')
             return redirect('doctors:add_availability')
         
-        # Create the availability slot
-        AvailabilitySlot.objects.create(
-            doctor=doctor,
-            date=date,
-            start_time=start_time,
-            end_time=end_time
-        )
+        # Create the availability slot (on the doctor's shard) unless it overlaps an existing one
+        try:
+            save_slot(doctor, date, start_time, end_time)
+        except SlotOverlaps as e:
+            messages.error(request, str(e))
+            return redirect('doctors:add_availability')
         
         messages.success(request, 'Availability slot added successfully.')
         return redirect('doctors:manage_availability')
@@ -68,7 +82,7 @@ def add_availability(request):
 
 @doctor_required
 def edit_availability(request, slot_id):
-    slot = get_object_or_404(AvailabilitySlot, id=slot_id, doctor=request.user.doctor_profile)
+    slot = get_object_or_404(request.role_profile.availability_slots, id=slot_id)
     
     if slot.is_booked:
         messages.error(request, 'Cannot edit a booked slot.')
@@ -79,21 +93,21 @@ def edit_availability(request, slot_id):
         start_time = request.POST.get('start_time')
         end_time = request.POST.get('end_time')
         
-        # Check if the slot overlaps with existing slots (excluding the current slot)
-        if AvailabilitySlot.check_overlap(slot.doctor, date, start_time, end_time, exclude_id=slot.id):
-            messages.error(request, 'This time slot overlaps with an existing slot.')
-            return redirect('doctors:edit_availability', slot_id=slot.id)
-        
         # Check if the date is in the future
         if timezone.datetime.strptime(date, '%Y-%m-%d').date() < timezone.now().date():
             messages.error(request, 'You cannot set availability for past dates.')
             return redirect('doctors:edit_availability', slot_id=slot.id)
         
-        # Update the availability slot
-        slot.date = date
-        slot.start_time = start_time
-        slot.end_time = end_time
-        slot.save()
+        # Update the availability slot unless it overlaps another one
+        try:
+            save_slot(request.role_profile, date, start_time, end_time, slot=slot)
+        except SlotOverlaps as e:
+            messages.error(request, str(e))
+            return redirect('doctors:edit_availability', slot_id=slot.id)
+        except SlotUnavailable as e:
+            # Booked (or moved) since the page was loaded
+            messages.error(request, str(e))
+            return redirect('doctors:manage_availability')
         
         messages.success(request, 'Availability slot updated successfully.')
         return redirect('doctors:manage_availability')
@@ -105,20 +119,27 @@ def edit_availability(request, slot_id):
 
 @doctor_required
 def delete_availability(request, slot_id):
-    slot = get_object_or_404(AvailabilitySlot, id=slot_id, doctor=request.user.doctor_profile)
+    slot = get_object_or_404(request.role_profile.availability_slots, id=slot_id)
     
     if slot.is_booked:
         messages.error(request, 'Cannot delete a booked slot.')
     else:
-        slot.delete()
-        messages.success(request, 'Availability slot deleted successfully.')
+        try:
+            # Checked again under the slot's lock, in case it was just booked
+            delete_slot(slot)
+        except SlotUnavailable as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, 'Availability slot deleted successfully.')
     
     return redirect('doctors:manage_availability')
 
 @doctor_required
 def appointments(request):
-    doctor = request.user.doctor_profile
-    appointments = Appointment.objects.filter(doctor=doctor).order_by('-availability_slot__date', '-availability_slot__start_time')
+    doctor = request.role_profile
+    appointments = with_profiles(
+        doctor.appointments.select_related('availability_slot'), 'patient__user'
+    ).order_by('-availability_slot__date', '-availability_slot__start_time')
     
     context = {
         'appointments': appointments,
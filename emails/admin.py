@@ -12,7 +12,9 @@ from emails.models import (
     EmailRateLimit,
     EmailAttachment,
     EmailSESEvent,
+    EmailDeliveryRollup,
 )
+from emails.analytics import delivery_summary
 
 
 @admin.register(EmailTemplate)
@@ -176,8 +178,8 @@ class EmailRateLimitAdmin(admin.ModelAdmin):
 class EmailAttachmentAdmin(admin.ModelAdmin):
     list_display = ('filename', 'content_type', 'size_mb', 'upload_status', 'created_at')
     list_filter = ('content_type', 'upload_status', 'created_at')
-    search_fields = ('filename', 'email_log__request_id')
-    readonly_fields = ('created_at',)
+    search_fields = ('filename', 'sha256', 'email_log__request_id')
+    readonly_fields = ('sha256', 'created_at')
 
     def size_mb(self, obj):
         return f"{obj.size_mb:.2f} MB"
@@ -198,3 +200,23 @@ class EmailSESEventAdmin(admin.ModelAdmin):
 
     def has_add_permission(self, request):
         return False  # SES events are created automatically
+
+
+@admin.register(EmailDeliveryRollup)
+class EmailDeliveryRollupAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'status', 'template_used', 'email_type', 'recipient_domain', 'count')
+    list_filter = ('status', 'email_type', 'template_used', 'hour')
+    search_fields = ('recipient_domain', 'template_used')
+    date_hierarchy = 'hour'
+    change_list_template = 'admin/emails/emaildeliveryrollup/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['summary'] = delivery_summary(hours=24)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def has_add_permission(self, request):
+        return False  # Maintained by rollup_email_stats
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,211 @@
+"""
+Incremental delivery analytics for the email service.
+
+update_rollups() folds EmailSendLog and EmailSESEvent rows created since the
+last run into hourly EmailDeliveryRollup counters, so reports never scan the
+raw log tables.
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from emails.models import (
+    EmailDeliveryRollup,
+    EmailRollupCheckpoint,
+    EmailSendLog,
+    EmailSESEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "delivery"
+
+# Rows younger than this may still be in flight (pending) or belong to a
+# transaction that has not committed yet, so they wait for the next run.
+# Rows are taken in id order up to the first unsettled one: the checkpoint
+# never moves past an id whose row is unsettled, or not yet visible because
+# it committed after a higher id.
+SETTLE_SECONDS = getattr(settings, "EMAIL_ROLLUP_SETTLE_SECONDS", 300)
+
+RollupKey = Tuple[Any, str, str, str, str]
+
+
+def _recipient_domain(to_addresses) -> str:
+    """Domain of the first To address (all our emails have one recipient)."""
+    if not to_addresses:
+        return ""
+    address = to_addresses[0]
+    return address.rpartition("@")[2].lower()[:255]
+
+
+def _hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _log_key(hour, status, template_used, tags, to_addresses) -> RollupKey:
+    return (
+        _hour(hour),
+        status,
+        template_used or "",
+        (tags or {}).get("email_type", "")[:50],
+        _recipient_domain(to_addresses),
+    )
+
+
+def _collect_send_logs(after_id: int, cutoff, batch_size: int) -> Tuple[Counter, int]:
+    counts = Counter()
+    last_id = after_id
+    rows = (
+        EmailSendLog.objects.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list("id", "created_at", "status", "template_used", "tags", "to_addresses")
+    )[:batch_size]
+    for log_id, created_at, status, template_used, tags, to_addresses in rows:
+        if created_at >= cutoff:
+            break
+        counts[_log_key(created_at, status, template_used, tags, to_addresses)] += 1
+        last_id = log_id
+    return counts, last_id
+
+
+def _collect_ses_events(after_id: int, cutoff, batch_size: int) -> Tuple[Counter, int]:
+    counts = Counter()
+    last_id = after_id
+    rows = (
+        EmailSESEvent.objects.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list(
+            "id",
+            "created_at",
+            "event_timestamp",
+            "event_type",
+            "email_log__template_used",
+            "email_log__tags",
+            "email_log__to_addresses",
+        )
+    )[:batch_size]
+    for event_id, created_at, timestamp, event_type, template_used, tags, to_addresses in rows:
+        if created_at >= cutoff:
+            break
+        counts[_log_key(timestamp, event_type, template_used, tags, to_addresses)] += 1
+        last_id = event_id
+    return counts, last_id
+
+
+def _apply(counts: Counter) -> None:
+    """Add ``counts`` onto the stored rollup rows."""
+    if not counts:
+        return
+
+    hours = {key[0] for key in counts}
+    existing = {
+        (row.hour, row.status, row.template_used, row.email_type, row.recipient_domain): row
+        for row in EmailDeliveryRollup.objects.filter(hour__in=hours)
+    }
+
+    to_update = []
+    to_create = []
+    for key, count in counts.items():
+        row = existing.get(key)
+        if row is not None:
+            row.count += count
+            to_update.append(row)
+        else:
+            hour, status, template_used, email_type, domain = key
+            to_create.append(EmailDeliveryRollup(
+                hour=hour,
+                status=status,
+                template_used=template_used,
+                email_type=email_type,
+                recipient_domain=domain,
+                count=count,
+            ))
+
+    EmailDeliveryRollup.objects.bulk_update(to_update, ["count"])
+    EmailDeliveryRollup.objects.bulk_create(to_create)
+
+
+def update_rollups(batch_size: int = 5000, now=None) -> int:
+    """
+    Fold new send logs and SES events into the hourly rollups.
+
+    Processes at most ``batch_size`` rows of each kind per batch and loops
+    until caught up. Returns the number of source rows processed.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=SETTLE_SECONDS)
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = EmailRollupCheckpoint.objects.select_for_update().get_or_create(
+                name=CHECKPOINT_NAME
+            )
+            log_counts, last_log_id = _collect_send_logs(
+                checkpoint.last_send_log_id, cutoff, batch_size
+            )
+            event_counts, last_event_id = _collect_ses_events(
+                checkpoint.last_ses_event_id, cutoff, batch_size
+            )
+            batch = sum(log_counts.values()) + sum(event_counts.values())
+            if not batch:
+                break
+
+            _apply(log_counts + event_counts)
+            checkpoint.last_send_log_id = last_log_id
+            checkpoint.last_ses_event_id = last_event_id
+            checkpoint.save()
+
+        processed += batch
+        logger.info(f"Rolled up {batch} email rows (total {processed})")
+
+    return processed
+
+
+def _totals(rows: Iterable[Dict[str, Any]], field: str) -> Dict[str, int]:
+    return {row[field]: row["total"] for row in rows}
+
+
+def delivery_summary(hours: int = 24, now=None) -> Dict[str, Any]:
+    """
+    Summarise the rollups for the last ``hours`` hours.
+
+    Reads only EmailDeliveryRollup, so the cost depends on the window and the
+    number of distinct dimensions, not on the log volume.
+    """
+    now = now or timezone.now()
+    since = _hour(now) - timedelta(hours=hours - 1)
+    rollups = EmailDeliveryRollup.objects.filter(hour__gte=since)
+
+    by_status = _totals(rollups.values("status").annotate(total=Sum("count")), "status")
+    sent = by_status.get("sent", 0)
+
+    def rate(status: str) -> Optional[float]:
+        return round(by_status.get(status, 0) / sent, 4) if sent else None
+
+    return {
+        "since": since.isoformat(),
+        "hours": hours,
+        "by_status": by_status,
+        "by_template": _totals(
+            rollups.filter(status="sent").values("template_used").annotate(total=Sum("count")),
+            "template_used",
+        ),
+        "by_email_type": _totals(
+            rollups.filter(status="sent").values("email_type").annotate(total=Sum("count")),
+            "email_type",
+        ),
+        "by_recipient_domain": _totals(
+            rollups.filter(status="sent").values("recipient_domain").annotate(total=Sum("count")),
+            "recipient_domain",
+        ),
+        "delivery_rate": rate("delivery"),
+        "bounce_rate": rate("bounce"),
+        "complaint_rate": rate("complaint"),
+    }
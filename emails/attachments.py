@@ -0,0 +1,200 @@
+"""
+Attachment storage for the email service.
+
+Attachments given as files on disk are streamed in chunks into a
+content-addressed blob store, so an attachment sent to many recipients is
+hashed and stored once and the API payload carries only a reference.
+"""
+
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from emails.models import EmailAttachment
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalBlobStore:
+    """Filesystem stand-in for S3; blobs are named by their SHA-256."""
+
+    def __init__(self, root=None, base_url=None):
+        self.root = str(root or getattr(settings, "EMAIL_ATTACHMENT_ROOT", "email_attachments"))
+        self.base_url = base_url or getattr(settings, "EMAIL_ATTACHMENT_BASE_URL", None) or (
+            "file://" + os.path.abspath(self.root) + "/"
+        )
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def url(self, digest: str) -> str:
+        return f"{self.base_url}{digest[:2]}/{digest}"
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def put(self, fileobj) -> Tuple[str, int]:
+        """
+        Stream ``fileobj`` into the store.
+
+        Hashes while copying to a temporary file and keeps it only if the
+        digest is new. Returns (sha256 hex digest, size in bytes).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            hexdigest = digest.hexdigest()
+            final_path = self._path(hexdigest)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return hexdigest, size
+
+
+class _DigestCache:
+    """LRU of file digests keyed by (path, size, mtime) to skip re-reading."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+            return digest
+
+    def add(self, key, digest: str) -> None:
+        with self._lock:
+            self._digests[key] = digest
+            self._digests.move_to_end(key)
+            while len(self._digests) > self.maxsize:
+                self._digests.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._digests.clear()
+
+
+digest_cache = _DigestCache()
+_store = None
+
+
+def get_attachment_store():
+    """Get the configured blob store (EMAIL_ATTACHMENT_STORE)."""
+    global _store
+    if _store is None:
+        store_class = import_string(
+            getattr(settings, "EMAIL_ATTACHMENT_STORE", "emails.attachments.LocalBlobStore")
+        )
+        _store = store_class()
+    return _store
+
+
+def store_file(path: str, store=None) -> Tuple[str, int, str]:
+    """
+    Put the file at ``path`` into the blob store.
+
+    Returns (sha256, size, url). Unchanged files already in the store are
+    not read again.
+    """
+    store = store or get_attachment_store()
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    digest = digest_cache.get(cache_key)
+    if digest is not None and store.exists(digest):
+        return digest, stat.st_size, store.url(digest)
+
+    with open(path, "rb") as f:
+        digest, size = store.put(f)
+    digest_cache.add(cache_key, digest)
+    return digest, size, store.url(digest)
+
+
+def _inline_size(content) -> int:
+    """Size in bytes of an inline attachment's base64 ``content`` once decoded, without decoding it."""
+    return len(content) * 3 // 4 - content[-2:].count("=")
+
+
+def prepare_attachments(
+    attachments: Optional[List[Dict[str, Any]]], store=None
+) -> Tuple[List[Dict[str, Any]], List[EmailAttachment]]:
+    """
+    Upload file attachments and build their payload entries and log records.
+
+    Dicts with a ``path`` are streamed to the blob store and replaced by a
+    reference (filename, content_type, size, sha256, url). Other dicts, with
+    their ``content`` base64 encoded, are passed through unchanged. The
+    returned EmailAttachment records are unsaved; attach them to the send log
+    with save_attachment_records().
+    """
+    payload = []
+    records = []
+    for attachment in attachments or []:
+        path = attachment.get("path")
+        if not path:
+            payload.append(attachment)
+            content = attachment.get("content") or ""
+            records.append(EmailAttachment(
+                filename=attachment.get("filename", "")[:255],
+                content_type=attachment.get("content_type", "application/octet-stream")[:100],
+                size=_inline_size(content),
+            ))
+            continue
+
+        filename = attachment.get("filename") or os.path.basename(path)
+        content_type = (
+            attachment.get("content_type")
+            or mimetypes.guess_type(filename)[0]
+            or "application/octet-stream"
+        )
+        digest, size, url = store_file(path, store)
+        payload.append({
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "sha256": digest,
+            "url": url,
+        })
+        records.append(EmailAttachment(
+            filename=filename[:255],
+            content_type=content_type[:100],
+            size=size,
+            sha256=digest,
+            s3_url=url,
+            upload_status="uploaded",
+        ))
+    return payload, records
+
+
+def save_attachment_records(log_entry, records: List[EmailAttachment]) -> None:
+    """Link prepared attachment records to ``log_entry`` in one INSERT."""
+    if not records:
+        return
+    for record in records:
+        record.email_log = log_entry
+    EmailAttachment.objects.bulk_create(records)
@@ -8,13 +8,17 @@ import hashlib
 import logging
 import sys
 import os
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import requests
 
 from django.conf import settings
 from django.core.mail import send_mail as django_send_mail
+from django.db import IntegrityError, transaction
 from emails.models import EmailSendLog
+from emails.attachments import prepare_attachments, save_attachment_records
 import uuid
 
 # Add parent directory to path for serverless_email imports
@@ -25,6 +29,48 @@ if parent_dir not in sys.path:
 logger = logging.getLogger(__name__)
 
 
+def make_idempotency_key(email_type: str, entity_id: Any) -> str:
+    """Build the idempotency key for an email about a single entity."""
+    return f"{email_type}:{entity_id}"
+
+
+class IdempotencyCache:
+    """Thread-safe LRU of idempotency keys already claimed by this process."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the request_id that claimed ``key``, if remembered."""
+        with self._lock:
+            request_id = self._keys.get(key)
+            if request_id is not None:
+                self._keys.move_to_end(key)
+            return request_id
+
+    def add(self, key: str, request_id: str) -> None:
+        with self._lock:
+            self._keys[key] = request_id
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+
+
+idempotency_cache = IdempotencyCache(
+    getattr(settings, "SERVERLESS_EMAIL_IDEMPOTENCY_CACHE_SIZE", 10000)
+)
+
+
 class ServerlessEmailClient:
     """Client for sending emails via the serverless email service."""
 
@@ -60,6 +106,7 @@ class ServerlessEmailClient:
         bcc: List[str] = None,
         attachments: List[Dict] = None,
         tags: Dict[str, str] = None,
+        idempotency_key: str = None,
     ) -> Dict[str, Any]:
         """
         Send an email.
@@ -73,14 +120,34 @@ class ServerlessEmailClient:
             text_body: Plain text body
             cc: CC recipients
             bcc: BCC recipients
-            attachments: List of attachment dicts
+            attachments: List of attachment dicts. Dicts with a "path" are
+                streamed from disk into the attachment store and sent by
+                reference; others are sent inline as given.
             tags: Custom tags for tracking
+            idempotency_key: Key identifying this logical email (see
+                make_idempotency_key). A key that was already sent, or is
+                being sent, short-circuits before any HTTP call or log write.
             
         Returns:
             Dict with send result
         """
         request_id = str(uuid.uuid4())
 
+        if idempotency_key:
+            duplicate = self._find_duplicate(idempotency_key)
+            if duplicate:
+                return duplicate
+
+        try:
+            attachments, attachment_records = prepare_attachments(attachments)
+        except OSError as e:
+            logger.error(f"Failed to store email attachments: {str(e)}")
+            return {
+                "success": False,
+                "request_id": request_id,
+                "error": f"Attachment error: {str(e)}",
+            }
+
         # Use local emulator if configured
         if self.use_local:
             return self._send_locally(
@@ -95,6 +162,8 @@ class ServerlessEmailClient:
                 bcc,
                 attachments,
                 tags,
+                idempotency_key,
+                attachment_records,
             )
 
         # Build request payload
@@ -123,17 +192,24 @@ class ServerlessEmailClient:
             payload["tags"] = tags
 
         # Log the request
-        log_entry = EmailSendLog.objects.create(
-            request_id=request_id,
-            from_address=getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@example.com"),
-            to_addresses=to_addresses,
-            cc_addresses=cc or [],
-            bcc_addresses=bcc or [],
-            subject=subject,
-            template_used=template_name,
-            template_variables=template_vars or {},
-            tags=tags or {},
+        log_entry = self._create_log_entry(
+            request_id,
+            to_addresses,
+            subject,
+            template_name,
+            template_vars,
+            cc,
+            bcc,
+            tags,
+            idempotency_key,
+            attachment_records,
         )
+        if log_entry is None:
+            return self._find_duplicate(idempotency_key) or {
+                "success": True,
+                "duplicate": True,
+                "request_id": None,
+            }
 
         # Send via API
         try:
@@ -157,6 +233,7 @@ class ServerlessEmailClient:
                 }
             else:
                 error_msg = response.text
+                self._release_idempotency_key(log_entry)
                 log_entry.mark_failed("API_ERROR", error_msg, retryable=True)
                 return {
                     "success": False,
@@ -166,6 +243,7 @@ class ServerlessEmailClient:
                 }
         except requests.RequestException as e:
             logger.error(f"Failed to send email via API: {str(e)}")
+            self._release_idempotency_key(log_entry)
             log_entry.mark_failed("CONNECTION_ERROR", str(e), retryable=True)
             return {
                 "success": False,
@@ -186,6 +264,8 @@ class ServerlessEmailClient:
         bcc: List[str],
         attachments: List[Dict],
         tags: Dict[str, str],
+        idempotency_key: str = None,
+        attachment_records: List = None,
     ) -> Dict[str, Any]:
         """Send using local emulator."""
         from serverless_email.local_emulator import get_local_emulator
@@ -193,17 +273,24 @@ class ServerlessEmailClient:
         emulator = get_local_emulator()
 
         # Log the request
-        log_entry = EmailSendLog.objects.create(
-            request_id=request_id,
-            from_address=getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@example.com"),
-            to_addresses=to_addresses,
-            cc_addresses=cc or [],
-            bcc_addresses=bcc or [],
-            subject=subject,
-            template_used=template_name,
-            template_variables=template_vars or {},
-            tags=tags or {},
+        log_entry = self._create_log_entry(
+            request_id,
+            to_addresses,
+            subject,
+            template_name,
+            template_vars,
+            cc,
+            bcc,
+            tags,
+            idempotency_key,
+            attachment_records,
         )
+        if log_entry is None:
+            return self._find_duplicate(idempotency_key) or {
+                "success": True,
+                "duplicate": True,
+                "request_id": None,
+            }
 
         result = emulator.send_email(
             to_addresses=to_addresses,
@@ -225,6 +312,7 @@ class ServerlessEmailClient:
                 "message_id": result["message_id"],
             }
         else:
+            self._release_idempotency_key(log_entry)
             log_entry.mark_failed("SEND_ERROR", result.get("error", "Unknown error"))
             return {
                 "success": False,
@@ -232,6 +320,80 @@ class ServerlessEmailClient:
                 "error": result.get("error"),
             }
 
+    def _find_duplicate(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """Return a result for an already-claimed key, or None if it is free."""
+        request_id = idempotency_cache.get(idempotency_key)
+        if request_id is None:
+            request_id = (
+                EmailSendLog.objects.filter(idempotency_key=idempotency_key)
+                .values_list("request_id", flat=True)
+                .first()
+            )
+            if request_id is None:
+                return None
+            idempotency_cache.add(idempotency_key, request_id)
+
+        logger.info(f"Skipping duplicate email {idempotency_key} (request {request_id})")
+        return {
+            "success": True,
+            "duplicate": True,
+            "request_id": request_id,
+        }
+
+    def _create_log_entry(
+        self,
+        request_id: str,
+        to_addresses: List[str],
+        subject: str,
+        template_name: str,
+        template_vars: Dict[str, Any],
+        cc: List[str],
+        bcc: List[str],
+        tags: Dict[str, str],
+        idempotency_key: str = None,
+        attachment_records: List = None,
+    ) -> Optional[EmailSendLog]:
+        """
+        Create the send log, claiming ``idempotency_key`` if given, and
+        record its prepared attachments.
+
+        Returns None when another send claimed the key first; the unique
+        index on idempotency_key is the source of truth across processes.
+        """
+        attachment_records = attachment_records or []
+        try:
+            # Savepoint so a lost race does not break the caller's transaction
+            with transaction.atomic():
+                log_entry = EmailSendLog.objects.create(
+                    request_id=request_id,
+                    idempotency_key=idempotency_key,
+                    from_address=getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@example.com"),
+                    to_addresses=to_addresses,
+                    cc_addresses=cc or [],
+                    bcc_addresses=bcc or [],
+                    subject=subject,
+                    template_used=template_name or "",
+                    template_variables=template_vars or {},
+                    tags=tags or {},
+                    attachment_count=len(attachment_records),
+                    total_attachment_size=sum(record.size for record in attachment_records),
+                )
+                save_attachment_records(log_entry, attachment_records)
+        except IntegrityError:
+            if idempotency_key and EmailSendLog.objects.filter(idempotency_key=idempotency_key).exists():
+                return None
+            raise
+
+        if idempotency_key:
+            idempotency_cache.add(idempotency_key, request_id)
+        return log_entry
+
+    def _release_idempotency_key(self, log_entry: EmailSendLog) -> None:
+        """Free the key of a failed send so it can be retried."""
+        if log_entry.idempotency_key:
+            idempotency_cache.discard(log_entry.idempotency_key)
+            log_entry.idempotency_key = None
+
     def send_appointment_confirmation(self, appointment) -> Dict[str, Any]:
         """Send appointment confirmation email to patient."""
         from patients.models import PatientProfile
@@ -259,6 +421,7 @@ class ServerlessEmailClient:
                 "appointment_id": str(appointment.id),
                 "patient_id": str(patient.id),
             },
+            idempotency_key=make_idempotency_key("appointment_confirmation", appointment.id),
         )
 
     def send_appointment_reminder(self, appointment) -> Dict[str, Any]:
@@ -281,6 +444,7 @@ class ServerlessEmailClient:
                 "email_type": "appointment_reminder",
                 "appointment_id": str(appointment.id),
             },
+            idempotency_key=make_idempotency_key("appointment_reminder", appointment.id),
         )
 
     def send_welcome_email(self, user) -> Dict[str, Any]:
@@ -300,6 +464,7 @@ class ServerlessEmailClient:
                 "user_id": str(user.id),
                 "user_role": role,
             },
+            idempotency_key=make_idempotency_key("welcome", user.id),
         )
 
     def send_doctor_appointment_notification(self, appointment) -> Dict[str, Any]:
@@ -324,6 +489,39 @@ class ServerlessEmailClient:
                 "appointment_id": str(appointment.id),
                 "doctor_id": str(doctor.id),
             },
+            idempotency_key=make_idempotency_key("doctor_new_appointment", appointment.id),
+        )
+
+    def send_doctor_appointment_digest(
+        self, doctor, appointments: List, window_start: datetime, window_end: datetime
+    ) -> Dict[str, Any]:
+        """Send one summary of the appointments booked with a digest-mode doctor."""
+        return self.send_email(
+            to_addresses=[doctor.user.email],
+            subject=f"{len(appointments)} New Appointment{'s' if len(appointments) != 1 else ''} Scheduled",
+            template_name="doctor_appointment_digest",
+            template_vars={
+                "doctor_name": f"Dr. {doctor.user.first_name} {doctor.user.last_name}",
+                "appointment_count": len(appointments),
+                "since": window_start.strftime("%B %d, %Y %I:%M %p"),
+                "until": window_end.strftime("%B %d, %Y %I:%M %p"),
+                "appointments": [
+                    {
+                        "patient_name": appointment.patient.user.first_name or "Patient",
+                        "date": appointment.availability_slot.date.strftime("%B %d, %Y"),
+                        "time": appointment.availability_slot.start_time.strftime("%I:%M %p"),
+                        "reason": appointment.reason[:100],
+                    }
+                    for appointment in appointments
+                ],
+            },
+            tags={
+                "email_type": "doctor_appointment_digest",
+                "doctor_id": str(doctor.id),
+            },
+            idempotency_key=make_idempotency_key(
+                "doctor_appointment_digest", f"{doctor.id}:{window_end:%Y%m%d%H%M}"
+            ),
         )
 
 
@@ -354,3 +552,9 @@ def send_doctor_appointment_notification(appointment) -> Dict[str, Any]:
     """Convenience function to send doctor notification."""
     client = get_email_client()
     return client.send_doctor_appointment_notification(appointment)
+
+
+def send_doctor_appointment_digest(doctor, appointments, window_start, window_end) -> Dict[str, Any]:
+    """Convenience function to send a doctor appointment digest."""
+    client = get_email_client()
+    return client.send_doctor_appointment_digest(doctor, appointments, window_start, window_end)
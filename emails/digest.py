@@ -0,0 +1,97 @@
+"""
+Periodic appointment digests for doctors in digest notification mode.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from typing import Dict
+
+from django.conf import settings
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.sharding import shard_for_doctor, with_profiles
+from doctors.models import DoctorProfile
+from emails.client import get_email_client
+
+logger = logging.getLogger(__name__)
+
+# Appointments younger than this may belong to a booking that has not
+# committed yet; they wait for the next digest rather than being skipped
+# once the window has moved past their created_at.
+SETTLE_SECONDS = getattr(settings, "EMAIL_DIGEST_SETTLE_SECONDS", 300)
+
+
+def window_start(doctor, now):
+    """Start of the digest window ending at ``now``."""
+    return doctor.last_digest_sent_at or now - timedelta(hours=doctor.digest_interval_hours)
+
+
+def due_digest_doctors(now=None):
+    """Digest-mode doctors whose window has elapsed."""
+    now = now or timezone.now()
+    doctors = DoctorProfile.objects.filter(notification_mode=DoctorProfile.DIGEST).select_related("user")
+    return [
+        doctor
+        for doctor in doctors
+        if doctor.last_digest_sent_at is None
+        or doctor.last_digest_sent_at + timedelta(hours=doctor.digest_interval_hours) <= now
+    ]
+
+
+def send_doctor_digests(now=None) -> Dict[str, int]:
+    """
+    Send one digest per due doctor covering appointments booked since their
+    previous digest, then advance each doctor's window to the settle cutoff.
+
+    The new appointments of all due doctors on a shard come from a single
+    query ordered by doctor; doctors with nothing new get no email.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=SETTLE_SECONDS)
+    doctors = {doctor.id: doctor for doctor in due_digest_doctors(now)}
+    stats = {"doctors": len(doctors), "digests_sent": 0, "appointments": 0, "failed": 0}
+    if not doctors:
+        return stats
+
+    by_shard = defaultdict(list)
+    for doctor in doctors.values():
+        by_shard[shard_for_doctor(doctor)].append(doctor)
+
+    def new_appointments():
+        for shard, shard_doctors in by_shard.items():
+            # Fetch from the earliest window, then drop what each doctor has
+            # already had (the profile can't be joined on a shard)
+            appointments = with_profiles(
+                Appointment.objects.using(shard)
+                .filter(
+                    doctor_id__in=[doctor.id for doctor in shard_doctors],
+                    status="scheduled",
+                    created_at__gt=min(window_start(doctor, cutoff) for doctor in shard_doctors),
+                    created_at__lte=cutoff,
+                )
+                .select_related("availability_slot"),
+                "patient__user",
+            ).order_by("doctor_id", "availability_slot__date", "availability_slot__start_time")
+            for appointment in appointments:
+                if appointment.created_at > window_start(doctors[appointment.doctor_id], cutoff):
+                    yield appointment
+
+    client = get_email_client()
+    for doctor_id, group in groupby(new_appointments(), key=lambda appointment: appointment.doctor_id):
+        doctor = doctors[doctor_id]
+        group = list(group)
+        result = client.send_doctor_appointment_digest(doctor, group, window_start(doctor, cutoff), cutoff)
+        if result.get("success"):
+            stats["digests_sent"] += 1
+            stats["appointments"] += len(group)
+        else:
+            # Leave the window open so the next run retries these appointments
+            stats["failed"] += 1
+            doctors.pop(doctor_id)
+            logger.warning(f"Failed to send digest to doctor {doctor_id}: {result.get('error')}")
+
+    DoctorProfile.objects.filter(id__in=doctors).update(last_digest_sent_at=cutoff)
+    return stats
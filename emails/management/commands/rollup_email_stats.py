@@ -0,0 +1,23 @@
+"""
+Django management command to update the hourly email delivery rollups
+Usage: python manage.py rollup_email_stats  (run hourly from cron)
+"""
+
+from django.core.management.base import BaseCommand
+from emails.analytics import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold new email send logs and SES events into the hourly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows of each kind processed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        processed = update_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Rolled up {processed} rows'))
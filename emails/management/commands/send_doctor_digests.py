@@ -0,0 +1,18 @@
+"""
+Django management command to send appointment digests to doctors
+Usage: python manage.py send_doctor_digests  (run from cron, e.g. every 15 minutes)
+"""
+
+from django.core.management.base import BaseCommand
+from emails.digest import send_doctor_digests
+
+
+class Command(BaseCommand):
+    help = 'Send appointment digest emails to doctors whose digest window has elapsed'
+
+    def handle(self, *args, **options):
+        stats = send_doctor_digests()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['digests_sent']} digests sent covering {stats['appointments']} appointments "
+            f"({stats['doctors']} doctors due, {stats['failed']} failed)"
+        ))
@@ -1,17 +1,33 @@
 """
 Django management command to test the serverless email service
 Usage: python manage.py test_email_service
+       python manage.py test_email_service --count 1000 --concurrency 16  (load test)
 """
 
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+from accounts.management.commands.benchmark_wsgi_asgi import percentile
 from emails.client import (
+    ServerlessEmailClient,
     send_welcome_email,
     send_appointment_confirmation,
     send_doctor_appointment_notification,
 )
-from appointments.models import Appointment
+from emails.models import EmailSendLog
+from emails.signals import suppress_email_signals
+from appointments.models import Appointment, AvailabilitySlot
+from doctors.models import DoctorProfile
+from patients.models import PatientProfile
+from collections import Counter
+from datetime import time, timedelta
 import logging
+import queue
+import threading
+import uuid
+from time import perf_counter
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -37,9 +53,40 @@ class Command(BaseCommand):
             type=int,
             help='Appointment ID to send email for',
         )
+        parser.add_argument(
+            '--count',
+            type=int,
+            help='Load test: send this many emails to synthetic users/appointments',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Load test: number of sending threads',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Load test: rows per bulk insert and per fetch of synthetic data',
+        )
+        parser.add_argument(
+            '--transport',
+            choices=['http', 'local'],
+            default='http',
+            help='Load test: send via the HTTP API or the local emulator',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Load test: keep the synthetic rows and send logs afterwards',
+        )
 
     def handle(self, *args, **options):
         email_type = options.get('email_type', 'welcome')
+
+        if options.get('count'):
+            return self.run_load_test(options)
         
         self.stdout.write(self.style.SUCCESS('Testing Serverless Email Service'))
         self.stdout.write('-' * 60)
@@ -169,3 +216,212 @@ class Command(BaseCommand):
                 self.style.ERROR(f"✗ Email failed to send")
             )
             self.stdout.write(f"  Error: {result.get('error')}")
+
+    # Load test
+
+    def run_load_test(self, options):
+        """Send --count emails to synthetic data and report the results."""
+        email_type = options['email_type']
+        count = options['count']
+        concurrency = max(options['concurrency'], 1)
+        batch_size = max(options['batch_size'], 1)
+
+        senders = {
+            'welcome': ServerlessEmailClient.send_welcome_email,
+            'appointment': ServerlessEmailClient.send_appointment_confirmation,
+            'doctor': ServerlessEmailClient.send_doctor_appointment_notification,
+        }
+        if email_type not in senders:
+            raise CommandError(f"Unknown email type: {email_type}")
+
+        client = ServerlessEmailClient()
+        client.use_local = options['transport'] == 'local'
+        if client.use_local:
+            try:
+                import serverless_email.local_emulator  # noqa
+            except ImportError:
+                raise CommandError("--transport local needs the serverless_email package on the path")
+
+        run_id = uuid.uuid4().hex[:8]
+        self.stdout.write(self.style.SUCCESS(f'Email load test {run_id}'))
+        self.stdout.write('-' * 60)
+        self.stdout.write(
+            f"{count} x {email_type} via {options['transport']}, "
+            f"concurrency {concurrency}, batch size {batch_size}"
+        )
+
+        results = None
+        try:
+            started = perf_counter()
+            ids = self.create_synthetic_data(run_id, count, batch_size, email_type != 'welcome')
+            self.stdout.write(f"Synthetic data created in {perf_counter() - started:.2f}s")
+
+            results = self.drive_senders(
+                client,
+                senders[email_type],
+                self.iter_targets(email_type, ids, batch_size),
+                concurrency,
+            )
+            self.report_load_test(results)
+        finally:
+            if not options['keep_data']:
+                self.delete_synthetic_data(run_id, results['request_ids'] if results else [], batch_size)
+
+    def create_synthetic_data(self, run_id, count, batch_size, with_appointments):
+        """Bulk-create patients (and appointments); return the ids to email."""
+        password = make_password(None)
+        prefix = f'loadtest-{run_id}'
+        ids = []
+
+        doctor = None
+        if with_appointments:
+            with suppress_email_signals():
+                doctor_user = User.objects.create(
+                    username=f'{prefix}-doctor',
+                    email=f'{prefix}-doctor@example.com',
+                    first_name='Load',
+                    last_name='Doctor',
+                    role=User.DOCTOR,
+                    password=password,
+                )
+            doctor = DoctorProfile.objects.create(user=doctor_user, specialization='Load Testing')
+
+        # bulk_create fires no post_save, so no signal emails are sent here
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for start in range(0, count, batch_size):
+            numbers = range(start, min(start + batch_size, count))
+            users = User.objects.bulk_create([
+                User(
+                    username=f'{prefix}-{i}',
+                    email=f'{prefix}-{i}@example.com',
+                    first_name='Load',
+                    last_name=f'Patient {i}',
+                    role=User.PATIENT,
+                    password=password,
+                )
+                for i in numbers
+            ])
+            if not with_appointments:
+                ids.extend(user.id for user in users)
+                continue
+
+            patients = PatientProfile.objects.bulk_create([PatientProfile(user=user) for user in users])
+            slots = AvailabilitySlot.objects.bulk_create([
+                # 143 ten-minute slots per day, so end_time never wraps past midnight
+                AvailabilitySlot(
+                    doctor=doctor,
+                    date=tomorrow + timedelta(days=i // 143),
+                    start_time=time(*divmod(i % 143 * 10, 60)),
+                    end_time=time(*divmod(i % 143 * 10 + 10, 60)),
+                    is_booked=True,
+                )
+                for i in numbers
+            ])
+            appointments = Appointment.objects.bulk_create([
+                Appointment(patient=patient, doctor=doctor, availability_slot=slot, reason='Load test')
+                for patient, slot in zip(patients, slots)
+            ])
+            ids.extend(appointment.id for appointment in appointments)
+        return ids
+
+    def iter_targets(self, email_type, ids, batch_size):
+        """Yield users or appointments batch by batch with their relations loaded."""
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            if email_type == 'welcome':
+                yield from User.objects.filter(id__in=chunk).order_by('id')
+            else:
+                yield from Appointment.objects.filter(id__in=chunk).select_related(
+                    'patient__user', 'doctor__user', 'availability_slot'
+                ).order_by('id')
+
+    def drive_senders(self, client, sender, targets, concurrency):
+        """Send one email per target from ``concurrency`` threads."""
+        work = queue.Queue(maxsize=concurrency * 4)
+        lock = threading.Lock()
+        results = {
+            'latencies': [],
+            'errors': Counter(),
+            'db_writes': 0,
+            'request_ids': [],
+        }
+
+        def worker():
+            latencies = []
+            errors = Counter()
+            request_ids = []
+            writes = 0
+
+            def count_writes(execute, sql, params, many, context):
+                nonlocal writes
+                if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                    writes += 1
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count_writes):
+                    while True:
+                        target = work.get()
+                        if target is None:
+                            break
+                        began = perf_counter()
+                        try:
+                            result = sender(client, target)
+                        except Exception as e:
+                            result = {'success': False, 'error': type(e).__name__}
+                        latencies.append(perf_counter() - began)
+
+                        if result.get('request_id'):
+                            request_ids.append(result['request_id'])
+                        if not result.get('success'):
+                            if result.get('status_code'):
+                                errors[f"HTTP {result['status_code']}"] += 1
+                            else:
+                                errors[str(result.get('error'))[:60]] += 1
+            finally:
+                connection.close()
+                with lock:
+                    results['latencies'].extend(latencies)
+                    results['errors'].update(errors)
+                    results['db_writes'] += writes
+                    results['request_ids'].extend(request_ids)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for target in targets:
+            work.put(target)
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+        results['seconds'] = perf_counter() - started
+        return results
+
+    def report_load_test(self, results):
+        latencies = [latency * 1000 for latency in results['latencies']]
+        sent = len(latencies)
+        failed = sum(results['errors'].values())
+
+        self.stdout.write('\nResults')
+        self.stdout.write('-' * 60)
+        self.stdout.write(f"Emails:        {sent} ({sent - failed} ok, {failed} failed)")
+        self.stdout.write(f"Wall time:     {results['seconds']:.2f}s")
+        self.stdout.write(f"Throughput:    {sent / results['seconds'] if results['seconds'] else 0:.1f} emails/s")
+        self.stdout.write(
+            f"Latency (ms):  p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+            f"p99 {percentile(latencies, 99):.1f}"
+        )
+        self.stdout.write(f"DB writes:     {results['db_writes'] / sent if sent else 0:.2f} per email")
+        if results['errors']:
+            self.stdout.write(self.style.ERROR('Errors:'))
+            for error, total in results['errors'].most_common():
+                self.stdout.write(f"  {total:>6}  {error}")
+
+    def delete_synthetic_data(self, run_id, request_ids, batch_size):
+        """Remove the load-test users (cascading to their rows) and send logs."""
+        for start in range(0, len(request_ids), batch_size):
+            EmailSendLog.objects.filter(request_id__in=request_ids[start:start + batch_size]).delete()
+        User.objects.filter(username__startswith=f'loadtest-{run_id}-').delete()
+        self.stdout.write(f"Synthetic data for {run_id} removed")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsendlog',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=150, null=True, unique=True),
+        ),
+    ]
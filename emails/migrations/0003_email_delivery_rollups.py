@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0002_emailsendlog_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailRollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_send_log_id', models.BigIntegerField(default=0)),
+                ('last_ses_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmailDeliveryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('template_used', models.CharField(blank=True, max_length=100)),
+                ('email_type', models.CharField(blank=True, max_length=50)),
+                ('recipient_domain', models.CharField(blank=True, max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour', 'status'], name='emails_emai_hour_4f428b_idx')],
+                'unique_together': {('hour', 'status', 'template_used', 'email_type', 'recipient_domain')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0003_email_delivery_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailattachment',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0004_emailattachment_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailtemplate',
+            name='template_type',
+            field=models.CharField(choices=[('appointment_confirmation', 'Appointment Confirmation'), ('appointment_reminder', 'Appointment Reminder'), ('appointment_cancelled', 'Appointment Cancelled'), ('welcome', 'Welcome Email'), ('doctor_new_appointment', 'Doctor New Appointment'), ('doctor_appointment_digest', 'Doctor Appointment Digest'), ('custom', 'Custom Template')], max_length=50),
+        ),
+    ]
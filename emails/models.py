@@ -19,6 +19,7 @@ class EmailTemplate(models.Model):
         ("appointment_cancelled", "Appointment Cancelled"),
         ("welcome", "Welcome Email"),
         ("doctor_new_appointment", "Doctor New Appointment"),
+        ("doctor_appointment_digest", "Doctor Appointment Digest"),
         ("custom", "Custom Template"),
     )
 
@@ -57,6 +58,8 @@ class EmailSendLog(models.Model):
     # Request tracking
     request_id = models.CharField(max_length=100, unique=True, db_index=True)
     message_id = models.CharField(max_length=255, blank=True, db_index=True)
+    # "<email_type>:<entity_id>"; NULL when the send is not deduplicated
+    idempotency_key = models.CharField(max_length=150, unique=True, null=True, blank=True)
 
     # Email details
     from_address = models.EmailField()
@@ -211,6 +214,7 @@ class EmailAttachment(models.Model):
     filename = models.CharField(max_length=255)
     content_type = models.CharField(max_length=100)
     size = models.PositiveIntegerField()  # In bytes
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # Blob store key
     s3_url = models.URLField(blank=True)  # S3 URL for attachment storage
     upload_status = models.CharField(
         max_length=20,
@@ -282,3 +286,41 @@ class EmailSESEvent(models.Model):
 
     def __str__(self):
         return f"{self.event_type} - {self.email_log.request_id}"
+
+
+class EmailDeliveryRollup(models.Model):
+    """
+    Hourly email counts, maintained incrementally by update_rollups().
+
+    Send logs are counted under their send status (sent/failed/pending);
+    SES events are counted under their event type (delivery, bounce, ...).
+    """
+
+    hour = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    template_used = models.CharField(max_length=100, blank=True)
+    email_type = models.CharField(max_length=50, blank=True)
+    recipient_domain = models.CharField(max_length=255, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-hour"]
+        unique_together = [["hour", "status", "template_used", "email_type", "recipient_domain"]]
+        indexes = [
+            models.Index(fields=["hour", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.status} ({self.count})"
+
+
+class EmailRollupCheckpoint(models.Model):
+    """High-water marks of the rows already folded into EmailDeliveryRollup."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_send_log_id = models.BigIntegerField(default=0)
+    last_ses_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: log {self.last_send_log_id}, event {self.last_ses_event_id}"
@@ -4,35 +4,67 @@ Automatically sends emails on events (user registration, appointment creation, e
 """
 
 import logging
+import threading
+from contextlib import contextmanager
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from appointments.models import Appointment
+from doctors.models import DoctorProfile
 
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+_state = threading.local()
+
+
+@contextmanager
+def suppress_email_signals():
+    """
+    Disable signal-driven emails in the current thread.
+
+    Use around bulk imports; fixture loads (raw saves) are skipped anyway.
+    """
+    previous = getattr(_state, "suppressed", False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def email_signals_suppressed() -> bool:
+    """Check whether signal-driven emails are suppressed in this thread."""
+    return getattr(_state, "suppressed", False)
+
+
+def send_welcome(user):
+    """Send the welcome email for a new ``user``, logging the outcome."""
+    try:
+        from emails.client import send_welcome_email
+        result = send_welcome_email(user)
+        if result.get("duplicate"):
+            logger.info(f"Welcome email already sent to {user.email}")
+        elif result.get("success"):
+            logger.info(f"Welcome email sent to {user.email}")
+        else:
+            logger.warning(f"Failed to send welcome email: {result.get('error')}")
+    except Exception as e:
+        logger.error(f"Error sending welcome email: {str(e)}", exc_info=True)
+
 
 @receiver(post_save, sender=User)
 def send_welcome_on_user_creation(sender, instance, created, **kwargs):
     """Send welcome email when user account is created."""
-    if created:
-        try:
-            from emails.client import send_welcome_email
-            result = send_welcome_email(instance)
-            if result.get("success"):
-                logger.info(f"Welcome email sent to {instance.email}")
-            else:
-                logger.warning(f"Failed to send welcome email: {result.get('error')}")
-        except Exception as e:
-            logger.error(f"Error sending welcome email: {str(e)}", exc_info=True)
+    if created and not kwargs.get("raw") and not email_signals_suppressed():
+        send_welcome(instance)
 
 
 @receiver(post_save, sender=Appointment)
 def send_appointment_emails(sender, instance, created, **kwargs):
     """Send appointment emails when appointment is created."""
-    if created:
+    if created and not kwargs.get("raw") and not email_signals_suppressed():
         try:
             from emails.client import (
                 send_appointment_confirmation,
@@ -48,7 +80,11 @@ def send_appointment_emails(sender, instance, created, **kwargs):
             else:
                 logger.warning(f"Failed to send patient confirmation: {patient_result.get('error')}")
             
-            # Send notification to doctor
+            # Send notification to doctor, unless they get a periodic digest
+            if instance.doctor.notification_mode == DoctorProfile.DIGEST:
+                logger.info(f"Doctor {instance.doctor.id} is in digest mode, notification deferred")
+                return
+
             doctor_result = send_doctor_appointment_notification(instance)
             if doctor_result.get("success"):
                 logger.info(f"Doctor notification email sent: {doctor_result.get('message_id')}")
@@ -0,0 +1,295 @@
+import base64
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from emails import attachments
+from appointments.models import Appointment, AvailabilitySlot
+from appointments.tests import AllShards
+from doctors.models import DoctorProfile
+from emails.analytics import delivery_summary, update_rollups
+from emails.digest import SETTLE_SECONDS, send_doctor_digests
+from emails.client import ServerlessEmailClient, idempotency_cache, make_idempotency_key
+from emails.models import EmailAttachment, EmailDeliveryRollup, EmailSendLog, EmailSESEvent
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+
+User = get_user_model()
+
+
+def api_response(status_code=200, message_id="msg-1"):
+    response = mock.Mock(status_code=status_code, text="error")
+    response.json.return_value = {"message_id": message_id}
+    return response
+
+
+class IdempotencyTests(AllShards, TestCase):
+    def setUp(self):
+        idempotency_cache.clear()
+        self.client_ = ServerlessEmailClient(api_url="http://email.test/send")
+
+    def send(self, key="welcome:1"):
+        return self.client_.send_email(["a@example.com"], "Hi", text_body="Hi", idempotency_key=key)
+
+    @mock.patch("emails.client.requests.post", return_value=api_response())
+    def test_duplicate_key_skips_http_and_log(self, post):
+        first = self.send()
+        second = self.send()
+
+        self.assertTrue(first["success"])
+        self.assertTrue(second["duplicate"])
+        self.assertEqual(second["request_id"], first["request_id"])
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(EmailSendLog.objects.count(), 1)
+
+    @mock.patch("emails.client.requests.post", return_value=api_response())
+    def test_duplicate_detected_from_database_after_cache_eviction(self, post):
+        first = self.send()
+        idempotency_cache.clear()
+
+        with self.assertNumQueries(1):
+            second = self.send()
+
+        self.assertEqual(second["request_id"], first["request_id"])
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch("emails.client.requests.post", return_value=api_response(status_code=500))
+    def test_failed_send_releases_key(self, post):
+        self.send()
+        self.send()
+
+        self.assertEqual(post.call_count, 2)
+        self.assertFalse(EmailSendLog.objects.exclude(idempotency_key=None).exists())
+
+    def test_make_idempotency_key(self):
+        self.assertEqual(make_idempotency_key("welcome", 42), "welcome:42")
+
+
+class SignalSuppressionTests(AllShards, TestCase):
+    @mock.patch("emails.client.send_welcome_email")
+    def test_suppressed_user_creation_sends_nothing(self, send_welcome_email):
+        with suppress_email_signals():
+            User.objects.create_user("bulk", "bulk@example.com", "pw")
+
+        send_welcome_email.assert_not_called()
+
+    @mock.patch("emails.client.send_welcome_email", return_value={"success": True})
+    def test_user_creation_sends_welcome(self, send_welcome_email):
+        User.objects.create_user("single", "single@example.com", "pw")
+
+        send_welcome_email.assert_called_once()
+
+
+class DeliveryRollupTests(AllShards, TestCase):
+    def make_log(self, request_id, status="sent", domain="example.com"):
+        return EmailSendLog.objects.create(
+            request_id=request_id,
+            from_address="noreply@example.com",
+            to_addresses=[f"user@{domain}"],
+            subject="Hi",
+            template_used="welcome",
+            status=status,
+            tags={"email_type": "welcome"},
+        )
+
+    def test_rollups_are_incremental(self):
+        later = timezone.now() + timedelta(hours=1)
+        log = self.make_log("r1")
+        self.make_log("r2", status="failed", domain="Clinic.org")
+        EmailSESEvent.objects.create(
+            email_log=log, event_type="bounce", event_timestamp=timezone.now(), raw_event_data={}
+        )
+
+        self.assertEqual(update_rollups(now=later), 3)
+        self.assertEqual(update_rollups(now=later), 0)
+        self.make_log("r3")
+        self.assertEqual(update_rollups(now=later), 1)
+
+        summary = delivery_summary(now=later)
+        self.assertEqual(summary["by_status"], {"sent": 2, "failed": 1, "bounce": 1})
+        self.assertEqual(summary["by_recipient_domain"], {"example.com": 2})
+        self.assertEqual(summary["bounce_rate"], 0.5)
+
+    def test_unsettled_rows_wait_for_next_run(self):
+        self.make_log("r1")
+
+        self.assertEqual(update_rollups(), 0)
+        self.assertFalse(EmailDeliveryRollup.objects.exists())
+
+    def test_checkpoint_stops_at_the_first_unsettled_row(self):
+        now = timezone.now()
+        self.make_log("r1")
+        settled = self.make_log("r2")
+        # r1 is still settling; rolling up r2 now would move the checkpoint past it
+        EmailSendLog.objects.filter(pk=settled.pk).update(created_at=now - timedelta(hours=1))
+
+        self.assertEqual(update_rollups(now=now), 0)
+        self.assertEqual(update_rollups(now=now + timedelta(hours=1)), 2)
+        self.assertEqual(delivery_summary(now=now + timedelta(hours=1))["by_status"], {"sent": 2})
+
+
+class AttachmentStoreTests(AllShards, TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.store = attachments.LocalBlobStore(root=self.root.name)
+        attachments.digest_cache.clear()
+
+        self.pdf = os.path.join(self.root.name, "clinic.pdf")
+        with open(self.pdf, "wb") as f:
+            f.write(b"%PDF" * 50000)
+
+    def stored_blobs(self):
+        return [
+            name
+            for _, _, files in os.walk(self.root.name)
+            for name in files
+            if name != "clinic.pdf"
+        ]
+
+    def test_identical_files_are_stored_once(self):
+        copy = os.path.join(self.root.name, "copy.pdf")
+        with open(self.pdf, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+
+        first = attachments.store_file(self.pdf, self.store)
+        second = attachments.store_file(copy, self.store)
+
+        self.assertEqual(first, (second[0], 200000, second[2]))
+        self.assertEqual(len(self.stored_blobs()), 2)  # blob + copy.pdf
+
+    def test_unchanged_file_is_not_read_again(self):
+        attachments.store_file(self.pdf, self.store)
+
+        with mock.patch.object(self.store, "put") as put:
+            attachments.store_file(self.pdf, self.store)
+
+        put.assert_not_called()
+
+    @mock.patch("emails.client.requests.post", return_value=api_response())
+    def test_send_records_attachments(self, post):
+        with mock.patch.object(attachments, "_store", self.store):
+            ServerlessEmailClient(api_url="http://email.test/send").send_email(
+                ["a@example.com"], "Hi", text_body="Hi", attachments=[{"path": self.pdf}]
+            )
+
+        log = EmailSendLog.objects.get()
+        self.assertEqual((log.attachment_count, log.total_attachment_size), (1, 200000))
+        record = EmailAttachment.objects.get()
+        self.assertEqual(record.upload_status, "uploaded")
+        self.assertEqual(record.content_type, "application/pdf")
+        sent = post.call_args.kwargs["json"]["attachments"][0]
+        self.assertEqual(sent["sha256"], record.sha256)
+        self.assertNotIn("content", sent)
+
+    def test_inline_attachments_record_their_decoded_size(self):
+        content = base64.b64encode(b"%PDF" * 100).decode()
+        _, (record,) = attachments.prepare_attachments(
+            [{"filename": "note.pdf", "content_type": "application/pdf", "content": content}], self.store
+        )
+
+        self.assertEqual(record.size, 400)
+        self.assertEqual(
+            [attachments._inline_size(base64.b64encode(b"x" * size).decode()) for size in range(4)], [0, 1, 2, 3]
+        )
+
+
+class EmailLoadTestCommandTests(AllShards, TransactionTestCase):
+    # Not a TestCase: the sending threads must see the synthetic rows
+
+    def load_test(self, **options):
+        out = StringIO()
+        with mock.patch("emails.client.requests.post", return_value=api_response()) as post:
+            call_command("test_email_service", stdout=out, **options)
+        return post, out.getvalue()
+
+    def test_sends_one_email_per_appointment_and_cleans_up(self):
+        # The in-memory SQLite test database takes one writer at a time, so
+        # concurrent send logs fail with "table is locked" there
+        concurrency = 1 if connection.vendor == "sqlite" else 2
+        post, output = self.load_test(count=5, email_type="appointment", concurrency=concurrency, batch_size=2)
+
+        self.assertEqual(post.call_count, 5)
+        self.assertIn("Emails:        5 (5 ok, 0 failed)", output)
+        self.assertFalse(User.objects.filter(username__startswith="loadtest-").exists())
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(EmailSendLog.objects.exists())
+
+    def test_keep_data_leaves_the_synthetic_rows(self):
+        self.load_test(count=3, keep_data=True)
+
+        self.assertEqual(User.objects.filter(username__startswith="loadtest-").count(), 3)
+        self.assertEqual(EmailSendLog.objects.filter(status="sent").count(), 3)
+
+
+class DoctorDigestTests(AllShards, TestCase):
+    def setUp(self):
+        with suppress_email_signals():
+            self.digest_doctor = self.make_doctor("digest", DoctorProfile.DIGEST)
+            self.realtime_doctor = self.make_doctor("realtime", DoctorProfile.REALTIME)
+            patient_user = User.objects.create_user("pat", "pat@example.com", "pw")
+        self.patient = PatientProfile.objects.create(user=patient_user)
+
+    def make_doctor(self, username, mode):
+        user = User.objects.create_user(username, f"{username}@example.com", "pw", role=User.DOCTOR)
+        return DoctorProfile.objects.create(user=user, notification_mode=mode)
+
+    def book(self, doctor, hour):
+        slot = doctor.availability_slots.create(
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=f"{hour}:00",
+            end_time=f"{hour}:30",
+            is_booked=True,
+        )
+        return doctor.appointments.create(patient=self.patient, availability_slot=slot, reason="Checkup")
+
+    @mock.patch("emails.client.send_appointment_confirmation", return_value={"success": True})
+    @mock.patch("emails.client.send_doctor_appointment_notification", return_value={"success": True})
+    def test_digest_mode_defers_realtime_notification(self, notify, confirm):
+        self.book(self.digest_doctor, 9)
+        self.book(self.realtime_doctor, 9)
+
+        self.assertEqual(confirm.call_count, 2)
+        notify.assert_called_once()
+        self.assertEqual(notify.call_args.args[0].doctor, self.realtime_doctor)
+
+    @mock.patch.object(ServerlessEmailClient, "send_email", return_value={"success": True})
+    def test_one_digest_per_window(self, send_email):
+        with suppress_email_signals():
+            for hour in (11, 9, 10):
+                self.book(self.digest_doctor, hour)
+            self.book(self.realtime_doctor, 9)
+
+        settled = timezone.now() + timedelta(seconds=SETTLE_SECONDS)
+        stats = send_doctor_digests(now=settled)
+
+        self.assertEqual((stats["digests_sent"], stats["appointments"]), (1, 3))
+        template_vars = send_email.call_args.kwargs["template_vars"]
+        self.assertEqual([a["time"] for a in template_vars["appointments"]], ["09:00 AM", "10:00 AM", "11:00 AM"])
+
+        self.assertEqual(send_doctor_digests(now=settled)["doctors"], 0)
+        later = settled + timedelta(hours=25)
+        with suppress_email_signals():
+            self.book(self.digest_doctor, 12)
+        self.assertEqual(send_doctor_digests(now=later)["appointments"], 1)
+        self.assertEqual(send_email.call_count, 2)
+
+    @mock.patch.object(ServerlessEmailClient, "send_email", return_value={"success": True})
+    def test_unsettled_appointments_wait_for_the_next_digest(self, send_email):
+        with suppress_email_signals():
+            self.book(self.digest_doctor, 9)
+
+        # Booked just now, so possibly by a transaction that has not committed
+        self.assertEqual(send_doctor_digests()["appointments"], 0)
+        send_email.assert_not_called()
+
+        later = timezone.now() + timedelta(hours=25)
+        self.assertEqual(send_doctor_digests(now=later)["appointments"], 1)
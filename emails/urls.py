@@ -0,0 +1,9 @@
+# emails/urls.py
+from django.urls import path
+from . import views
+
+app_name = 'emails'
+
+urlpatterns = [
+    path('stats/', views.delivery_stats, name='delivery_stats'),
+]
@@ -0,0 +1,17 @@
+"""
+Django views for the email service
+"""
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from emails.analytics import delivery_summary
+
+
+@staff_member_required
+def delivery_stats(request):
+    """Delivery analytics from the hourly rollups as JSON."""
+    try:
+        hours = min(max(int(request.GET.get('hours', 24)), 1), 24 * 90)
+    except ValueError:
+        hours = 24
+    return JsonResponse(delivery_summary(hours=hours))
@@ -8,9 +8,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import warnings
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_system.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 (configured by the line above)
+
+# Persistent connections leak under ASGI: each async context opens its own
+for alias, database in settings.DATABASES.items():
+    if database.get('CONN_MAX_AGE'):
+        warnings.warn(
+            f"DATABASES['{alias}']['CONN_MAX_AGE'] is {database['CONN_MAX_AGE']}; under ASGI persistent "
+            f"connections are not reused and pile up. Set DATABASE_CONN_MAX_AGE=0 or DATABASE_POOL=True.",
+            RuntimeWarning,
+        )
@@ -0,0 +1,284 @@
+# hospital_system/metrics.py
+"""
+Per-view request metrics, exposed in the Prometheus text format at /metrics.
+
+MetricsMiddleware records, for each view (URL name) and method, a latency
+histogram, requests by status, database queries and their time (on every
+alias), template render time and response bytes. Queries are counted by an
+execute wrapper on each connection and templates by the DjangoTemplates
+backend below, both through a context variable, so async views and their
+sync_to_async calls are covered too; queries run in other threads (such as
+the sharding scatter_gather pool) are not. Template time includes queries
+made while rendering.
+
+Counters are kept per thread and only summed when scraped, so recording a
+request takes no lock. A thread's counters are folded into a shared total
+once the thread is gone, so servers that start a thread per connection
+don't pile them up. They live in the process: with several worker
+processes, each scrape sees the worker that answered it.
+"""
+import itertools
+import threading
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends import django as django_backend
+
+# Latency histogram upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNRESOLVED = '<unresolved>'
+
+_request = ContextVar('request_metrics', default=None)
+_local = threading.local()
+_all_stats = {}  # every live thread's {(view, method): ViewStats}, by registration number
+_finished = {}  # {(view, method): ViewStats} of threads that have ended
+_registrations = itertools.count()
+_registry_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """What the current request has spent so far."""
+
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+class ViewStats:
+    """One thread's totals for a view and method."""
+
+    __slots__ = ('buckets', 'count', 'seconds', 'statuses', 'queries', 'db_seconds', 'template_seconds', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.bytes = 0
+
+
+def _thread_stats():
+    try:
+        return _local.stats
+    except AttributeError:
+        stats = _local.stats = {}
+        number = next(_registrations)
+        with _registry_lock:
+            _all_stats[number] = stats
+        weakref.finalize(threading.current_thread(), _retire, number)
+        return stats
+
+
+def _retire(number):
+    """Fold the counters of an ended thread into _finished."""
+    with _registry_lock:
+        stats = _all_stats.pop(number, None)
+        if stats:
+            _merge(_finished, stats)
+
+
+def record(view, method, status, seconds, request_metrics, size):
+    stats = _thread_stats()
+    view_stats = stats.get((view, method))
+    if view_stats is None:
+        view_stats = stats[view, method] = ViewStats()
+    view_stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+    view_stats.count += 1
+    view_stats.seconds += seconds
+    view_stats.statuses[status] = view_stats.statuses.get(status, 0) + 1
+    view_stats.queries += request_metrics.queries
+    view_stats.db_seconds += request_metrics.db_seconds
+    view_stats.template_seconds += request_metrics.template_seconds
+    view_stats.bytes += size
+
+
+def _merge(totals, stats):
+    """Add ``stats`` ({(view, method): ViewStats}) onto ``totals``."""
+    for key, view_stats in list(stats.items()):
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = ViewStats()
+        total.buckets = [a + b for a, b in zip(total.buckets, view_stats.buckets)]
+        total.count += view_stats.count
+        total.seconds += view_stats.seconds
+        for status, count in list(view_stats.statuses.items()):
+            total.statuses[status] = total.statuses.get(status, 0) + count
+        total.queries += view_stats.queries
+        total.db_seconds += view_stats.db_seconds
+        total.template_seconds += view_stats.template_seconds
+        total.bytes += view_stats.bytes
+
+
+def collect():
+    """Totals across threads, live and ended: {(view, method): ViewStats}."""
+    totals = {}
+    with _registry_lock:
+        thread_stats = list(_all_stats.values())
+        _merge(totals, _finished)
+    for stats in thread_stats:
+        _merge(totals, stats)
+    return totals
+
+
+def reset():
+    """Forget everything recorded so far (for tests and benchmarks)."""
+    with _registry_lock:
+        for stats in _all_stats.values():
+            stats.clear()
+        _finished.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    totals = sorted(collect().items())
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+            lines.append(f'{name}{suffix}{{{label_text}}} {value}')
+
+    def per_view(attribute):
+        return [('', (('view', view), ('method', method)), getattr(stats, attribute)) for (view, method), stats in totals]
+
+    family('django_http_requests_total', 'counter', 'Requests by view, method and status.', [
+        ('', (('view', view), ('method', method), ('status', status)), count)
+        for (view, method), stats in totals
+        for status, count in sorted(stats.statuses.items())
+    ])
+    histogram = []
+    for (view, method), stats in totals:
+        labels = (('view', view), ('method', method))
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), stats.buckets):
+            cumulative += count
+            histogram.append(('_bucket', labels + (('le', bound),), cumulative))
+        histogram.append(('_sum', labels, stats.seconds))
+        histogram.append(('_count', labels, stats.count))
+    family('django_http_request_duration_seconds', 'histogram', 'Time to produce the response.', histogram)
+    family('django_http_db_queries_total', 'counter', 'Database queries made by requests.', per_view('queries'))
+    family('django_http_db_duration_seconds_total', 'counter', 'Time spent in database queries.', per_view('db_seconds'))
+    family(
+        'django_http_template_duration_seconds_total', 'counter', 'Time spent rendering templates.',
+        per_view('template_seconds'),
+    )
+    family('django_http_response_size_bytes_total', 'counter', 'Response body bytes (not streamed).', per_view('bytes'))
+    return '\n'.join(lines) + '\n'
+
+
+def record_query(execute, sql, params, many, context):
+    request_metrics = _request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.db_seconds += perf_counter() - started
+
+
+def _install(connection):
+    # At the bottom: connection.execute_wrapper() blocks push and pop at the
+    # top, and may be open when the connection is created
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    _install(connection)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing renders for MetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        request_metrics = _request.get()
+        if request_metrics is None:
+            return super().render(context, request)
+        # Templates rendered while rendering (e.g. by tags) count once
+        request_metrics.template_depth += 1
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_depth -= 1
+            if not request_metrics.template_depth:
+                request_metrics.template_seconds += perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record each request's metrics under its view's URL name. Disabled by METRICS_ENABLED = False."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = _request.set(request_metrics)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.finish(request, response, perf_counter() - started, request_metrics)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = _request.set(request_metrics)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.finish(request, response, perf_counter() - started, request_metrics)
+        return response
+
+    def finish(self, request, response, seconds, request_metrics):
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match is not None else UNRESOLVED
+        size = 0 if response.streaming else len(response.content)
+        record(view, request.method, response.status_code, seconds, request_metrics, size)
@@ -0,0 +1,291 @@
+# hospital_system/profiling.py
+"""
+Opt-in profiling of single requests, for staff.
+
+A request from a staff user with an ``X-Profile`` header or a ``_profile``
+query parameter is profiled; any other request only pays for looking for
+the two. The value picks the profiler:
+
+- ``1`` (or anything else): a sampling profiler that records the stack
+  every PROFILING_SAMPLE_INTERVAL seconds and writes them in the collapsed
+  format read by flamegraph.pl and speedscope (``<name>.collapsed``);
+- ``cprofile``: cProfile, written as pstats (``<name>.prof``, for snakeviz
+  or flameprof).
+
+Either way the SQL run by the request is written with its timing and the
+project frames it came from (``<name>.sql.json``). The files go to
+PROFILING_SPOOL_DIR, whose oldest files are removed once it holds more than
+PROFILING_SPOOL_MAX_BYTES; the response names them in ``X-Profile-File``.
+
+Sync requests sample their own thread. Async requests sample every thread,
+so other requests served meanwhile by the same process show up as well.
+"""
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+
+# Frames from these are not the project's own code
+_INSTRUMENTATION_FILES = (__file__, metrics.__file__, os.path.join(os.path.dirname(__file__), 'querylog.py'))
+_LIBRARY_MARKERS = (f'{os.sep}site-packages{os.sep}', f'{os.sep}dist-packages{os.sep}')
+
+_profile = ContextVar('request_profile', default=None)
+_file_numbers = itertools.count()
+_rotation_lock = threading.Lock()
+
+
+def project_stack(frame, limit=5, skip=()):
+    """
+    "path:line in function" for the project's frames from ``frame`` outwards.
+
+    Library frames (Django, the ORM, site-packages) and the files in
+    ``skip`` are skipped, so the first entry is where the project code
+    called into them.
+    """
+    base_dir = str(settings.BASE_DIR)
+    stack = []
+    while frame is not None and len(stack) < limit:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir)
+            and filename not in _INSTRUMENTATION_FILES
+            and filename not in skip
+            and not any(marker in filename for marker in _LIBRARY_MARKERS)
+        ):
+            stack.append(f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return stack
+
+
+class RequestProfile:
+    """SQL captured while profiling a request."""
+
+    def __init__(self):
+        self.queries = []
+
+    def record_query(self, alias, sql, params, many, seconds, frame):
+        self.queries.append({
+            'database': alias,
+            'sql': sql,
+            'params': repr(params)[:500],
+            'many': many,
+            'ms': round(seconds * 1000, 3),
+            'origin': project_stack(frame),
+        })
+
+
+def capture_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(
+            context['connection'].alias, sql, params, many, perf_counter() - started, sys._getframe(1)
+        )
+
+
+def _install(connection):
+    # At the bottom, as in metrics._install()
+    if capture_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, capture_query)
+
+
+@receiver(connection_created)
+def install_query_capture(sender, connection, **kwargs):
+    _install(connection)
+
+
+class Sampler:
+    """Counts collapsed stacks of ``thread_id`` (or every thread) every ``interval`` seconds."""
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='profiling-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.stacks[self.collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+
+    def collapse(self, frame, thread_name):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        if self.thread_id is None:
+            frames.append(thread_name)
+        return ';'.join(reversed(frames))
+
+    def write(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests from staff that ask for it. Goes after
+    AuthenticationMiddleware; disabled by PROFILING_ENABLED = False.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = self.requested(request)
+        if mode is None:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = perf_counter()
+        try:
+            if mode == 'cprofile':
+                profiler = cProfile.Profile()
+                response = profiler.runcall(self.get_response, request)
+            else:
+                with Sampler(self.interval(), threading.get_ident()) as profiler:
+                    response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.save(request, response, perf_counter() - started, profile, profiler)
+        return response
+
+    async def __acall__(self, request):
+        mode = await sync_to_async(self.requested)(request) if self.asked(request) else None
+        if mode is None:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = perf_counter()
+        try:
+            if mode == 'cprofile':
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+            else:
+                with Sampler(self.interval()) as profiler:
+                    response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        await sync_to_async(self.save)(request, response, perf_counter() - started, profile, profiler)
+        return response
+
+    def asked(self, request):
+        return PROFILE_HEADER in request.META or PROFILE_PARAM in request.META.get('QUERY_STRING', '')
+
+    def requested(self, request):
+        """The profiler a staff user asked for, or None."""
+        if not self.asked(request):
+            return None
+        mode = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+        if mode is None or not request.user.is_staff:
+            return None
+        return 'cprofile' if mode == 'cprofile' else 'sample'
+
+    def interval(self):
+        return getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005)
+
+    def save(self, request, response, seconds, profile, profiler):
+        spool = Path(settings.PROFILING_SPOOL_DIR)
+        spool.mkdir(parents=True, exist_ok=True)
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_file_numbers)}-{view.replace(':', '.')}"
+
+        summary = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'ms': round(seconds * 1000, 3),
+            'query_count': len(profile.queries),
+            'query_ms': round(sum(query['ms'] for query in profile.queries), 3),
+        }
+        if isinstance(profiler, Sampler):
+            profiler.write(spool / f'{name}.collapsed')
+            summary.update(profile_file=f'{name}.collapsed', samples=profiler.samples, interval=profiler.interval)
+        else:
+            profiler.dump_stats(spool / f'{name}.prof')
+            summary['profile_file'] = f'{name}.prof'
+        with open(spool / f'{name}.sql.json', 'w') as output:
+            json.dump(dict(summary, queries=profile.queries), output, indent=1)
+
+        rotate(spool, settings.PROFILING_SPOOL_MAX_BYTES)
+        response['X-Profile-File'] = summary['profile_file']
+
+
+def rotate(spool, max_bytes):
+    """Delete the oldest files in ``spool`` until it holds at most ``max_bytes``."""
+    with _rotation_lock:
+        files = []
+        for path in spool.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # rotated by another process
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size, path))
+        total = sum(size for _, _, size, _ in files)
+        for _, _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,250 @@
+# hospital_system/querylog.py
+"""
+Slow-query log and N+1 detection.
+
+An execute wrapper on every connection normalizes each query's SQL
+(literals and placeholders become ``?``, ``IN`` lists and multi-row
+``VALUES`` collapse) and notes the shape of its parameters. Queries slower
+than QUERYLOG_SLOW_MS are logged with the project line that ran them,
+inside requests or not.
+
+Within a request (QueryLogMiddleware), queries of one normalized shape run
+QUERYLOG_REPEAT_THRESHOLD times or more are reported as an N+1, with the
+line that ran them. Findings are logged to ``hospital_system.querylog``
+and added to an in-process summary ranked per view (summary(), served to
+staff at /querylog/). With QUERYLOG_STRICT, an N+1 raises NPlusOneQueries
+from the request, which fails the test that made it.
+"""
+import logging
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .profiling import project_stack
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\?(?:, \?)+\)')
+_VALUES_ROWS = re.compile(r'(\((?:\?|DEFAULT)(?:, (?:\?|DEFAULT))*\))(?:, \1)+')
+_SPACE = re.compile(r'\s+')
+
+_requests = ContextVar('request_queries', default=None)
+_summary = {}  # view -> {'n_plus_one': {(sql, site): [requests, queries]}, 'slow': {(sql, site): [count, seconds]}}
+_summary_lock = threading.Lock()
+
+
+class NPlusOneQueries(AssertionError):
+    """Raised in strict mode when a request repeats a query shape."""
+
+
+@lru_cache(maxsize=4096)
+def normalize(sql):
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('(...)', sql)
+    return _VALUES_ROWS.sub(r'\1, ...', sql)
+
+
+def params_shape(params, many=False):
+    """Types of ``params``, e.g. ``(int, str)`` or ``25 x (int, str)`` for executemany()."""
+    if many:
+        rows = list(params) if not isinstance(params, (list, tuple)) else params
+        return f'{len(rows)} x {params_shape(rows[0])}' if rows else '0 rows'
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    names = [type(param).__name__ for param in params]
+    if len(names) > 8 and len(set(names)) == 1:
+        return f'({len(names)} x {names[0]})'
+    return '(' + ', '.join(names) + ')'
+
+
+def call_site(frame):
+    stack = project_stack(frame, limit=1, skip=(__file__,))
+    return stack[0] if stack else '<unknown>'
+
+
+class RequestQueries:
+    """
+    Queries seen in one request: ``shapes`` maps normalized SQL to
+    [count, call site once repeated]; ``slow`` lists (normalized SQL,
+    call site, seconds).
+    """
+
+    __slots__ = ('shapes', 'slow')
+
+    def __init__(self):
+        self.shapes = {}
+        self.slow = []
+
+
+def record_query(execute, sql, params, many, context):
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = perf_counter() - started
+        request_queries = _requests.get()
+        slow = seconds * 1000 >= getattr(settings, 'QUERYLOG_SLOW_MS', 100)
+        if request_queries is not None or slow:
+            shape = normalize(sql)
+            if request_queries is not None:
+                seen = request_queries.shapes.get(shape)
+                if seen is None:
+                    request_queries.shapes[shape] = [1, None]
+                else:
+                    seen[0] += 1
+                    if seen[1] is None and seen[0] >= getattr(settings, 'QUERYLOG_REPEAT_THRESHOLD', 5):
+                        seen[1] = call_site(sys._getframe(1))
+            if slow:
+                site = call_site(sys._getframe(1))
+                logger.warning(
+                    'Slow query (%.1f ms) at %s: %s [params %s]',
+                    seconds * 1000, site, shape, params_shape(params, many),
+                )
+                if request_queries is None:
+                    _add('<no request>', 'slow', (shape, site), 1, seconds)
+                else:
+                    # Attributed to the request's view once it finishes
+                    request_queries.slow.append((shape, site, seconds))
+
+
+def _install(connection):
+    # At the bottom, as in metrics._install()
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def install_query_log(sender, connection, **kwargs):
+    _install(connection)
+
+
+def _add(view, kind, key, count, amount):
+    with _summary_lock:
+        findings = _summary.setdefault(view, {'n_plus_one': {}, 'slow': {}})[kind]
+        totals = findings.setdefault(key, [0, 0])
+        totals[0] += count
+        totals[1] += amount
+
+
+def finish(view, request_queries):
+    """Record the request's findings under ``view``; returns its N+1s as (sql, site, count)."""
+    threshold = getattr(settings, 'QUERYLOG_REPEAT_THRESHOLD', 5)
+    repeated = []
+    for shape, (count, site) in request_queries.shapes.items():
+        if count >= threshold:
+            repeated.append((shape, site, count))
+            _add(view, 'n_plus_one', (shape, site), 1, count)
+            logger.warning('N+1 in %s: %d x %s at %s', view, count, shape, site)
+    for shape, site, seconds in request_queries.slow:
+        _add(view, 'slow', (shape, site), 1, seconds)
+    return repeated
+
+
+def summary():
+    """
+    Findings per view, the views with the most repeated and slow queries first.
+
+    Each view lists its N+1s (requests affected, queries run) and slow
+    queries (count, seconds), largest first.
+    """
+    with _summary_lock:
+        views = {
+            view: {kind: {key: list(totals) for key, totals in findings[kind].items()} for kind in findings}
+            for view, findings in _summary.items()
+        }
+    report = []
+    for view, findings in views.items():
+        n_plus_one = sorted(
+            (
+                {'sql': sql, 'site': site, 'requests': requests, 'queries': queries}
+                for (sql, site), (requests, queries) in findings['n_plus_one'].items()
+            ),
+            key=lambda finding: -finding['queries'],
+        )
+        slow = sorted(
+            (
+                {'sql': sql, 'site': site, 'count': count, 'seconds': round(seconds, 3)}
+                for (sql, site), (count, seconds) in findings['slow'].items()
+            ),
+            key=lambda finding: -finding['seconds'],
+        )
+        report.append({
+            'view': view,
+            'repeated_queries': sum(finding['queries'] for finding in n_plus_one),
+            'slow_seconds': round(sum(finding['seconds'] for finding in slow), 3),
+            'n_plus_one': n_plus_one,
+            'slow': slow,
+        })
+    report.sort(key=lambda view: (-view['repeated_queries'], -view['slow_seconds']))
+    return report
+
+
+def reset():
+    with _summary_lock:
+        _summary.clear()
+
+
+class QueryLogMiddleware:
+    """Detect N+1 queries per request. Disabled by QUERYLOG_ENABLED = False."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERYLOG_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_queries = RequestQueries()
+        token = _requests.set(request_queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            _requests.reset(token)
+        self.finish(request, request_queries)
+        return response
+
+    async def __acall__(self, request):
+        request_queries = RequestQueries()
+        token = _requests.set(request_queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _requests.reset(token)
+        self.finish(request, request_queries)
+        return response
+
+    def finish(self, request, request_queries):
+        if not request_queries.shapes:
+            return
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        repeated = finish(view, request_queries)
+        if repeated and getattr(settings, 'QUERYLOG_STRICT', False):
+            raise NPlusOneQueries(f'{request.method} {request.path} ({view}) repeated queries:\n' + '\n'.join(
+                f'  {count} x {sql}\n    at {site}' for sql, site, count in repeated
+            ))
@@ -0,0 +1,174 @@
+# hospital_system/routers.py
+"""
+Primary/replica database routing.
+
+Reads made while serving a request go to one of DATABASE_REPLICAS; writes,
+select_for_update() and everything outside a request go to the primary
+('default'). A request is served from the primary when:
+
+- its method is not safe (POST etc.), so a view reads what it is about to
+  change from the primary;
+- it has already written, or is inside a transaction on the primary;
+- the browser wrote recently (tracked with a cookie; see
+  replica_pin_seconds()), so users see their own writes despite
+  replication lag;
+- every replica lags the primary by more than DATABASE_REPLICA_MAX_LAG.
+
+To try it locally, add a second alias to DATABASES (another SQLite file, or
+a PostgreSQL database fed by the first) and list it in DATABASE_REPLICAS.
+Give replicas TEST = {'MIRROR': 'default'} so tests use one database.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary_until'
+
+# Seconds a replica's measured lag is trusted before it is checked again
+LAG_CHECK_INTERVAL = 5
+
+_routing = ContextVar('db_routing', default=None)
+_replica_lag = {}  # alias -> (checked_at, lag in seconds or None)
+
+
+class RoutingState:
+    """Per-request routing flags, shared by the router and the middleware."""
+
+    def __init__(self, use_primary=False):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+def replica_pin_seconds():
+    """
+    Seconds a writer's reads stay on the primary.
+
+    At least as long as a replica in use may lag behind: its measured lag
+    may be LAG_CHECK_INTERVAL old, so DATABASE_REPLICA_MAX_LAG plus that.
+    """
+    pin = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 0)
+    max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+    return max(pin, max_lag + LAG_CHECK_INTERVAL) if max_lag else pin
+
+
+def replica_lag(alias):
+    """
+    Seconds ``alias`` is behind the primary; None if it can't be measured.
+
+    Only PostgreSQL streaming replicas report lag; other backends (e.g. a
+    second SQLite file used locally) count as up to date.
+    """
+    checked_at, lag = _replica_lag.get(alias, (0, None))
+    if time.monotonic() - checked_at < LAG_CHECK_INTERVAL:
+        return lag
+
+    connection = connections[alias]
+    lag = 0.0
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                # An idle primary sends nothing to replay, so a caught-up
+                # replica reports 0 rather than the time since the last commit
+                cursor.execute(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+                lag = cursor.fetchone()[0]
+                lag = float(lag) if lag is not None else None
+        except DatabaseError:
+            lag = None
+    _replica_lag[alias] = (time.monotonic(), lag)
+    return lag
+
+
+def healthy_replicas():
+    max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if not max_lag:
+        return list(replicas)
+    healthy = []
+    for alias in replicas:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= max_lag:
+            healthy.append(alias)
+    return healthy
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.use_primary or state.wrote:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Also used for select_for_update() querysets
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaPinningMiddleware:
+    """
+    Start each request's routing state and pin writers to the primary.
+
+    After a request that wrote, a cookie keeps that browser's reads on the
+    primary for replica_pin_seconds().
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            return self.finish(state, self.get_response(request))
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            return self.finish(state, await self.get_response(request))
+        finally:
+            _routing.reset(token)
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RoutingState(use_primary=pinned or request.method not in ('GET', 'HEAD', 'OPTIONS'))
+
+    def finish(self, state, response):
+        if state.wrote:
+            seconds = replica_pin_seconds()
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
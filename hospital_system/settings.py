@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from datetime import timedelta
+from decouple import Csv, config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,14 +43,21 @@ INSTALLED_APPS = [
     'doctors',
     'patients',
     'appointments',
+    'emails.EmailsConfig',
+    'rest_framework',
+    'api',
 ]
 
 MIDDLEWARE = [
+    'hospital_system.metrics.MetricsMiddleware',
+    'hospital_system.querylog.QueryLogMiddleware',
+    'hospital_system.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hospital_system.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,7 +66,8 @@ ROOT_URLCONF = 'hospital_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the request metrics
+        'BACKEND': 'hospital_system.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'], 
         #'DIRS': [],
         'APP_DIRS': True,
@@ -97,6 +106,133 @@ DATABASES = {
         'PORT': '5432',
     }
 }
+
+# Connections are reused across requests, either from a psycopg 3 pool
+# (DATABASE_POOL=True) or kept open for DATABASE_CONN_MAX_AGE seconds by each
+# thread. Both check a connection before handing it out again.
+# DATABASE_CONN_MAX_AGE defaults to 0 (a connection per request): under ASGI
+# every async context opens its own persistent connection and never reuses
+# it, so only set it for WSGI deploys; use the pool under ASGI.
+# Pools are per worker process and per alias: a worker serving WEB_THREADS
+# requests at once needs at most that many connections, so keep
+# workers x DATABASE_POOL_MAX_SIZE under PostgreSQL's max_connections.
+# Compare the modes with: python manage.py benchmark_db_connections
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+if DATABASE_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool keeps connections open instead
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DATABASE_POOL_MAX_SIZE', default=config('WEB_THREADS', default=4, cast=int), cast=int),
+            'max_lifetime': config('DATABASE_POOL_MAX_LIFETIME', default=1800, cast=int),  # recycle after (s)
+            'max_idle': config('DATABASE_POOL_MAX_IDLE', default=300, cast=int),  # shrink to min_size after (s)
+            'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),  # wait for a free connection (s)
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = config('DATABASE_CONN_MAX_AGE', default=0, cast=int)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas: comma-separated hosts, added as replica1, replica2, ...
+# Reads during a request go to a replica (see hospital_system.routers).
+DATABASE_REPLICAS = []
+for index, host in enumerate(config('DATABASE_REPLICA_HOSTS', default='', cast=Csv()), 1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+# Appointment shards: slots and appointments are spread over these aliases
+# by doctor (see appointments.sharding). Comma-separated hosts are added as
+# shard1, shard2, ... next to 'default'; run migrate --database for each.
+APPOINTMENT_SHARDS = ['default']
+for index, host in enumerate(config('APPOINTMENT_SHARD_HOSTS', default='', cast=Csv()), 1):
+    DATABASES[f'shard{index}'] = {**DATABASES['default'], 'HOST': host}
+    APPOINTMENT_SHARDS.append(f'shard{index}')
+
+DATABASE_ROUTERS = [
+    'appointments.sharding.ShardRouter',
+    'hospital_system.routers.PrimaryReplicaRouter',
+]
+DATABASE_REPLICA_MAX_LAG = 10     # skip replicas further behind (seconds); 0 disables the check
+# Keep a writer's reads on the primary this long; never less than the
+# replicas may lag (hospital_system.routers.replica_pin_seconds)
+DATABASE_REPLICA_PIN_SECONDS = DATABASE_REPLICA_MAX_LAG + 5
+# Cache
+# Local memory by default, for development. Deploy with a cache shared by
+# the workers (CACHE_BACKEND/CACHE_LOCATION, e.g.
+# django.core.cache.backends.redis.RedisCache): cached users and sessions
+# are only invalidated in the worker that changed them, so check --deploy
+# fails with a local cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='hospital-system'),
+    }
+}
+
+# Sessions are written through to the database and read from the cache
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+# Upper bound on the life of cached dashboard fragments; writes to
+# appointments and slots invalidate them earlier (appointments.versions),
+# in every worker only if the cache is shared (checked by check --deploy)
+DASHBOARD_CACHE_TIMEOUT = 3600
+
+# Live slot events for doctor_details (appointments.events). The local broker
+# only reaches watchers in the same process; use a shared broker with
+# several ASGI workers.
+SLOT_EVENTS_BROKER = 'appointments.events.LocalSlotBroker'
+SLOT_EVENTS_HEARTBEAT_SECONDS = 15
+
+# JSON API for the mobile app (api/v1/). Clients authenticate with a JWT
+# access token that carries the user's role and profile id, so requests
+# need neither a session nor a user lookup.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['api.permissions.IsPatient'],
+    'DEFAULT_RENDERER_CLASSES': ['api.renderers.ORJSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.Cursor',
+    'UNAUTHENTICATED_USER': None,
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.RoleTokenObtainPairSerializer',
+    'UPDATE_LAST_LOGIN': False,
+}
+
+# Seconds an authenticated user (with its role profile) stays cached; 0 disables
+ACCOUNTS_USER_CACHE_TIMEOUT = config('ACCOUNTS_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# Threads hashing signup passwords (accounts.signup); 0 hashes in the request
+# thread. Set to the number of cores to cap the CPU a burst of signups takes.
+ACCOUNTS_HASHING_THREADS = config('ACCOUNTS_HASHING_THREADS', default=0, cast=int)
+
+# Per-view request metrics (hospital_system.metrics), served at /metrics for
+# Prometheus with "Authorization: Bearer <METRICS_TOKEN>". Without a token
+# /metrics is only served with DEBUG on.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Staff can profile a request by sending an X-Profile header or a _profile
+# query parameter (hospital_system.profiling). Profiles are written to the
+# spool directory; the oldest go once it holds more than the maximum.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_SPOOL_DIR = config('PROFILING_SPOOL_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_SPOOL_MAX_BYTES = config('PROFILING_SPOOL_MAX_BYTES', default=100 * 1024 * 1024, cast=int)
+PROFILING_SAMPLE_INTERVAL = 0.005  # seconds
+
+# Slow-query log and N+1 detection (hospital_system.querylog). Queries at or
+# above QUERYLOG_SLOW_MS are logged with their call site; a request running
+# one query shape QUERYLOG_REPEAT_THRESHOLD times is reported as an N+1, and
+# fails with QUERYLOG_STRICT (for test runs). Staff see the summary at /querylog/.
+QUERYLOG_ENABLED = config('QUERYLOG_ENABLED', default=True, cast=bool)
+QUERYLOG_SLOW_MS = config('QUERYLOG_SLOW_MS', default=100, cast=float)
+QUERYLOG_REPEAT_THRESHOLD = config('QUERYLOG_REPEAT_THRESHOLD', default=5, cast=int)
+QUERYLOG_STRICT = config('QUERYLOG_STRICT', default=False, cast=bool)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -137,4 +273,23 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-AUTH_USER_MODEL = 'accounts.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'accounts.User'
+
+# Loads the doctor/patient profile in the same query as the session user.
+# ModelBackend stays listed so sessions started before RoleProfileBackend
+# (which name it) remain valid; drop it once those have expired
+# (SESSION_COOKIE_AGE after the switch).
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.RoleProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Serverless email service
+# Number of recently used idempotency keys remembered in-process before
+# falling back to the unique index on EmailSendLog.idempotency_key.
+SERVERLESS_EMAIL_IDEMPOTENCY_CACHE_SIZE = 10000
+
+# Blob store for email attachments (swap for an S3-backed class in production).
+# Files are content-addressed by SHA-256, so each distinct file is stored once.
+EMAIL_ATTACHMENT_STORE = 'emails.attachments.LocalBlobStore'
+EMAIL_ATTACHMENT_ROOT = BASE_DIR / 'media' / 'email_attachments'
@@ -0,0 +1,259 @@
+import gc
+import json
+import os
+import tempfile
+import threading
+import time as time_module
+from datetime import time
+from pathlib import Path
+from unittest import mock
+
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from appointments.models import AvailabilitySlot
+from appointments.tests import BookingTestCase
+from emails.signals import suppress_email_signals
+from patients.models import PatientProfile
+from . import metrics, profiling, querylog
+from .profiling import rotate
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware
+
+
+class MetricsTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.client.force_login(self.patient.user)
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), headers=headers)
+
+    def test_records_views_queries_templates_and_sizes(self):
+        self.book(self.client, self.slot)
+        response = self.client.get(reverse('appointments:my_appointments'))
+        self.client.get('/no-such-page/')
+
+        totals = metrics.collect()[('appointments:my_appointments', 'GET')]
+        self.assertEqual(totals.count, 1)
+        self.assertEqual(totals.statuses, {200: 1})
+        self.assertGreater(totals.queries, 0)
+        self.assertGreater(totals.template_seconds, 0)
+        self.assertEqual(totals.bytes, len(response.content))
+
+        with override_settings(DEBUG=True):
+            text = self.scrape().content.decode()
+        self.assertIn('django_http_requests_total{view="appointments:book_appointment",method="POST",status="302"} 1', text)
+        self.assertIn('django_http_requests_total{view="<unresolved>",method="GET",status="404"} 1', text)
+        self.assertIn(
+            'django_http_request_duration_seconds_count{view="appointments:my_appointments",method="GET"} 1', text
+        )
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(Authorization='Bearer s3cret').status_code, 200)
+
+    def test_no_token_is_only_served_in_debug(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.scrape().status_code, 200)
+
+    def test_ended_threads_are_folded_into_the_totals(self):
+        def record():
+            metrics.record('home', 'GET', 200, 0.01, metrics.RequestMetrics(), 10)
+
+        threads = [threading.Thread(target=record) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        registered = len(metrics._all_stats)
+        del threads, thread
+        gc.collect()
+
+        self.assertEqual(len(metrics._all_stats), registered - 3)
+        self.assertEqual(metrics.collect()[('home', 'GET')].count, 3)
+
+
+    def test_execute_wrapper_blocks_open_at_connect_unwind_cleanly(self):
+        def wrapper(execute, sql, params, many, context):
+            return execute(sql, params, many, context)
+
+        connection = connections.create_connection('default')
+        self.addCleanup(connection.close)
+        with connection.execute_wrapper(wrapper):
+            connection.ensure_connection()
+
+        self.assertNotIn(wrapper, connection.execute_wrappers)
+        self.assertEqual(
+            set(connection.execute_wrappers), {metrics.record_query, profiling.capture_query, querylog.record_query}
+        )
+
+
+class ProfilingTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool = spool.name
+        spool_setting = override_settings(PROFILING_SPOOL_DIR=self.spool)
+        spool_setting.enable()
+        self.addCleanup(spool_setting.disable)
+        self.doctor.user.is_staff = True
+        self.doctor.user.save()
+        self.client.force_login(self.doctor.user)
+
+    def test_staff_request_writes_profile_and_sql_with_origin(self):
+        response = self.client.get(reverse('doctors:manage_availability'), headers={'X-Profile': '1'})
+
+        name = response['X-Profile-File']
+        self.assertTrue(name.endswith('doctors.manage_availability.collapsed'))
+        with open(os.path.join(self.spool, name.replace('.collapsed', '.sql.json'))) as sql:
+            summary = json.load(sql)
+        self.assertEqual(summary['query_count'], len(summary['queries']))
+        self.assertTrue(any(
+            query['origin'] and query['origin'][0].startswith('doctors/views.py') for query in summary['queries']
+        ))
+
+        response = self.client.get(reverse('doctors:manage_availability') + '?_profile=cprofile')
+        self.assertTrue(os.path.exists(os.path.join(self.spool, response['X-Profile-File'])))
+
+    def test_ignored_unless_staff_asks(self):
+        self.assertNotIn('X-Profile-File', self.client.get(reverse('doctors:manage_availability')))
+        self.client.force_login(self.patient.user)
+        self.assertNotIn('X-Profile-File', self.client.get(reverse('patients:dashboard') + '?_profile=1'))
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_rotation_keeps_the_spool_under_its_size(self):
+        for i in range(3):
+            with open(os.path.join(self.spool, f'old-{i}'), 'w') as old:
+                old.write('x' * 100)
+            os.utime(old.name, (i, i))
+        rotate(Path(self.spool), 250)
+        self.assertEqual(sorted(os.listdir(self.spool)), ['old-1', 'old-2'])
+
+
+class QueryLogTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        querylog.reset()
+
+    def test_normalize(self):
+        self.assertEqual(
+            querylog.normalize('SELECT "a" FROM "t1" WHERE "id" IN (%s, %s, %s) AND "b" = \'x\' LIMIT 21'),
+            'SELECT "a" FROM "t1" WHERE "id" IN (...) AND "b" = ? LIMIT ?',
+        )
+        self.assertEqual(querylog.params_shape((1, 'a')), '(int, str)')
+        self.assertEqual(querylog.params_shape([(1,), (2,)], many=True), '2 x (int)')
+
+    @override_settings(QUERYLOG_STRICT=True, QUERYLOG_REPEAT_THRESHOLD=3)
+    def test_strict_mode_fails_on_repeated_queries(self):
+        def view(request):
+            for pk in range(3):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs('hospital_system.querylog', 'WARNING'), self.assertRaises(querylog.NPlusOneQueries):
+            querylog.QueryLogMiddleware(view)(RequestFactory().get('/'))
+        (finding,) = querylog.summary()[0]['n_plus_one']
+        self.assertEqual(finding['queries'], 3)
+        self.assertTrue(finding['site'].startswith('hospital_system/tests.py:'))
+
+    @override_settings(QUERYLOG_STRICT=True)
+    def test_doctor_appointments_query_count_is_flat(self):
+        with suppress_email_signals():
+            self.book(self.client_for(self.patient), self.slot)
+            for hour in range(10, 16):
+                patient = PatientProfile.objects.create(
+                    user=User.objects.create_user(f'pat{hour}', f'pat{hour}@example.com', 'pw', role=User.PATIENT)
+                )
+                slot = self.doctor.availability_slots.create(
+                    date=self.slot.date, start_time=time(hour), end_time=time(hour, 30)
+                )
+                self.book(self.client_for(patient), slot)
+
+        response = self.client_for(self.doctor).get(reverse('doctors:appointments'))
+        self.assertContains(response, 'Persistent cough', count=7)
+
+    @override_settings(QUERYLOG_SLOW_MS=0)
+    def test_slow_queries_are_logged_with_call_site(self):
+        with self.assertLogs('hospital_system.querylog', 'WARNING') as logs:
+            User.objects.filter(username='nobody').exists()
+        self.assertIn('hospital_system/tests.py:', logs.output[0])
+        self.assertIn('[params (int, str)]', logs.output[0])
+
+    def test_report_is_staff_only(self):
+        url = reverse('query_report')
+        self.assertEqual(self.client_for(self.patient).get(url).status_code, 302)
+        self.patient.user.is_staff = True
+        self.patient.user.save()
+        self.assertEqual(self.client_for(self.patient).get(url).json(), {'views': []})
+
+    def client_for(self, profile):
+        client = self.client_class()
+        client.force_login(profile.user)
+        return client
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_MAX_LAG=0)
+class ReplicaRoutingTests(SimpleTestCase):
+    # Not a TestCase: its wrapping transaction would keep reads on the primary
+
+    def route(self, request, write=False, lock=False):
+        """Database a view would read from while serving ``request``."""
+        routes = {}
+
+        def view(request):
+            if write:
+                router.db_for_write(AvailabilitySlot)  # as Model.save() does
+            if lock:
+                routes['lock'] = AvailabilitySlot.objects.select_for_update().db
+            routes['read'] = AvailabilitySlot.objects.all().db
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return routes, response
+
+    def test_safe_requests_read_from_replica(self):
+        routes, response = self.route(RequestFactory().get('/'))
+
+        self.assertEqual(routes['read'], 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_select_for_update_uses_primary(self):
+        routes, response = self.route(RequestFactory().get('/'), lock=True)
+
+        self.assertEqual(routes, {'lock': 'default', 'read': 'default'})
+
+    def test_writes_pin_reads_to_primary(self):
+        routes, response = self.route(RequestFactory().get('/'), write=True)
+        self.assertEqual(routes['read'], 'default')
+
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.route(request)[0]['read'], 'default')
+
+    def test_unsafe_methods_and_code_outside_requests_use_primary(self):
+        self.assertEqual(self.route(RequestFactory().post('/'))[0]['read'], 'default')
+        self.assertEqual(AvailabilitySlot.objects.all().db, 'default')
+
+    @override_settings(DATABASE_REPLICA_MAX_LAG=10)
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('hospital_system.routers.replica_lag', return_value=30):
+            self.assertEqual(self.route(RequestFactory().get('/'))[0]['read'], 'default')
+        with mock.patch('hospital_system.routers.replica_lag', return_value=1):
+            self.assertEqual(self.route(RequestFactory().get('/'))[0]['read'], 'replica')
+
+    @override_settings(DATABASE_REPLICA_PIN_SECONDS=5, DATABASE_REPLICA_MAX_LAG=10)
+    def test_writers_stay_pinned_while_a_replica_may_lag(self):
+        response = self.route(RequestFactory().get('/'), write=True)[1]
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+
+        # Past the configured pin, with a replica 7s behind (under the max lag)
+        with mock.patch('hospital_system.routers.time.time', return_value=time_module.time() + 7), \
+                mock.patch('hospital_system.routers.replica_lag', return_value=7):
+            self.assertEqual(self.route(request)[0]['read'], 'default')
@@ -6,8 +6,12 @@ from . import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
+    path('metrics', views.metrics, name='metrics'),
+    path('querylog/', views.query_report, name='query_report'),
     path('accounts/', include('accounts.urls')),
     path('doctors/', include('doctors.urls')),
     path('patients/', include('patients.urls')),  # Make sure this line exists
     path('appointments/', include('appointments.urls')),  # Make sure this line exists
+    path('emails/', include('emails.urls')),
+    path('api/v1/', include('api.urls')),
 ]
\ No newline at end of file
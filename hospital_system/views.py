@@ -1,5 +1,31 @@
 # hospital_system/views.py
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from . import querylog
+from .metrics import render_prometheus
 
 def home(request):
-    return render(request, 'home.html')
\ No newline at end of file
+    return render(request, 'home.html')
+
+@require_GET
+def metrics(request):
+    # Scraped by Prometheus with the METRICS_TOKEN bearer token; without a
+    # token configured, only served with DEBUG on
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def query_report(request):
+    # N+1s and slow queries seen by this process, worst views first
+    return JsonResponse({'views': querylog.summary()})
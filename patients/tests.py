@@ -1,3 +1,107 @@
-from django.test import TestCase
+import asyncio
+from datetime import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.urls import reverse
+
+from appointments.events import get_broker, slot_event
+from appointments.models import AvailabilitySlot
+from appointments.tests import BookingTestCase
+from . import views
+
+
+class ConditionalDoctorPagesTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient.user)
+        self.details_url = reverse('patients:doctor_details', args=[self.doctor.id])
+
+    def test_unchanged_details_page_returns_304_without_queries(self):
+        response = self.client.get(self.details_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dr. Gregory House')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.details_url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_booking_changes_details_etag(self):
+        etag = self.client.get(self.details_url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True, using=self.shard):
+            self.book(self.client, self.slot)
+        # Renders (and consumes) the pending "booked" message
+        self.assertEqual(self.client.get(self.details_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        response = self.client.get(self.details_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_doctor_rename_changes_list_etag(self):
+        url = reverse('patients:doctors_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.doctor.user.last_name = 'Wilson'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.user.save()
+
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Dr. Gregory Wilson')
+
+    def test_etag_served_before_the_commit_is_not_kept(self):
+        with self.captureOnCommitCallbacks(execute=True, using=self.shard):
+            with transaction.atomic(using=self.shard):
+                self.doctor.availability_slots.create(
+                    date=self.slot.date, start_time=time(10), end_time=time(10, 30)
+                )
+                # Served while the new slot is uncommitted, as another worker would
+                etag = self.client.get(self.details_url)['ETag']
+
+        self.assertEqual(self.client.get(self.details_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages_are_compressed(self):
+        response = self.client.get(self.details_url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class SlotEventStreamTests(BookingTestCase):
+    def test_events_published_from_other_threads_reach_the_stream(self):
+        broker = get_broker()
+
+        async def watch():
+            stream = views._slot_event_stream(self.doctor.id)
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            # Published from a worker thread, as a sync view would
+            await asyncio.to_thread(broker.publish, self.doctor.id, slot_event(self.slot, 'booked'))
+            message = await asyncio.wait_for(anext(stream), 5)
+            await stream.aclose()
+            return message
+
+        message = async_to_sync(watch)()
+
+        self.assertTrue(message.startswith('event: booked\n'))
+        self.assertIn(f'"slot_id": {self.slot.id}', message)
+        self.assertEqual(broker.subscriber_count(self.doctor.id), 0)
+
+    def test_booking_publishes_after_commit(self):
+        self.client.force_login(self.patient.user)
+
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(using=self.shard) as callbacks:
+                self.book(self.client, self.slot)
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        publish.assert_called_once()
+        doctor_id, event = publish.call_args.args
+        self.assertEqual((doctor_id, event['type'], event['slot_id']), (self.doctor.id, 'booked', self.slot.id))
+
+    def test_stream_requires_patient(self):
+        url = reverse('patients:doctor_slot_events', args=[self.doctor.id])
+
+        self.assertEqual(self.client.get(url).status_code, 403)
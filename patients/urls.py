@@ -8,4 +8,5 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('doctors/', views.doctors_list, name='doctors_list'),
     path('doctors/<int:doctor_id>/', views.doctor_details, name='doctor_details'),
+    path('doctors/<int:doctor_id>/slots/events/', views.doctor_slot_events, name='doctor_slot_events'),
 ]
\ No newline at end of file
@@ -1,32 +1,107 @@
 # patients/views.py
-from django.shortcuts import render, redirect, get_object_or_404
+import hashlib
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.db import transaction
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
 from accounts.decorators import patient_required
 from .models import PatientProfile
 from doctors.models import DoctorProfile
+from appointments.events import format_sse, get_broker
 from appointments.models import Appointment, AvailabilitySlot
+from appointments.sharding import appointment_time, scatter_gather, with_profiles
+from appointments.versions import DOCTORS, PATIENT, SLOTS, acached_fragment, aget_version, dashboard_cache_timeout
 
 @patient_required
-def dashboard(request):
-    patient = request.user.patient_profile
-    upcoming_appointments = Appointment.objects.filter(
-        patient=patient,
-        status='scheduled',
-        availability_slot__date__gte=timezone.now().date()
-    ).order_by('availability_slot__date', 'availability_slot__start_time')[:5]
+async def dashboard(request):
+    patient = request.role_profile
+    today = timezone.now().date()
+    fragment_version = f"{await aget_version(PATIENT, patient.id)}:{today}"
+
+    # Only query when the cached fragment is missing
+    cached_upcoming = await acached_fragment('patient_upcoming_appointments', patient.id, fragment_version)
+    upcoming_appointments = []
+    if cached_upcoming is None:
+        # The patient's doctors may be on any shard
+        upcoming_appointments = await sync_to_async(scatter_gather)(
+            with_profiles(Appointment.objects.filter(
+                patient=patient,
+                status='scheduled',
+                availability_slot__date__gte=today
+            ).select_related('availability_slot'), 'doctor__user').order_by('availability_slot__date', 'availability_slot__start_time'),
+            key=appointment_time,
+            limit=5,
+        )
     
     context = {
         'patient': patient,
         'upcoming_appointments': upcoming_appointments,
+        'cached_upcoming': cached_upcoming,
+        'fragment_version': fragment_version,
+        'fragment_timeout': dashboard_cache_timeout(),
     }
-    return render(request, 'patients/dashboard.html', context)
+    # The {% cache %} tag reads and writes the cache, so render off the event loop
+    return await sync_to_async(render)(request, 'patients/dashboard.html', context)
+
+def _viewer_etag(request, *parts):
+    """
+    ETag for a page that shows ``parts`` plus the viewer's navbar.
+
+    Returns None (no conditional response) while flash messages are pending,
+    so they are not swallowed by a 304.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    user = request.user
+    viewer = f"{user.pk}:{user.first_name}:{user.last_name}"
+    return hashlib.md5(":".join([viewer, *map(str, parts)]).encode()).hexdigest()
+
+
+async def doctors_list_etag(request):
+    return _viewer_etag(request, await aget_version(DOCTORS), request.GET.get('specialization', ''))
+
+
+async def doctor_details_etag(request, doctor_id):
+    return _viewer_etag(
+        request, await aget_version(DOCTORS), await aget_version(SLOTS, doctor_id), timezone.now().date()
+    )
 
+
+def _async_etag(etag_func):
+    """
+    condition(etag_func=...) for async views whose ``etag_func`` is async too;
+    condition() calls it synchronously, in the event loop.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+@gzip_page
 @patient_required
-def doctors_list(request):
-    doctors = DoctorProfile.objects.all()
+@cache_control(private=True, no_cache=True)
+@_async_etag(doctors_list_etag)
+async def doctors_list(request):
+    doctors = DoctorProfile.objects.select_related('user')
     
     # Filter by specialization if provided
     specialization = request.GET.get('specialization')
@@ -34,24 +109,57 @@ def doctors_list(request):
         doctors = doctors.filter(specialization__icontains=specialization)
     
     context = {
-        'doctors': doctors,
+        'doctors': [doctor async for doctor in doctors],
         'specialization': specialization,
     }
-    return render(request, 'patients/doctors_list.html', context)
+    return await sync_to_async(render)(request, 'patients/doctors_list.html', context)
 
+@gzip_page
 @patient_required
-def doctor_details(request, doctor_id):
-    doctor = get_object_or_404(DoctorProfile, id=doctor_id)
+@cache_control(private=True, no_cache=True)
+@_async_etag(doctor_details_etag)
+async def doctor_details(request, doctor_id):
+    doctor = await aget_object_or_404(DoctorProfile.objects.select_related('user'), id=doctor_id)
     
     # Get available slots for this doctor
-    available_slots = AvailabilitySlot.objects.filter(
-        doctor=doctor,
+    available_slots = doctor.availability_slots.filter(
         is_booked=False,
         date__gte=timezone.now().date()
     ).order_by('date', 'start_time')
     
     context = {
         'doctor': doctor,
-        'available_slots': available_slots,
+        'available_slots': [slot async for slot in available_slots],
     }
-    return render(request, 'patients/doctor_details.html', context)
\ No newline at end of file
+    return await sync_to_async(render)(request, 'patients/doctor_details.html', context)
+
+async def doctor_slot_events(request, doctor_id):
+    """
+    Server-Sent Events stream of slot changes for doctor_details.
+
+    Serve under ASGI (hospital_system.asgi): each open stream is an idle
+    coroutine waiting on its queue rather than a thread.
+    """
+    user = await request.auser()
+    if not (user.is_authenticated and user.is_patient()):
+        return HttpResponseForbidden()
+    if not await DoctorProfile.objects.filter(id=doctor_id).aexists():
+        raise Http404
+
+    response = StreamingHttpResponse(_slot_event_stream(doctor_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+async def _slot_event_stream(doctor_id):
+    heartbeat = getattr(settings, 'SLOT_EVENTS_HEARTBEAT_SECONDS', 15)
+    broker = get_broker()
+    subscription = broker.subscribe(doctor_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            # Comment lines keep proxies from closing idle connections
+            yield format_sse(event) if event else ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)